@@ -5,7 +5,7 @@ a = Analysis(
     ['email_forensics_main.py'],
     pathex=[],
     binaries=[],
-    datas=[],
+    datas=[('public_suffix_list.dat', '.')],
     hiddenimports=['dns.resolver', 'dns.exception', 'email.parser', 'email.utils', 'reportlab.graphics.charts.barcharts', 'reportlab.graphics.charts.lineplots', 'reportlab.graphics.charts.piecharts', 'reportlab.graphics.charts.spider', 'reportlab.graphics.charts.doughnut'],
     hookspath=[],
     hooksconfig={},
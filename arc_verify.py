@@ -0,0 +1,298 @@
+"""
+ARC Verification Module
+Authenticated Received Chain validation (RFC 8617)
+
+The ARC header sets are collected in a single pass over the header list.
+Validation then follows RFC 8617 section 5.2:
+- structural checks on the chain;
+- the newest ARC-Message-Signature;
+- each ARC-Seal from the newest instance down to the oldest.
+
+It stops at the first broken seal, so a long chain that breaks near the
+top costs one signature check. Keys come from the shared DKIMKeyStore.
+Header canonicalization and body hashing are the DKIM ones.
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from auth_results import parse_authentication_results
+from dkim_verify import (
+    ALGORITHMS, HAVE_CRYPTOGRAPHY, REJECTED_ALGORITHMS, BodySpec, DKIMError, DKIMKey,
+    DKIMKeyStore, DKIMSignature, canonicalize_header, decode_base64, hash_body,
+    parse_tag_list, split_header_fields, split_message, strip_signature_value
+)
+
+# Chain validation results (RFC 8617 section 4.4)
+PASS = 'pass'
+FAIL = 'fail'
+NONE = 'none'
+
+# RFC 8617 section 4.2.1: instances run from 1 to at most 50
+MAX_INSTANCES = 50
+
+_SEAL = 'arc-seal'
+_MESSAGE_SIGNATURE = 'arc-message-signature'
+_RESULTS = 'arc-authentication-results'
+_ARC_HEADERS = (_RESULTS, _MESSAGE_SIGNATURE, _SEAL)
+
+# The i= tag anywhere in a header value; tag order is not fixed (RFC 8617 section 4.1)
+_INSTANCE_RE = re.compile(rb'[:;]\s*i\s*=\s*(\d+)\s*(?:;|$)')
+_SEAL_REQUIRED_TAGS = ('i', 'a', 'b', 'd', 's', 'cv')
+
+@dataclass
+class ARCInstance:
+    """What was found and checked for one ARC set (one hop)"""
+    instance: int
+    domain: str = ''
+    selector: str = ''
+    authserv_id: str = ''
+    chain_status: str = ''        # cv= claimed by this hop's seal
+    seal: str = ''                # pass / fail, empty if never reached
+    message_signature: str = ''   # pass / fail, only checked for the newest hop
+    reason: str = ''
+
+    def to_dict(self) -> Dict:
+        return {
+            'instance': self.instance,
+            'domain': self.domain,
+            'selector': self.selector,
+            'authserv_id': self.authserv_id,
+            'chain_status': self.chain_status,
+            'seal': self.seal,
+            'message_signature': self.message_signature,
+            'reason': self.reason
+        }
+
+@dataclass
+class ARCResult:
+    """Outcome of validating a message's ARC chain"""
+    result: str = NONE
+    instances: List[ARCInstance] = field(default_factory=list)
+    reason: str = ''
+    failed_instance: Optional[int] = None
+
+    @property
+    def passed(self) -> bool:
+        return self.result == PASS
+
+    def to_text(self) -> str:
+        """Render in Authentication-Results style"""
+        parts = [f"arc={self.result}"]
+        if self.reason:
+            parts.append(f"({self.reason})")
+        if self.instances:
+            parts.append(f"i={len(self.instances)}")
+        return ' '.join(parts)
+
+    def to_dict(self) -> Dict:
+        return {
+            'result': self.result,
+            'reason': self.reason,
+            'failed_instance': self.failed_instance,
+            'instances': [instance.to_dict() for instance in self.instances]
+        }
+
+@dataclass
+class ARCSeal:
+    """A parsed ARC-Seal header field"""
+    raw: bytes
+    instance: int
+    algorithm: str
+    domain: str
+    selector: str
+    chain_status: str
+    signature: bytes
+
+    @classmethod
+    def parse(cls, raw_field: bytes) -> 'ARCSeal':
+        tags = parse_tag_list(raw_field.split(b':', 1)[1].decode('latin-1'))
+        missing = [tag for tag in _SEAL_REQUIRED_TAGS if tag not in tags]
+        if missing:
+            raise DKIMError(FAIL, f"seal is missing {', '.join(t + '=' for t in missing)} tag")
+        if 'h' in tags:
+            raise DKIMError(FAIL, 'seal must not have an h= tag')
+        algorithm = tags['a'].lower()
+        if algorithm not in ALGORITHMS or algorithm in REJECTED_ALGORITHMS:
+            raise DKIMError(FAIL, f'unsupported seal algorithm {algorithm}')
+        chain_status = tags['cv'].lower()
+        if chain_status not in (NONE, PASS, FAIL):
+            raise DKIMError(FAIL, f'invalid cv={chain_status}')
+        return cls(raw_field, int(tags['i']), algorithm, tags['d'].lower().rstrip('.'),
+                   tags['s'].strip(), chain_status, decode_base64(tags['b'], 'seal b='))
+
+@dataclass
+class PendingARC:
+    """An ARC chain checked as far as possible without reading the body"""
+    fields: List[Tuple[str, bytes]]
+    result: ARCResult
+    sets: Dict[int, Dict[str, bytes]] = field(default_factory=dict)
+    seals: Dict[int, ARCSeal] = field(default_factory=dict)
+    message_signature: Optional[DKIMSignature] = None
+    key: Optional[DKIMKey] = None
+
+    @property
+    def body_specs(self) -> Set[BodySpec]:
+        return {self.message_signature.body_spec} if self.message_signature is not None else set()
+
+class ARCValidator:
+    """Validates the ARC chain of a message
+
+    Like DKIMVerifier, validation has a prepare() and a complete() phase, so
+    the analyzer can hash the body once for both stages.
+    """
+
+    def __init__(self, key_store: Optional[DKIMKeyStore] = None):
+        self.key_store = key_store or DKIMKeyStore.default()
+
+    def validate(self, header_block: bytes, body: Iterable[bytes]) -> ARCResult:
+        """Validate the chain given the raw header block and the body as chunks"""
+        pending = self.prepare(split_header_fields(header_block))
+        return self.complete(pending, hash_body(pending.body_specs, body))
+
+    def validate_bytes(self, data: Union[bytes, bytearray, memoryview]) -> ARCResult:
+        """Validate the chain of a raw message held in memory"""
+        return self.validate(*split_message(data))
+
+    def prepare(self, fields: List[Tuple[str, bytes]]) -> PendingARC:
+        """Collect the ARC sets and run every check that needs no body"""
+        pending = PendingARC(fields, ARCResult())
+        try:
+            self._collect(pending)
+            if pending.sets:
+                self._check_structure(pending)
+                self._prepare_message_signature(pending)
+        except DKIMError as e:
+            self._fail(pending, e.reason)
+        return pending
+
+    def complete(self, pending: PendingARC, digests: Dict[BodySpec, bytes]) -> ARCResult:
+        """Finish validation given the body hashes from hash_body()"""
+        result = pending.result
+        if pending.message_signature is None or result.result == FAIL:
+            return result
+
+        newest = len(pending.sets)
+        signature = pending.message_signature
+        instance = result.instances[newest - 1]
+        if digests[signature.body_spec] != signature.body_hash:
+            instance.message_signature = FAIL
+            return self._fail(pending, 'message signature body hash mismatch', newest)
+        if not pending.key.verify(signature.signature, signature.signed_data(pending.fields),
+                                  signature.hash_name):
+            instance.message_signature = FAIL
+            return self._fail(pending, 'message signature did not verify', newest)
+        instance.message_signature = PASS
+
+        # Each seal covers every set up to its own; stop at the first broken one
+        blocks = [self._canonical_set(pending, i) for i in range(1, newest + 1)]
+        for i in range(newest, 0, -1):
+            seal = pending.seals[i]
+            sealed = b''.join(blocks[:i - 1]) + self._sealed_set(pending, i)
+            try:
+                key = self.key_store.get(seal.selector, seal.domain)
+                key.check_usable(seal.algorithm)
+            except DKIMError as e:
+                result.instances[i - 1].seal = FAIL
+                return self._fail(pending, f'seal {i}: {e.reason}', i)
+            if not key.verify(seal.signature, sealed, ALGORITHMS[seal.algorithm][1]):
+                result.instances[i - 1].seal = FAIL
+                return self._fail(pending, f'seal {i} did not verify', i)
+            result.instances[i - 1].seal = PASS
+
+        result.result = PASS
+        return result
+
+    # -- preparation -----------------------------------------------------
+
+    def _collect(self, pending: PendingARC):
+        """One pass over the header list grouping ARC headers by instance"""
+        for name, raw in pending.fields:
+            if name not in _ARC_HEADERS:
+                continue
+            # From the colon after the field name, so that only the value is searched
+            match = _INSTANCE_RE.search(raw, raw.find(b':'))
+            if match is None:
+                raise DKIMError(FAIL, f'{name} without an instance tag')
+            instance = int(match.group(1))
+            if not 1 <= instance <= MAX_INSTANCES:
+                raise DKIMError(FAIL, f'instance {instance} out of range')
+            arc_set = pending.sets.setdefault(instance, {})
+            if name in arc_set:
+                raise DKIMError(FAIL, f'duplicate {name} for instance {instance}')
+            arc_set[name] = raw
+
+    def _check_structure(self, pending: PendingARC):
+        """Sets must be complete and numbered 1..N; cv= must fit each position"""
+        newest = max(pending.sets)
+        if len(pending.sets) != newest:
+            raise DKIMError(FAIL, 'instances are not contiguous')
+
+        instances = pending.result.instances
+        for i in range(1, newest + 1):
+            arc_set = pending.sets[i]
+            instance = ARCInstance(instance=i)
+            instances.append(instance)
+            missing = [name for name in _ARC_HEADERS if name not in arc_set]
+            if missing:
+                raise DKIMError(FAIL, f"instance {i} has no {', '.join(missing)}")
+            results = parse_authentication_results(
+                arc_set[_RESULTS].split(b':', 1)[1].decode('latin-1'), arc=True)
+            instance.authserv_id = results.authserv_id if results else ''
+            seal = ARCSeal.parse(arc_set[_SEAL])
+            pending.seals[i] = seal
+            instance.domain, instance.selector = seal.domain, seal.selector
+            instance.chain_status = seal.chain_status
+
+        if pending.seals[newest].chain_status == FAIL:
+            raise DKIMError(FAIL, f'instance {newest} reports a failed chain')
+        for i, seal in pending.seals.items():
+            expected = NONE if i == 1 else PASS
+            if seal.chain_status != expected:
+                raise DKIMError(FAIL, f'instance {i} has cv={seal.chain_status}, expected {expected}')
+
+    def _prepare_message_signature(self, pending: PendingARC):
+        """Parse the newest ARC-Message-Signature and fetch its key"""
+        if not HAVE_CRYPTOGRAPHY:
+            # Structure was checked, but no signature can be
+            pending.result.reason = "the 'cryptography' package is not installed"
+            return
+        newest = len(pending.sets)
+        try:
+            signature = DKIMSignature.parse(pending.sets[newest][_MESSAGE_SIGNATURE], arc=True)
+            if signature.algorithm in REJECTED_ALGORITHMS:
+                raise DKIMError(FAIL, f'{signature.algorithm} is no longer accepted')
+            key = self.key_store.get(signature.selector, signature.domain)
+            key.check_usable(signature.algorithm)
+        except DKIMError as e:
+            pending.result.instances[newest - 1].message_signature = FAIL
+            raise DKIMError(FAIL, f'message signature {newest}: {e.reason}')
+        pending.message_signature, pending.key = signature, key
+
+    # -- seal data -------------------------------------------------------
+
+    @staticmethod
+    def _canonical_set(pending: PendingARC, i: int) -> bytes:
+        """A complete set as covered by later seals (always relaxed)"""
+        arc_set = pending.sets[i]
+        return b''.join(canonicalize_header(arc_set[name], 'relaxed') for name in _ARC_HEADERS)
+
+    @staticmethod
+    def _sealed_set(pending: PendingARC, i: int) -> bytes:
+        """A set as covered by its own seal: b= emptied, no final CRLF"""
+        arc_set = pending.sets[i]
+        own = canonicalize_header(strip_signature_value(arc_set[_SEAL]), 'relaxed')
+        return (canonicalize_header(arc_set[_RESULTS], 'relaxed')
+                + canonicalize_header(arc_set[_MESSAGE_SIGNATURE], 'relaxed')
+                + own[:-2])
+
+    @staticmethod
+    def _fail(pending: PendingARC, reason: str, instance: Optional[int] = None) -> ARCResult:
+        result = pending.result
+        result.result, result.reason = FAIL, reason
+        result.failed_instance = instance
+        if instance is not None:
+            result.instances[instance - 1].reason = reason
+        pending.message_signature = None
+        return result
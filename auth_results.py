@@ -0,0 +1,233 @@
+"""
+Authentication Results Module
+RFC 8601 parser for Authentication-Results and ARC-Authentication-Results headers
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+# Lexer for the header body: comments, quoted strings, statement separators
+# and words. Words may contain '=' (e.g. "spf=pass", "header.b=abc=") and are
+# split into key/value pairs afterwards.
+_TOKEN_RE = re.compile(
+    r'\s+'
+    r'|(?P<comment>\((?:[^()\\]|\\.|\((?:[^()\\]|\\.)*\))*\)?)'
+    r'|(?P<quoted>"(?:[^"\\]|\\.)*"?)'
+    r'|(?P<sep>;)'
+    r'|(?P<word>[^\s;()"]+)'
+)
+
+_ESCAPE_RE = re.compile(r'\\(.)')
+
+# Token kinds
+_WORD, _QUOTED, _COMMENT, _SEP, _PAIR = 'word', 'quoted', 'comment', 'sep', 'pair'
+
+@dataclass
+class AuthMethodResult:
+    """Result of a single authentication method (resinfo in RFC 8601)"""
+    method: str
+    result: str
+    version: str = ''
+    reason: str = ''
+    comment: str = ''
+    properties: Dict[str, str] = field(default_factory=dict)
+
+    def get(self, prop: str, default: str = '') -> str:
+        """Get a property value such as 'smtp.mailfrom' or 'header.d'"""
+        return self.properties.get(prop, default)
+
+    @property
+    def passed(self) -> bool:
+        return self.result == 'pass'
+
+    def to_text(self) -> str:
+        """Render back to the 'method=result (comment) ptype.prop=value' form"""
+        parts = [f"{self.method}={self.result}"]
+        if self.comment:
+            parts.append(f"({self.comment})")
+        if self.reason:
+            parts.append(f'reason="{self.reason}"')
+        parts.extend(f"{key}={value}" for key, value in self.properties.items())
+        return ' '.join(parts)
+
+    def to_dict(self) -> Dict:
+        return {
+            'method': self.method,
+            'result': self.result,
+            'version': self.version,
+            'reason': self.reason,
+            'comment': self.comment,
+            'properties': dict(self.properties)
+        }
+
+@dataclass
+class AuthResultsHeader:
+    """One parsed Authentication-Results (or ARC-Authentication-Results) header"""
+    authserv_id: str
+    results: List[AuthMethodResult] = field(default_factory=list)
+    version: str = ''
+    instance: Optional[int] = None  # ARC instance (i=), None for plain A-R headers
+
+    @property
+    def is_arc(self) -> bool:
+        return self.instance is not None
+
+    def methods(self, method: str) -> List[AuthMethodResult]:
+        """All results for a method, in header order"""
+        return [r for r in self.results if r.method == method]
+
+    def first(self, method: str) -> Optional[AuthMethodResult]:
+        """First result for a method, if any"""
+        for r in self.results:
+            if r.method == method:
+                return r
+        return None
+
+    def to_dict(self) -> Dict:
+        return {
+            'header': 'ARC-Authentication-Results' if self.is_arc else 'Authentication-Results',
+            'instance': self.instance,
+            'authserv_id': self.authserv_id,
+            'version': self.version,
+            'results': [r.to_dict() for r in self.results]
+        }
+
+def _tokenize(value: str) -> List[tuple]:
+    """Split a header value into (kind, text) tokens, dropping whitespace"""
+    tokens = []
+    for match in _TOKEN_RE.finditer(value):
+        kind = match.lastgroup
+        if kind is None:
+            continue
+        text = match.group(kind)
+        if kind == _QUOTED:
+            body = text[1:-1] if len(text) > 1 and text.endswith('"') else text[1:]
+            text = _ESCAPE_RE.sub(r'\1', body)
+        elif kind == _COMMENT:
+            body = text[1:-1] if text.endswith(')') else text[1:]
+            text = ' '.join(body.split())
+        tokens.append((kind, text))
+    return tokens
+
+def _split_statements(tokens: List[tuple]) -> List[List[tuple]]:
+    """Group tokens into ';'-separated statements, folding 'key = value' into pairs"""
+    statements = [[]]
+    index = 0
+    while index < len(tokens):
+        kind, text = tokens[index]
+        index += 1
+        if kind == _SEP:
+            statements.append([])
+            continue
+        if kind != _WORD or text.startswith('='):
+            statements[-1].append((kind, text))
+            continue
+
+        if '=' in text:
+            key, _, value = text.partition('=')
+        elif index < len(tokens) and tokens[index][0] == _WORD and tokens[index][1].startswith('='):
+            # "key =value" or "key = value"
+            key, value = text, tokens[index][1][1:]
+            index += 1
+        else:
+            statements[-1].append((kind, text))
+            continue
+
+        if not value and index < len(tokens) and tokens[index][0] in (_WORD, _QUOTED):
+            value = tokens[index][1]
+            index += 1
+        statements[-1].append((_PAIR, (key.lower(), value)))
+    return statements
+
+def _parse_resinfo(statement: List[tuple]) -> Optional[AuthMethodResult]:
+    """Parse 'method[/version]=result [reason=...] [ptype.prop=value ...]'"""
+    comments = [text for kind, text in statement if kind == _COMMENT]
+    pairs = [text for kind, text in statement if kind == _PAIR]
+    if not pairs:
+        return None
+
+    methodspec, result = pairs[0]
+    method, _, version = methodspec.partition('/')
+    entry = AuthMethodResult(
+        method=method.strip(),
+        result=result.lower(),
+        version=version.strip(),
+        comment='; '.join(comments)
+    )
+
+    for key, value in pairs[1:]:
+        if key == 'reason':
+            entry.reason = value
+        else:
+            entry.properties[key] = value
+
+    return entry
+
+def parse_authentication_results(value: str, arc: bool = False) -> Optional[AuthResultsHeader]:
+    """Parse one Authentication-Results header value
+
+    For ARC-Authentication-Results pass arc=True; the leading 'i=N;' instance
+    tag is then consumed first.
+    """
+    if not value:
+        return None
+
+    statements = _split_statements(_tokenize(value))
+
+    instance = None
+    if arc:
+        head = [text for kind, text in statements[0] if kind == _PAIR]
+        if len(head) != 1 or head[0][0] != 'i':
+            return None
+        try:
+            instance = int(head[0][1])
+        except ValueError:
+            return None
+        statements = statements[1:]
+
+    if not statements:
+        return None
+
+    head = [t for t in statements[0] if t[0] in (_WORD, _QUOTED)]
+    if head:
+        header = AuthResultsHeader(
+            authserv_id=head[0][1],
+            version=head[1][1] if len(head) > 1 and head[1][1].isdigit() else '',
+            instance=instance
+        )
+        statements = statements[1:]
+    else:
+        # Non-conforming header without an authserv-id; keep the results anyway
+        header = AuthResultsHeader(authserv_id='', instance=instance)
+
+    for statement in statements:
+        words = [t for t in statement if t[0] != _COMMENT]
+        if not words or (len(words) == 1 and words[0][0] == _WORD and words[0][1].lower() == 'none'):
+            continue
+        entry = _parse_resinfo(statement)
+        if entry:
+            header.results.append(entry)
+
+    return header
+
+def collect_authentication_results(msg) -> List[AuthResultsHeader]:
+    """Parse every Authentication-Results and ARC-Authentication-Results header of a message
+
+    Plain headers come first in the order they appear (topmost, i.e. most
+    recent, first), followed by ARC headers sorted by instance.
+    """
+    parsed = []
+    for value in msg.get_all('Authentication-Results', []):
+        header = parse_authentication_results(str(value))
+        if header:
+            parsed.append(header)
+
+    arc_headers = []
+    for value in msg.get_all('ARC-Authentication-Results', []):
+        header = parse_authentication_results(str(value), arc=True)
+        if header:
+            arc_headers.append(header)
+    arc_headers.sort(key=lambda h: h.instance)
+
+    return parsed + arc_headers
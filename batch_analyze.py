@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+"""
+Batch Analysis Module
+Headless entry point that analyzes large collections of email files in parallel
+
+Inputs may be .eml and Outlook .msg files, mbox files and Maildir trees,
+Outlook .pst/.ost archives, or directories holding any of them. Some
+messages of an mbox are picked with path#n or path#first-last (numbered
+from 1, as in the results), e.g. export.mbox#10-20,35.
+
+Usage:
+    python -m batch_analyze /path/to/dump -o results.jsonl
+"""
+
+import argparse
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from dataclasses import dataclass
+from typing import Iterable, Iterator, List, Optional, TextIO, Tuple, Union
+
+from cache_store import SECTION_IP, ResultCache
+from email_core import EmailAnalyzer, EmailParseResult
+from mailbox_ingest import (MBOX_EXTENSIONS, MboxReader, MessageRef, is_maildir, is_mbox,
+                            iter_maildir, read_message)
+from msg_reader import read_transport_headers
+from pst_reader import PST_EXTENSIONS, PstFormatError, PstMessageRef, PstReader
+from pst_reader import read_transport_headers as read_pst_headers
+
+# File types picked up when walking a directory
+EMAIL_EXTENSIONS = ('.eml', '.msg')
+
+# Number of files handed to a worker per task (amortizes IPC overhead)
+DEFAULT_CHUNK_SIZE = 32
+
+# A message file, or a message inside an mbox or a PST archive
+Source = Union[str, MessageRef, PstMessageRef]
+
+# Per-process analyzer, created once by the pool initializer
+_worker_analyzer: Optional[EmailAnalyzer] = None
+# Analyzer for .msg files and PST messages, which keep only the headers of the original message;
+# with nothing to verify against it skips the DKIM and ARC stages
+_worker_headers_analyzer: Optional[EmailAnalyzer] = None
+
+def _init_worker(verify_dkim: bool = False, verify_arc: bool = False, use_cache: bool = False):
+    """Create the analyzer used by this worker process"""
+    global _worker_analyzer, _worker_headers_analyzer
+    # Keys are parsed once per process and shared between processes on disk
+    verifier = validator = None
+    if verify_dkim:
+        from dkim_verify import DKIMVerifier
+        verifier = DKIMVerifier()
+    if verify_arc:
+        from arc_verify import ARCValidator
+        validator = ARCValidator()
+    result_cache = None
+    if use_cache:
+        result_cache = ResultCache.default()
+    _worker_analyzer = EmailAnalyzer(dkim_verifier=verifier, arc_validator=validator,
+                                     result_cache=result_cache)
+    _worker_headers_analyzer = (EmailAnalyzer(result_cache=result_cache)
+                                if _worker_analyzer.verifies_signatures else _worker_analyzer)
+
+def _record_line(path: str, result: Optional[EmailParseResult], error: str = '') -> Tuple[str, bool]:
+    """Serialize one outcome as a JSON line plus success flag"""
+    try:
+        record = {'file': path, 'result': result.to_dict()} if result is not None else {'file': path, 'error': error}
+    except Exception as e:
+        result, record = None, {'file': path, 'error': str(e)}
+    return json.dumps(record, default=str, ensure_ascii=False), result is not None
+
+def _analyze_source(source: Source) -> EmailParseResult:
+    """Analyze a message file, or an mbox message straight from the mapped file"""
+    if isinstance(source, MessageRef):
+        return _worker_analyzer.analyze_bytes(read_message(source))
+    if isinstance(source, PstMessageRef):
+        headers = read_pst_headers(source)
+        if headers is None:
+            raise ValueError("PST message has no transport headers")
+        return _worker_headers_analyzer.analyze(headers)
+    if source.lower().endswith('.msg'):
+        headers = read_transport_headers(source)
+        if headers is None:
+            raise ValueError("MSG file has no transport headers")
+        return _worker_headers_analyzer.analyze(headers)
+    return _worker_analyzer.analyze_file(source)
+
+def _analyze_file(path: Source) -> Tuple[str, bool]:
+    """Analyze a single file and return its JSON line and success flag"""
+    try:
+        return _record_line(str(path), _analyze_source(path))
+    except Exception as e:
+        return _record_line(str(path), None, str(e))
+
+def _analyze_chunk(paths: List[Source]) -> List[Tuple[str, bool]]:
+    """Analyze a chunk of files inside a worker process"""
+    return [_analyze_file(path) for path in paths]
+
+def _analyze_chunk_results(paths: List[Source]) -> List[Tuple[str, Optional[EmailParseResult], str]]:
+    """Analyze a chunk and return the result objects, for post-processing in the parent"""
+    outcomes = []
+    for path in paths:
+        try:
+            outcomes.append((str(path), _analyze_source(path), ''))
+        except Exception as e:
+            outcomes.append((str(path), None, str(e)))
+    return outcomes
+
+def iter_mbox(path: str, numbers: Optional[List[range]] = None) -> Iterator[MessageRef]:
+    """References to the messages of an mbox, yielded while it is being scanned
+    
+    `numbers` picks messages (numbered from 1) instead. The mbox index saved
+    by the first scan makes each pick a single seek.
+    """
+    try:
+        with MboxReader(path, index=True) as mbox:
+            if numbers is None:
+                yield from mbox
+                return
+            count = len(mbox)
+            for selection in numbers:
+                if selection.start > count:
+                    print(f"Warning: {path} has only {count} messages", file=sys.stderr)
+                for number in range(selection.start, min(selection.stop, count + 1)):
+                    yield mbox.ref(number - 1)
+    except OSError as e:
+        print(f"Warning: cannot read {path}: {e}", file=sys.stderr)
+
+def iter_pst(path: str) -> Iterator[PstMessageRef]:
+    """References to the messages of a PST archive, yielded while its node tree is walked"""
+    try:
+        with PstReader(path) as pst:
+            yield from pst
+    except (OSError, PstFormatError) as e:
+        print(f"Warning: cannot read {path}: {e}", file=sys.stderr)
+
+def parse_selection(spec: str) -> List[range]:
+    """Message numbers of "n", "first-last" or "first-" items separated by commas"""
+    selection = []
+    for item in spec.split(','):
+        first, dash, last = item.strip().partition('-')
+        first = int(first)
+        last = (int(last) if last else sys.maxsize) if dash else first
+        if first < 1 or last < first:
+            raise ValueError(f"bad message range {item!r}")
+        selection.append(range(first, last + 1))
+    return selection
+
+def iter_sources(root: str, extensions: Iterable[str] = EMAIL_EXTENSIONS) -> Iterator[Source]:
+    """Lazily walk a file or directory tree yielding messages
+    
+    Files with one of `extensions` are yielded as paths. Mbox files,
+    Maildir trees and PST archives are opened up along the way.
+    
+    Every message of an mbox becomes a MessageRef, and every message of a
+    PST a PstMessageRef; Maildir messages are plain files whatever their names.
+    """
+    extensions = tuple(ext.lower() for ext in extensions)
+    path, hash_sign, spec = root.rpartition('#')
+    if hash_sign and not os.path.exists(root) and os.path.isfile(path):
+        yield from iter_mbox(path, parse_selection(spec))
+        return
+    if os.path.isfile(root):
+        if root.lower().endswith(PST_EXTENSIONS):
+            yield from iter_pst(root)
+        elif not root.lower().endswith(extensions) and is_mbox(root):
+            yield from iter_mbox(root)
+        else:
+            yield root
+        return
+
+    stack = [root]
+    while stack:
+        current = stack.pop()
+        if is_maildir(current):
+            yield from iter_maildir(current)
+            continue
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    name = entry.name.lower()
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif name.endswith(extensions):
+                        yield entry.path
+                    elif name.endswith(MBOX_EXTENSIONS):
+                        yield from iter_mbox(entry.path)
+                    elif name.endswith(PST_EXTENSIONS):
+                        yield from iter_pst(entry.path)
+        except OSError as e:
+            print(f"Warning: cannot read {current}: {e}", file=sys.stderr)
+
+def _chunked(items: Iterable[Source], size: int) -> Iterator[List[Source]]:
+    """Group an iterable into lists of at most `size` items"""
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+@dataclass
+class BatchStats:
+    """Counters for a batch run"""
+    processed: int = 0
+    errors: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def rate(self) -> float:
+        """Messages analyzed per second"""
+        return self.processed / self.elapsed if self.elapsed > 0 else 0.0
+
+class BatchAnalyzer:
+    """Fans email analysis out across a process pool and streams JSON lines"""
+
+    def __init__(self, workers: Optional[int] = None, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 progress_interval: float = 5.0, enricher=None,
+                 verify_dkim: bool = False, verify_arc: bool = False, result_cache=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = max(1, chunk_size)
+        self.progress_interval = progress_interval
+        # Bound the number of queued chunks so memory stays flat for any corpus size
+        self.max_pending = self.workers * 2
+        # Optional enrichment.BatchEnricher applied to each finished chunk
+        self.enricher = enricher
+        # Verify DKIM signatures cryptographically (reads message bodies)
+        self.verify_dkim = verify_dkim
+        # Validate ARC chains (also reads message bodies)
+        self.verify_arc = verify_arc
+        # Optional cache_store.ResultCache shared with the workers through its file;
+        # here it receives the enrichment of newly analyzed messages
+        self.result_cache = result_cache
+
+    def run(self, paths: Iterable[Source], output, progress: Optional[TextIO] = None) -> BatchStats:
+        """Analyze every path and write each outcome to output
+        
+        output is a text stream, which receives one JSON line per message, or
+        a result_batch.ResultBatchWriter for columnar files. The caller closes
+        the writer.
+        """
+        stats = BatchStats()
+        start = time.monotonic()
+        last_report = start
+        chunks = _chunked(paths, self.chunk_size)
+        columnar = not isinstance(output, io.TextIOBase)
+        # Result objects come back from the workers only when the parent needs them
+        task = _analyze_chunk if self.enricher is None and not columnar else _analyze_chunk_results
+
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                 initargs=(self.verify_dkim, self.verify_arc,
+                                           self.result_cache is not None)) as executor:
+            pending = set()
+            exhausted = False
+
+            while pending or not exhausted:
+                # Keep the pool busy without materializing the whole file list
+                while not exhausted and len(pending) < self.max_pending:
+                    chunk = next(chunks, None)
+                    if chunk is None:
+                        exhausted = True
+                        break
+                    pending.add(executor.submit(task, chunk))
+
+                if not pending:
+                    break
+
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    for ok in self._write_chunk(future.result(), output, columnar):
+                        stats.processed += 1
+                        if not ok:
+                            stats.errors += 1
+
+                now = time.monotonic()
+                if progress and now - last_report >= self.progress_interval:
+                    stats.elapsed = now - start
+                    self._report(stats, progress)
+                    last_report = now
+
+        if not columnar:
+            output.flush()
+        stats.elapsed = time.monotonic() - start
+        return stats
+
+    def _write_chunk(self, outcomes, output, columnar: bool) -> Iterator[bool]:
+        """Write a finished chunk, yielding a success flag per message"""
+        if self.enricher is not None:
+            self._enrich(outcomes)
+        if columnar:
+            for path, result, error in outcomes:
+                if result is not None:
+                    output.add(result, path)
+                else:
+                    output.add_error(path, error)
+                yield result is not None
+            return
+        if self.enricher is not None:
+            outcomes = [_record_line(path, result, error) for path, result, error in outcomes]
+        for line, ok in outcomes:
+            output.write(line + '\n')
+            yield ok
+
+    def _enrich(self, outcomes: List[Tuple[str, Optional[EmailParseResult], str]]):
+        """Enrich the results of a finished chunk in place"""
+        # IPs are looked up once per run; later chunks mostly hit the memo.
+        # Results whose IP data came fresh from the result cache are skipped.
+        stale = [result for _, result, _ in outcomes
+                 if result is not None and SECTION_IP not in result.cached_sections]
+        self.enricher.enrich(stale)
+        if self.result_cache is not None:
+            for result in stale:
+                if result.cache_key:
+                    self.result_cache.update_sections(result.cache_key, result, (SECTION_IP,))
+
+    def _report(self, stats: BatchStats, stream: TextIO):
+        """Write a progress line"""
+        stream.write(f"{stats.processed} messages, {stats.errors} errors, "
+                     f"{stats.rate:.1f} msg/s\n")
+        stream.flush()
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    """Create the command-line argument parser"""
+    parser = argparse.ArgumentParser(
+        prog='batch_analyze',
+        description='Analyze email files in bulk and write JSON-lines results'
+    )
+    parser.add_argument('inputs', nargs='+',
+                        help='Files, mbox files, Maildirs, PST archives or directories to analyze')
+    parser.add_argument('-o', '--output',
+                        help='Output file, or directory for parquet/arrow (default: stdout)')
+    parser.add_argument('--format', choices=('jsonl', 'parquet', 'arrow'), default='jsonl',
+                        help='jsonl (default), or a messages + relays table pair as Parquet or '
+                             'Arrow IPC files (needs pyarrow)')
+    parser.add_argument('-j', '--workers', type=int, default=None,
+                        help='Worker processes (default: number of CPU cores)')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help='Messages per worker task')
+    parser.add_argument('--ext', action='append', default=None,
+                        help='File extension to include (repeatable, default: .eml and .msg)')
+    parser.add_argument('--enrich', action='store_true',
+                        help='Look up geo/ASN, PTR and blacklist data for sender and relay IPs')
+    parser.add_argument('--enrich-workers', type=int, default=16,
+                        help='Concurrent IP lookups when enriching')
+    parser.add_argument('--verify-dkim', action='store_true',
+                        help='Verify DKIM signatures instead of trusting Authentication-Results')
+    parser.add_argument('--verify-arc', action='store_true',
+                        help='Validate ARC chains added by forwarders and mailing lists')
+    parser.add_argument('--cache-results', action='store_true',
+                        help='Reuse earlier analyses of the same headers and save new ones')
+    parser.add_argument('-q', '--quiet', action='store_true', help='Suppress progress output')
+    return parser
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command-line entry point"""
+    parser = build_arg_parser()
+    args = parser.parse_args(argv)
+    if args.format != 'jsonl' and not args.output:
+        parser.error(f'--format {args.format} needs an output directory (-o)')
+    extensions = args.ext or EMAIL_EXTENSIONS
+    for root in args.inputs:
+        path, hash_sign, spec = root.rpartition('#')
+        if hash_sign and not os.path.exists(root) and os.path.isfile(path):
+            try:
+                parse_selection(spec)
+            except ValueError:
+                parser.error(f'bad message selection in {root} (expected e.g. #5, #10-20 or #100-)')
+
+    def all_paths():
+        for root in args.inputs:
+            yield from iter_sources(root, extensions)
+
+    enricher = None
+    if args.enrich:
+        from enrichment import BatchEnricher
+        enricher = BatchEnricher(max_workers=args.enrich_workers)
+
+    result_cache = None
+    if args.cache_results:
+        result_cache = ResultCache.default()
+
+    batch = BatchAnalyzer(workers=args.workers, chunk_size=args.chunk_size, enricher=enricher,
+                          verify_dkim=args.verify_dkim, verify_arc=args.verify_arc,
+                          result_cache=result_cache)
+    progress = None if args.quiet else sys.stderr
+
+    try:
+        if args.format != 'jsonl':
+            from result_batch import ResultBatchWriter
+            with ResultBatchWriter(args.output, args.format) as output:
+                stats = batch.run(all_paths(), output, progress)
+        elif args.output:
+            with open(args.output, 'w', encoding='utf-8') as output:
+                stats = batch.run(all_paths(), output, progress)
+        else:
+            stats = batch.run(all_paths(), sys.stdout, progress)
+    finally:
+        if enricher is not None:
+            enricher.close()
+
+    if not args.quiet:
+        print(f"Done: {stats.processed} messages ({stats.errors} errors) in "
+              f"{stats.elapsed:.1f}s - {stats.rate:.1f} msg/s", file=sys.stderr)
+        if enricher is not None:
+            print(f"Enriched {enricher.unique_ips} unique IPs", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
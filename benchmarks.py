@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Benchmark Script
+Microbenchmarks for hot paths in the analysis engine
+
+Usage:
+    python benchmarks.py              (all)
+    python benchmarks.py received
+    python benchmarks.py relays
+"""
+
+import argparse
+import email.utils
+import gc
+import re
+import sys
+import timeit
+import tracemalloc
+from typing import Callable, Dict, List
+
+from email_core import EmailAnalyzer
+from received_parser import tokenize_received, parse_received_date, extract_ip
+from relay_hops import RelayColumns
+
+SAMPLE_RECEIVED = [
+    "from mail-sor-f41.google.com (mail-sor-f41.google.com. [209.85.220.41])\n"
+    "        by mx.google.com with SMTPS id a640c23a62f3a-a44f2c1b7e2sor1234567ab.2.2024.03.05.10.00.05\n"
+    "        for <user@recipient.org>\n"
+    "        (Google Transport Security);\n"
+    "        Tue, 05 Mar 2024 10:00:05 -0800 (PST)",
+    "from mail.example.com (mail.example.com [198.51.100.7])\n"
+    "        by mx.google.com with ESMTP id xyz789\n"
+    "        for <user@recipient.org>; Tue, 05 Mar 2024 10:00:02 -0800 (PST)",
+    "from [10.0.0.5] (unknown [10.0.0.5])\n"
+    "        by mail.example.com (Postfix) with ESMTPSA id 1A2B3C;\n"
+    "        Tue, 05 Mar 2024 10:00:00 -0800 (PST)",
+    "from DM6PR02MB4123.namprd02.prod.outlook.com (2603:10b6:5:1c0::20) by\n"
+    " BN8PR02MB5678.namprd02.prod.outlook.com with HTTPS; Tue, 5 Mar 2024\n"
+    " 18:00:01 +0000",
+]
+
+def _legacy_parse_received(header: str) -> Dict:
+    """Reference copy of the original per-call re.search implementation"""
+    relay = {'from': '', 'by': '', 'with': '', 'time': '', 'time_dt': None, 'ip': ''}
+    from_match = re.search(r'from\s+(.+?)\s+by', header, re.IGNORECASE | re.DOTALL)
+    if from_match:
+        relay['from'] = from_match.group(1).strip()
+    by_match = re.search(r'by\s+(.+?)\s+(with|id|;|$)', header, re.IGNORECASE | re.DOTALL)
+    if by_match:
+        relay['by'] = by_match.group(1).strip()
+    with_match = re.search(r'with\s+(.+?)\s+(id|;|$)', header, re.IGNORECASE | re.DOTALL)
+    if with_match:
+        relay['with'] = with_match.group(1).strip()
+    time_match = re.search(r';\s*(.+)$', header)
+    if time_match:
+        time_str = time_match.group(1).strip()
+        try:
+            relay['time_dt'] = email.utils.parsedate_to_datetime(time_str)
+        except Exception:
+            relay['time'] = time_str
+    ipv4_pattern = r'(?:(?:25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)\.){3}(?:25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)'
+    ipv6_pattern = r'(?:[0-9a-fA-F]{1,4}:){7}[0-9a-fA-F]{1,4}'
+    ip_match = re.search(ipv4_pattern, relay['from']) or re.search(ipv6_pattern, relay['from'])
+    relay['ip'] = ip_match.group(0) if ip_match else ''
+    return relay
+
+def _tokenizer_parse_received(header: str) -> Dict:
+    """Current tokenizer-based implementation"""
+    tokens = tokenize_received(header)
+    tokens['time_dt'] = parse_received_date(tokens['date'])
+    tokens['ip'] = extract_ip(tokens['from'])
+    return tokens
+
+def bench_received(hops: int = 40, number: int = 200) -> Dict[str, float]:
+    """Compare legacy and tokenizer Received parsing over a long relay chain"""
+    chain: List[str] = [SAMPLE_RECEIVED[i % len(SAMPLE_RECEIVED)] for i in range(hops)]
+
+    def run(parse):
+        for header in chain:
+            parse(header)
+
+    # Warm up both paths (fills the re module cache for the legacy version)
+    run(_legacy_parse_received)
+    run(_tokenizer_parse_received)
+
+    results = {}
+    for name, parse in (('legacy', _legacy_parse_received), ('tokenizer', _tokenizer_parse_received)):
+        elapsed = min(timeit.repeat(lambda: run(parse), number=number, repeat=5))
+        results[name] = elapsed / (number * hops) * 1e6
+
+    print(f"Received parsing, {hops} hops x {number} messages (us per hop):")
+    for name, per_hop in results.items():
+        print(f"  {name:<10} {per_hop:8.2f}")
+    print(f"  speedup    {results['legacy'] / results['tokenizer']:8.2f}x")
+    return results
+
+def _legacy_relay_dict(header: str, hop: int) -> Dict:
+    """Reference copy of the original per-hop dict built by the analyzer"""
+    tokens = tokenize_received(header)
+    relay = {
+        'hop': hop,
+        'from': tokens['from'],
+        'by': tokens['by'],
+        'with': tokens['with'],
+        'id': tokens['id'],
+        'for': tokens['for'],
+        'time': '',
+        'time_dt': None,
+        'delay': 0,
+        'blacklist': True,
+        'ip': extract_ip(tokens['from'])
+    }
+    if tokens['date']:
+        relay['time_dt'] = parse_received_date(tokens['date'])
+        if relay['time_dt']:
+            relay['time'] = relay['time_dt'].strftime('%m/%d/%Y %I:%M:%S %p')
+        else:
+            relay['time'] = tokens['date']
+    return relay
+
+def _retained_bytes(build: Callable[[], object]) -> int:
+    """Bytes still allocated once build() has returned, while its result is alive"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        kept = build()
+        gc.collect()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    size = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    del kept
+    return size
+
+def bench_relays(messages: int = 5000, hops: int = 8) -> Dict[str, float]:
+    """Memory held by a day's worth of relay chains in each representation"""
+    chain: List[str] = [SAMPLE_RECEIVED[i % len(SAMPLE_RECEIVED)] for i in range(hops)]
+    analyzer = EmailAnalyzer()
+
+    def dicts():
+        return [[_legacy_relay_dict(header, hop) for hop, header in enumerate(chain, 1)]
+                for _ in range(messages)]
+
+    def slotted():
+        return [[analyzer._parse_received_header(header, hop) for hop, header in enumerate(chain, 1)]
+                for _ in range(messages)]
+
+    def columns():
+        table = RelayColumns()
+        for _ in range(messages):
+            table.append([analyzer._parse_received_header(header, hop)
+                          for hop, header in enumerate(chain, 1)])
+        return table
+
+    results = {}
+    for name, build in (('dict', dicts), ('slots', slotted), ('columns', columns)):
+        results[name] = _retained_bytes(build) / (messages * hops)
+
+    print(f"Relay chain memory, {messages} messages x {hops} hops (bytes per hop):")
+    for name, per_hop in results.items():
+        ratio = f"  {results['dict'] / per_hop:.1f}x smaller" if name != 'dict' else ''
+        print(f"  {name:<10} {per_hop:8.0f}{ratio}")
+    return results
+
+BENCHMARKS = {
+    'received': bench_received,
+    'relays': bench_relays,
+}
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Run analysis microbenchmarks')
+    # The default must itself be a valid choice for a '*' positional
+    parser.add_argument('names', nargs='*', choices=['all', *BENCHMARKS], default='all',
+                        help='Benchmarks to run (default: all)')
+    args = parser.parse_args(argv)
+    names = BENCHMARKS if args.names == 'all' or 'all' in args.names else args.names
+    for name in names:
+        BENCHMARKS[name]()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
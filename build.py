@@ -65,8 +65,8 @@ def build_app():
     for imp in hidden_imports:
         cmd.append(f'--hidden-import={imp}')
     
-    # Add data files if needed
-    # cmd.append('--add-data=resources;resources')
+    # Bundled data files
+    cmd.append(f'--add-data=public_suffix_list.dat{os.pathsep}.')
     
     # Main script
     cmd.append('email_forensics_main.py')
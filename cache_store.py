@@ -0,0 +1,630 @@
+"""
+Cache Store Module
+Persistent SQLite-backed caches shared by threads and worker processes
+"""
+
+import copy
+import ipaddress
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Union
+
+import dns.exception
+import dns.rdata
+import dns.rdataclass
+import dns.rdatatype
+import dns.resolver
+
+from config_manager import ConfigManager
+
+class SQLiteStore:
+    """Base class for on-disk caches
+
+    Each thread (and each forked worker process) gets its own connection.
+    WAL journaling plus a busy timeout lets several analysis processes read
+    and write the same file concurrently.
+    """
+
+    SCHEMA = ""
+    # Table holding the entries, emptied by clear()
+    TABLE = ""
+
+    _shared_instances: Dict[tuple, 'SQLiteStore'] = {}
+    _shared_lock = threading.Lock()
+
+    @classmethod
+    def shared(cls, path: Union[str, Path]):
+        """Process-wide instance for a path, so callers reuse connections"""
+        key = (cls, str(path))
+        with cls._shared_lock:
+            if key not in cls._shared_instances:
+                cls._shared_instances[key] = cls(path)
+            return cls._shared_instances[key]
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._connection().executescript(self.SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        """Get the connection for the current thread and process"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def clear(self):
+        """Remove every cached entry"""
+        self._connection().execute(f'DELETE FROM {self.TABLE}')
+
+    def close(self):
+        """Close the connection owned by the current thread"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+class CachedAnswer(NamedTuple):
+    """A cached DNS response"""
+    rcode: str            # NOERROR, NXDOMAIN or NODATA
+    answers: List[str]    # rdata in presentation format
+    expires_at: float
+
+class DNSCache(SQLiteStore):
+    """DNS answer cache keyed by (qname, rdtype) that honors record TTLs
+
+    Positive answers live for the TTL of their RRset. NXDOMAIN and NODATA
+    responses are cached negatively for the SOA-derived TTL from the
+    authority section (RFC 2308). Timeouts and server failures are never
+    cached.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS dns_answers (
+            qname TEXT NOT NULL,
+            rdtype TEXT NOT NULL,
+            rcode TEXT NOT NULL,
+            answers TEXT NOT NULL,
+            expires_at REAL NOT NULL,
+            PRIMARY KEY (qname, rdtype)
+        ) WITHOUT ROWID;
+    """
+    TABLE = 'dns_answers'
+
+    # Negative TTL used when the response carries no SOA record
+    DEFAULT_NEGATIVE_TTL = 300
+    # RFC 2308 suggests capping negative caching at a few hours
+    MAX_NEGATIVE_TTL = 3 * 3600
+    MAX_POSITIVE_TTL = 7 * 24 * 3600
+
+    @classmethod
+    def default(cls) -> Optional['DNSCache']:
+        """Shared cache under the application cache directory, or None if disabled"""
+        config = ConfigManager()
+        if not config.get('cache_dns', True):
+            return None
+        return cls.shared(config.get_cache_dir() / 'dns_cache.sqlite3')
+
+    @staticmethod
+    def _key(qname: str, rdtype: str):
+        return str(qname).lower().rstrip('.'), str(rdtype).upper()
+
+    def get(self, qname: str, rdtype: str) -> Optional[CachedAnswer]:
+        """Get an unexpired cached response"""
+        try:
+            row = self._connection().execute(
+                'SELECT rcode, answers, expires_at FROM dns_answers WHERE qname = ? AND rdtype = ?',
+                self._key(qname, rdtype)
+            ).fetchone()
+        except sqlite3.Error:
+            return None
+        if not row or row[2] <= time.time():
+            return None
+        return CachedAnswer(row[0], row[1].split('\n') if row[1] else [], row[2])
+
+    def put(self, qname: str, rdtype: str, rcode: str, answers: List[str], ttl: float):
+        """Store a response for ttl seconds"""
+        try:
+            self._connection().execute(
+                'INSERT OR REPLACE INTO dns_answers (qname, rdtype, rcode, answers, expires_at) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (*self._key(qname, rdtype), rcode, '\n'.join(answers), time.time() + ttl)
+            )
+        except sqlite3.Error:
+            pass
+
+    def lookup(self, qname: str, rdtype: str) -> Optional[list]:
+        """Return cached rdata objects, or None on a miss
+
+        A cached negative response is re-raised as the same NXDOMAIN or
+        NoAnswer exception the resolver would have raised.
+        """
+        cached = self.get(qname, rdtype)
+        if cached is None:
+            return None
+        if cached.rcode == 'NXDOMAIN':
+            raise dns.resolver.NXDOMAIN()
+        if cached.rcode == 'NODATA':
+            raise dns.resolver.NoAnswer()
+        rdtype_value = dns.rdatatype.from_text(rdtype)
+        try:
+            return [dns.rdata.from_text(dns.rdataclass.IN, rdtype_value, text) for text in cached.answers]
+        except dns.exception.DNSException:
+            return None
+
+    def store_answer(self, qname: str, rdtype: str, answer):
+        """Cache a successful resolver answer for its TTL"""
+        ttl = min(answer.rrset.ttl, self.MAX_POSITIVE_TTL) if answer.rrset is not None else 0
+        if ttl > 0:
+            self.put(qname, rdtype, 'NOERROR', [rdata.to_text() for rdata in answer], ttl)
+
+    def store_error(self, qname: str, rdtype: str, error: dns.exception.DNSException):
+        """Negatively cache NXDOMAIN / NODATA; other failures are transient and skipped"""
+        if isinstance(error, dns.resolver.NXDOMAIN):
+            rcode = 'NXDOMAIN'
+            try:
+                responses = list(error.responses().values())
+            except Exception:
+                responses = []
+            response = responses[-1] if responses else None
+        elif isinstance(error, dns.resolver.NoAnswer):
+            rcode = 'NODATA'
+            try:
+                response = error.response()
+            except Exception:
+                response = None
+        else:
+            return
+        self.put(qname, rdtype, rcode, [], self._negative_ttl(response))
+
+    def _negative_ttl(self, response) -> float:
+        """Negative TTL per RFC 2308: min(SOA TTL, SOA MINIMUM)"""
+        if response is not None:
+            for rrset in getattr(response, 'authority', []):
+                if rrset.rdtype == dns.rdatatype.SOA and len(rrset):
+                    return min(rrset.ttl, rrset[0].minimum, self.MAX_NEGATIVE_TTL)
+        return self.DEFAULT_NEGATIVE_TTL
+
+    def purge_expired(self) -> int:
+        """Delete expired entries and return how many were removed"""
+        try:
+            cursor = self._connection().execute('DELETE FROM dns_answers WHERE expires_at <= ?', (time.time(),))
+            return cursor.rowcount
+        except sqlite3.Error:
+            return 0
+
+class IPInfoCache(SQLiteStore):
+    """IP geolocation cache: one indexed table instead of a JSON file per address
+
+    Entries expire after `expiry_days`. When the stored payload grows past
+    `max_size_mb`, expired rows are dropped first and then the least
+    recently used ones until the cache is back under the cap.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS ip_info (
+            ip TEXT PRIMARY KEY,
+            data TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            cached_at REAL NOT NULL,
+            accessed_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS ip_info_accessed ON ip_info (accessed_at);
+        CREATE INDEX IF NOT EXISTS ip_info_cached ON ip_info (cached_at);
+    """
+    TABLE = 'ip_info'
+
+    # SQLite's default limit on host parameters per statement
+    MAX_VARIABLES = 900
+    # Writes between size checks when storing entries one at a time
+    EVICTION_CHECK_INTERVAL = 256
+    # Evict down to this fraction of the cap so eviction doesn't run on every write
+    EVICTION_TARGET = 0.9
+
+    def __init__(self, path: Union[str, Path], expiry_days: float = 7, max_size_mb: float = 100):
+        super().__init__(path)
+        self.expiry = expiry_days * 24 * 3600
+        self.max_size = int(max_size_mb * 1024 * 1024)
+        self._writes = 0
+
+    @classmethod
+    def default(cls) -> Optional['IPInfoCache']:
+        """Shared cache under the application cache directory, or None if disabled"""
+        config = ConfigManager()
+        if not config.get('cache_ip_info', True):
+            return None
+        store = cls.shared(config.get_cache_dir() / 'ip_info.sqlite3')
+        store.expiry = config.get('cache_expiry_days', 7) * 24 * 3600
+        store.max_size = int(config.get('max_cache_size_mb', 100) * 1024 * 1024)
+        return store
+
+    @staticmethod
+    def _key(ip: str) -> str:
+        """Canonical form so equivalent IPv6 spellings share one entry"""
+        try:
+            return ipaddress.ip_address(ip.strip()).compressed
+        except ValueError:
+            return ip.strip().lower()
+
+    def get(self, ip: str) -> Optional[Dict]:
+        """Get unexpired info for one IP"""
+        return self.get_many([ip]).get(ip)
+
+    def get_many(self, ips: Iterable[str]) -> Dict[str, Dict]:
+        """Get unexpired info for many IPs; missing or stale ones are left out"""
+        keys = {}
+        for ip in ips:
+            keys.setdefault(self._key(ip), []).append(ip)
+        if not keys:
+            return {}
+
+        now = time.time()
+        found = {}
+        key_list = list(keys)
+        try:
+            conn = self._connection()
+            for start in range(0, len(key_list), self.MAX_VARIABLES):
+                batch = key_list[start:start + self.MAX_VARIABLES]
+                placeholders = ','.join('?' * len(batch))
+                rows = conn.execute(
+                    f'SELECT ip, data FROM ip_info WHERE cached_at > ? AND ip IN ({placeholders})',
+                    (now - self.expiry, *batch)
+                ).fetchall()
+                for key, data in rows:
+                    found[key] = json.loads(data)
+                if rows:
+                    conn.execute(
+                        f'UPDATE ip_info SET accessed_at = ? WHERE ip IN ({",".join("?" * len(rows))})',
+                        (now, *(row[0] for row in rows))
+                    )
+        except (sqlite3.Error, ValueError):
+            return {}
+
+        return {ip: data for key, data in found.items() for ip in keys[key]}
+
+    def put(self, ip: str, data: Dict):
+        """Store info for one IP"""
+        self._write([(ip, data)])
+        if self._writes >= self.EVICTION_CHECK_INTERVAL:
+            self.evict()
+
+    def put_many(self, items: Dict[str, Dict]):
+        """Store info for many IPs in one transaction"""
+        if items:
+            self._write(items.items())
+            self.evict()
+
+    def _write(self, items):
+        now = time.time()
+        rows = []
+        for ip, data in items:
+            payload = json.dumps(data, default=str)
+            rows.append((self._key(ip), payload, len(payload), now, now))
+        try:
+            conn = self._connection()
+            with conn:
+                conn.execute('BEGIN')
+                conn.executemany(
+                    'INSERT OR REPLACE INTO ip_info (ip, data, size, cached_at, accessed_at) '
+                    'VALUES (?, ?, ?, ?, ?)', rows
+                )
+            self._writes += len(rows)
+        except sqlite3.Error:
+            pass
+
+    def size(self) -> int:
+        """Total payload size in bytes"""
+        row = self._connection().execute('SELECT COALESCE(SUM(size), 0) FROM ip_info').fetchone()
+        return row[0]
+
+    def evict(self) -> int:
+        """Drop expired entries, then least recently used ones beyond the size cap"""
+        self._writes = 0
+        removed = 0
+        try:
+            conn = self._connection()
+            removed += conn.execute('DELETE FROM ip_info WHERE cached_at <= ?',
+                                    (time.time() - self.expiry,)).rowcount
+            total = self.size()
+            if total > self.max_size:
+                excess = total - int(self.max_size * self.EVICTION_TARGET)
+                # Walk the LRU index until enough payload has been freed
+                victims = []
+                for ip, size in conn.execute('SELECT ip, size FROM ip_info ORDER BY accessed_at'):
+                    victims.append((ip,))
+                    excess -= size
+                    if excess <= 0:
+                        break
+                conn.executemany('DELETE FROM ip_info WHERE ip = ?', victims)
+                removed += len(victims)
+        except sqlite3.Error:
+            pass
+        return removed
+
+class CachedKey(NamedTuple):
+    """A DKIM public key as stored on disk, already decoded from its TXT record"""
+    key_type: str         # rsa or ed25519
+    key_data: bytes       # DER SubjectPublicKeyInfo (rsa) or raw 32-byte key (ed25519)
+    hashes: str           # h= tag, colon separated; empty means any
+    flags: str            # t= tag, colon separated
+    services: str         # s= tag, colon separated
+
+class DKIMKeyCache(SQLiteStore):
+    """Decoded DKIM public keys keyed by (selector, domain)
+
+    Stores the base64-decoded key material and tags of each validated key
+    record, so a later run (or another worker process) neither queries DNS
+    nor re-parses the record.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS dkim_keys (
+            selector TEXT NOT NULL,
+            domain TEXT NOT NULL,
+            key_type TEXT NOT NULL,
+            key_data BLOB NOT NULL,
+            hashes TEXT NOT NULL,
+            flags TEXT NOT NULL,
+            services TEXT NOT NULL,
+            expires_at REAL NOT NULL,
+            PRIMARY KEY (selector, domain)
+        ) WITHOUT ROWID;
+    """
+    TABLE = 'dkim_keys'
+
+    # Selectors are rotated rarely; re-fetch once a day
+    DEFAULT_TTL = 24 * 3600
+
+    @classmethod
+    def default(cls) -> Optional['DKIMKeyCache']:
+        """Shared cache under the application cache directory, or None if disabled"""
+        config = ConfigManager()
+        if not config.get('cache_dkim_keys', True):
+            return None
+        return cls.shared(config.get_cache_dir() / 'dkim_keys.sqlite3')
+
+    @staticmethod
+    def _key(selector: str, domain: str):
+        return selector.lower(), domain.lower().rstrip('.')
+
+    def get(self, selector: str, domain: str) -> Optional[CachedKey]:
+        """Get an unexpired key"""
+        try:
+            row = self._connection().execute(
+                'SELECT key_type, key_data, hashes, flags, services FROM dkim_keys '
+                'WHERE selector = ? AND domain = ? AND expires_at > ?',
+                (*self._key(selector, domain), time.time())
+            ).fetchone()
+        except sqlite3.Error:
+            return None
+        return CachedKey(row[0], bytes(row[1]), row[2], row[3], row[4]) if row else None
+
+    def put(self, selector: str, domain: str, key: CachedKey, ttl: Optional[float] = None):
+        """Store a key for ttl seconds (DEFAULT_TTL when omitted)"""
+        expires_at = time.time() + (self.DEFAULT_TTL if ttl is None else ttl)
+        try:
+            self._connection().execute(
+                'INSERT OR REPLACE INTO dkim_keys (selector, domain, key_type, key_data, hashes, '
+                'flags, services, expires_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (*self._key(selector, domain), *key, expires_at)
+            )
+        except sqlite3.Error:
+            pass
+
+# Network-derived parts of a cached analysis, each refreshed on its own
+SECTION_IP = 'ip'     # geo/ASN, PTR and blacklist data of the sender and relays
+SECTION_DNS = 'dns'   # the DMARC and SPF records
+NETWORK_SECTIONS = (SECTION_IP, SECTION_DNS)
+
+class CachedResult(NamedTuple):
+    """A cached analysis and the network sections restored into it"""
+    result: object          # email_core.EmailParseResult
+    fresh: FrozenSet[str]   # sections from NETWORK_SECTIONS that were still fresh
+
+class ResultCache(SQLiteStore):
+    """Finished analyses keyed by a hash of the message's header block
+
+    The parse-derived part of a result is stored once and is only replaced
+    when the analyzer version (part of the key) changes. The network-derived
+    sections are stored beside it with their own timestamps; when one goes
+    stale it is left out of the returned result, so the caller repeats just
+    those lookups instead of the whole analysis.
+
+    Results are pickled. The file lives in the user's own cache directory,
+    like every other cache here, and is never read from anywhere else.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS results (
+            key TEXT PRIMARY KEY,
+            core BLOB NOT NULL,
+            core_expires_at REAL,
+            ip BLOB,
+            ip_at REAL,
+            dns BLOB,
+            dns_at REAL,
+            size INTEGER NOT NULL,
+            accessed_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed_at);
+    """
+    TABLE = 'results'
+
+    # Published DMARC/SPF policies change rarely, but an hour-old copy is enough
+    DEFAULT_DNS_TTL = 3600
+    # Verified signatures depend on DNS keys and expire with the key cache
+    SIGNATURE_TTL = DKIMKeyCache.DEFAULT_TTL
+    EVICTION_CHECK_INTERVAL = 256
+    EVICTION_TARGET = 0.9
+
+    def __init__(self, path: Union[str, Path], ip_expiry_days: float = 7,
+                 dns_ttl: float = DEFAULT_DNS_TTL, max_size_mb: float = 100):
+        super().__init__(path)
+        self.ttls = {SECTION_IP: ip_expiry_days * 24 * 3600, SECTION_DNS: dns_ttl}
+        self.max_size = int(max_size_mb * 1024 * 1024)
+        self._writes = 0
+
+    @classmethod
+    def default(cls) -> Optional['ResultCache']:
+        """Shared cache under the application cache directory, or None if disabled"""
+        config = ConfigManager()
+        if not config.get('cache_results', True):
+            return None
+        store = cls.shared(config.get_cache_dir() / 'results.sqlite3')
+        # IP data ages like the IP info cache it came from
+        store.ttls[SECTION_IP] = config.get('cache_expiry_days', 7) * 24 * 3600
+        store.max_size = int(config.get('max_cache_size_mb', 100) * 1024 * 1024)
+        return store
+
+    # -- sections --------------------------------------------------------
+
+    @staticmethod
+    def _extract(result, section: str):
+        """The data of one network section of a result"""
+        if section == SECTION_IP:
+            return {
+                'sender': result.ip_info,
+                'relays': [{name: getattr(relay, name) for name in relay.ENRICHMENT_FIELDS}
+                           for relay in result.relays]
+            }
+        return {'dmarc_txt': result.dmarc_txt, 'spf_txt': result.spf_txt}
+
+    @staticmethod
+    def _has_data(result, section: str) -> bool:
+        if section == SECTION_IP:
+            return bool(result.ip_info) or any(relay.ip_info is not None for relay in result.relays)
+        return bool(result.dmarc_txt or result.spf_txt)
+
+    @staticmethod
+    def _restore(result, section: str, data: Dict):
+        if section == SECTION_IP:
+            result.ip_info = data['sender']
+            for relay, entry in zip(result.relays, data['relays']):
+                for name, value in entry.items():
+                    setattr(relay, name, value)
+        else:
+            result.dmarc_txt, result.spf_txt = data['dmarc_txt'], data['spf_txt']
+
+    @staticmethod
+    def _core(result):
+        """A copy of a result with every network section and cache marker removed"""
+        core = copy.copy(result)
+        core.ip_info = {}
+        core.relays = [copy.copy(relay) for relay in result.relays]
+        for relay in core.relays:
+            relay.clear_enrichment()
+        core.dmarc_txt = core.spf_txt = ''
+        core.cache_key, core.cached_sections = '', frozenset()
+        return core
+
+    # -- storage ---------------------------------------------------------
+
+    def get(self, key: str) -> Optional[CachedResult]:
+        """A cached result with its fresh network sections filled in"""
+        now = time.time()
+        try:
+            conn = self._connection()
+            row = conn.execute(
+                'SELECT core, core_expires_at, ip, ip_at, dns, dns_at FROM results WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] is not None and row[1] <= now:
+                conn.execute('DELETE FROM results WHERE key = ?', (key,))
+                return None
+            conn.execute('UPDATE results SET accessed_at = ? WHERE key = ?', (now, key))
+            result = pickle.loads(row[0])
+            fresh = set()
+            for section, data, stored_at in ((SECTION_IP, row[2], row[3]), (SECTION_DNS, row[4], row[5])):
+                if data is not None and stored_at > now - self.ttls[section]:
+                    self._restore(result, section, pickle.loads(data))
+                    fresh.add(section)
+        except (sqlite3.Error, pickle.PickleError, AttributeError, EOFError, ImportError, KeyError,
+                TypeError, ValueError):
+            # Unreadable entries (e.g. written by an incompatible build) count as misses
+            return None
+        return CachedResult(result, frozenset(fresh))
+
+    def put(self, key: str, result, verified: bool = False):
+        """Store a new analysis along with whatever network sections it already holds
+
+        `verified` marks a result that includes signature verification; it
+        expires after SIGNATURE_TTL instead of being kept indefinitely.
+        """
+        now = time.time()
+        core = pickle.dumps(self._core(result), pickle.HIGHEST_PROTOCOL)
+        sections = {}
+        for section in NETWORK_SECTIONS:
+            if self._has_data(result, section):
+                sections[section] = pickle.dumps(self._extract(result, section), pickle.HIGHEST_PROTOCOL)
+        ip, dns_data = sections.get(SECTION_IP), sections.get(SECTION_DNS)
+        size = len(core) + sum(len(data) for data in sections.values())
+        try:
+            self._connection().execute(
+                'INSERT OR REPLACE INTO results (key, core, core_expires_at, ip, ip_at, dns, dns_at, '
+                'size, accessed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (key, core, now + self.SIGNATURE_TTL if verified else None,
+                 ip, now if ip is not None else None, dns_data, now if dns_data is not None else None,
+                 size, now)
+            )
+        except sqlite3.Error:
+            return
+        self._writes += 1
+        if self._writes >= self.EVICTION_CHECK_INTERVAL:
+            self.evict()
+
+    def update_sections(self, key: str, result, sections: Iterable[str] = NETWORK_SECTIONS):
+        """Save freshly looked-up network sections of a result stored earlier"""
+        now = time.time()
+        assignments, values = [], []
+        for section in sections:
+            assignments.append(f'{section} = ?, {section}_at = ?')
+            values += [pickle.dumps(self._extract(result, section), pickle.HIGHEST_PROTOCOL), now]
+        if not assignments:
+            return
+        try:
+            self._connection().execute(
+                f'UPDATE results SET {", ".join(assignments)}, '
+                'size = LENGTH(core) + COALESCE(LENGTH(ip), 0) + COALESCE(LENGTH(dns), 0) '
+                'WHERE key = ?', (*values, key)
+            )
+        except sqlite3.Error:
+            pass
+
+    def size(self) -> int:
+        """Total stored size in bytes"""
+        row = self._connection().execute('SELECT COALESCE(SUM(size), 0) FROM results').fetchone()
+        return row[0]
+
+    def evict(self) -> int:
+        """Drop expired entries, then least recently used ones beyond the size cap"""
+        self._writes = 0
+        removed = 0
+        try:
+            conn = self._connection()
+            removed += conn.execute('DELETE FROM results WHERE core_expires_at <= ?',
+                                    (time.time(),)).rowcount
+            total = self.size()
+            if total > self.max_size:
+                excess = total - int(self.max_size * self.EVICTION_TARGET)
+                victims = []
+                for key, size in conn.execute('SELECT key, size FROM results ORDER BY accessed_at'):
+                    victims.append((key,))
+                    excess -= size
+                    if excess <= 0:
+                        break
+                conn.executemany('DELETE FROM results WHERE key = ?', victims)
+                removed += len(victims)
+        except sqlite3.Error:
+            pass
+        return removed
@@ -77,11 +77,17 @@ class ConfigManager:
             'resolve_ptr': True,
             'cache_dns': True,
             'cache_ip_info': True,
+            'cache_dkim_keys': True,
+            'cache_results': True,
+            'verify_dkim': True,
+            'verify_arc': True,
             
             # Network
             'dns_timeout': 3,
             'http_timeout': 5,
             'max_retries': 2,
+            'offline_ip_lookup': False,
+            'ip_database_path': '',
             'use_proxy': False,
             'proxy_settings': {
                 'http': '',
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Delivery Timing Module
+Vectorized delay and clock-skew analysis over many relay chains
+
+The chains of a corpus are handled as one flat array of epoch timestamps
+(NaN where a hop's date did not parse) plus the offset at which each chain
+starts, as held by relay_hops.RelayColumns or the relays table written by
+result_batch. Delays use the same rules as EmailAnalyzer: the time since the
+previous hop, zero when either time is unknown, never negative. A hop stamped
+earlier than the one before it is flagged as clock-skewed.
+
+Usage:
+    python -m delivery_timing results/relays.parquet
+"""
+
+import argparse
+import sys
+from typing import List, NamedTuple, Optional, Sequence
+
+try:
+    import numpy as np
+    HAVE_NUMPY = True
+except ImportError:
+    HAVE_NUMPY = False
+
+from relay_hops import RelayColumns
+
+# Percentiles reported per relay host
+PERCENTILES = (50, 90, 99)
+
+def _require_numpy():
+    if not HAVE_NUMPY:
+        raise RuntimeError("Timing analysis needs the 'numpy' package (pip install numpy)")
+
+class ChainTiming(NamedTuple):
+    """Per-hop and per-chain delays for a set of relay chains"""
+    delays: 'np.ndarray'       # seconds since the previous hop of the same chain
+    measured: 'np.ndarray'     # hop and its predecessor both have a known time
+    cumulative: 'np.ndarray'   # seconds since the first hop of the same chain
+    skewed: 'np.ndarray'       # hop stamped earlier than the hop before it
+    totals: 'np.ndarray'       # total delay of each chain
+    skewed_hops: 'np.ndarray'  # number of skewed hops in each chain
+
+class HostTiming(NamedTuple):
+    """Delay distribution of the hops received by one host"""
+    host: str
+    hops: int
+    skewed: int
+    mean: float
+    percentiles: tuple         # values for PERCENTILES
+    max: float
+
+def chain_timing(timestamps: Sequence[float], starts: Sequence[int]) -> ChainTiming:
+    """Delays of every chain at once
+
+    `timestamps` is flat, `starts` has one offset per chain plus the end
+    offset, so chain i is timestamps[starts[i]:starts[i + 1]].
+    """
+    _require_numpy()
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    starts = np.asarray(starts, dtype=np.int64)
+    counts = np.diff(starts)
+
+    steps = np.diff(timestamps, prepend=np.nan)
+    # The first hop of each chain has no predecessor
+    steps[starts[:-1][counts > 0]] = np.nan
+    known = ~np.isnan(steps)
+    skewed = known & (steps < 0)
+    delays = np.where(known, np.clip(steps, 0, None), 0.0)
+
+    running = np.concatenate(([0.0], np.cumsum(delays)))
+    totals = running[starts[1:]] - running[starts[:-1]]
+    cumulative = running[1:] - np.repeat(running[starts[:-1]], counts)
+    skew_running = np.concatenate(([0], np.cumsum(skewed)))
+    skewed_hops = skew_running[starts[1:]] - skew_running[starts[:-1]]
+    return ChainTiming(delays, known, cumulative, skewed, totals, skewed_hops)
+
+def host_summary(hosts: Sequence[str], timing: ChainTiming,
+                 percentiles: Sequence[float] = PERCENTILES) -> List[HostTiming]:
+    """Delay percentiles per receiving host, busiest first
+
+    Each hop's delay is attributed to the host that stamped it (its `by`).
+    Hops with no predecessor or unknown times are left out.
+    """
+    _require_numpy()
+    names, inverse = np.unique(np.asarray(hosts, dtype=object).astype(str), return_inverse=True)
+    # One sort groups the measured hops by host, each group in delay order
+    rows = np.flatnonzero(timing.measured)
+    order = rows[np.lexsort((timing.delays[rows], inverse[rows]))]
+    group_ends = np.searchsorted(inverse[order], np.arange(len(names)), side='right')
+    group_starts = np.concatenate(([0], group_ends[:-1]))
+
+    summary = []
+    for index, name in enumerate(names):
+        rows = order[group_starts[index]:group_ends[index]]
+        if not len(rows):
+            continue
+        delays = timing.delays[rows]
+        summary.append(HostTiming(
+            host=str(name),
+            hops=len(rows),
+            skewed=int(np.count_nonzero(timing.skewed[rows])),
+            mean=float(delays.mean()),
+            percentiles=tuple(float(value) for value in np.percentile(delays, percentiles)),
+            max=float(delays[-1])
+        ))
+    summary.sort(key=lambda host: (-host.hops, host.host))
+    return summary
+
+def receiving_host(by: str) -> str:
+    """Host name from a Received `by` clause, without comments"""
+    parts = by.split(None, 1)
+    return parts[0].lower().rstrip('.') if parts else ''
+
+def columns_timing(columns: RelayColumns) -> ChainTiming:
+    """Timing of every chain held in a RelayColumns"""
+    _require_numpy()
+    return chain_timing(np.frombuffer(columns.timestamp, dtype=np.float64) if len(columns.timestamp)
+                        else np.empty(0), np.asarray(columns.starts, dtype=np.int64))
+
+def table_timing(table) -> ChainTiming:
+    """Timing from a relays table written by result_batch (pyarrow Table)
+
+    Rows of one message are contiguous, so chain boundaries are where the
+    message index changes.
+    """
+    _require_numpy()
+    import pyarrow.compute as pc
+    messages = table.column('message').to_numpy()
+    micros = pc.cast(table.column('time'), 'int64')
+    timestamps = pc.fill_null(pc.divide(pc.cast(micros, 'double'), 1e6), float('nan')).to_numpy()
+    boundaries = np.flatnonzero(np.diff(messages, prepend=-1) != 0)
+    starts = np.append(boundaries, len(messages))
+    return chain_timing(timestamps, starts)
+
+def _print_report(timing: ChainTiming, hosts: List[HostTiming], top: Optional[int], stream):
+    chains = len(timing.totals)
+    stream.write(f"{chains} messages, {len(timing.delays)} hops, "
+                 f"{int(np.count_nonzero(timing.skewed_hops))} messages with clock-skewed hops\n")
+    if chains:
+        totals = np.percentile(timing.totals, PERCENTILES)
+        values = ', '.join(f"p{p}={value:.1f}s" for p, value in zip(PERCENTILES, totals))
+        stream.write(f"Total delivery delay: {values}, max={timing.totals.max():.1f}s\n")
+    stream.write(f"\n{'Host':<50} {'Hops':>8} {'Skewed':>7} {'Mean':>8} "
+                 + ' '.join(f"{'p' + str(p):>8}" for p in PERCENTILES) + f" {'Max':>9}\n")
+    for host in hosts[:top] if top else hosts:
+        stream.write(f"{host.host[:50]:<50} {host.hops:>8} {host.skewed:>7} {host.mean:>8.1f} "
+                     + ' '.join(f"{value:>8.1f}" for value in host.percentiles) + f" {host.max:>9.1f}\n")
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(
+        prog='delivery_timing',
+        description='Summarize relay delays from a relays table written by batch_analyze --format'
+    )
+    parser.add_argument('relays', help='relays.parquet or relays.arrow')
+    parser.add_argument('--top', type=int, default=25, help='Hosts to list (0 for all)')
+    args = parser.parse_args(argv)
+
+    import pyarrow as pa
+    if args.relays.endswith('.arrow'):
+        with pa.ipc.open_file(args.relays) as reader:
+            table = reader.read_all()
+    else:
+        import pyarrow.parquet as pq
+        table = pq.read_table(args.relays, columns=['message', 'time', 'by'])
+
+    timing = table_timing(table)
+    hosts = host_summary([receiving_host(by) for by in table.column('by').to_pylist()], timing)
+    _print_report(timing, hosts, args.top, sys.stdout)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,671 @@
+"""
+DKIM Verification Module
+Cryptographic DKIM-Signature verification (RFC 6376, RFC 8301, RFC 8463)
+
+Each signature is checked end to end: header selection and
+canonicalization, the body hash and the RSA or Ed25519 signature over the
+signed headers. The body is hashed as a stream of chunks, once per distinct
+(canonicalization, hash, length) combination, however many signatures
+share it. Public keys are parsed once per (selector, domain) and kept in
+memory and in an on-disk DKIMKeyCache. A campaign signed with one selector
+therefore costs one DNS query and one key parse.
+
+Signature checks need the optional 'cryptography' package. Without it every
+signature is reported as neutral.
+"""
+
+import base64
+import binascii
+import hashlib
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+import dns.exception
+import dns.resolver
+
+from cache_store import CachedKey, DKIMKeyCache
+from email_core import MAX_HEADER_BYTES, read_header_block
+
+try:
+    from cryptography.exceptions import InvalidSignature, UnsupportedAlgorithm
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ed25519, padding, rsa
+    HAVE_CRYPTOGRAPHY = True
+except ImportError:
+    HAVE_CRYPTOGRAPHY = False
+
+# Verification results (RFC 8601 section 2.7.1)
+PASS = 'pass'
+FAIL = 'fail'
+NEUTRAL = 'neutral'
+POLICY = 'policy'
+NONE = 'none'
+PERMERROR = 'permerror'
+TEMPERROR = 'temperror'
+
+# a= tag -> (key type, hash)
+ALGORITHMS = {
+    'rsa-sha256': ('rsa', 'sha256'),
+    'rsa-sha1': ('rsa', 'sha1'),
+    'ed25519-sha256': ('ed25519', 'sha256'),
+}
+# RFC 8301: rsa-sha1 signatures and RSA keys under 1024 bits must not pass
+REJECTED_ALGORITHMS = {'rsa-sha1'}
+MIN_RSA_BITS = 1024
+
+_REQUIRED_TAGS = ('v', 'a', 'b', 'bh', 'd', 'h', 's')
+# ARC-Message-Signature has no v= and uses i= for the ARC instance (RFC 8617)
+_ARC_REQUIRED_TAGS = ('i', 'a', 'b', 'bh', 'd', 'h', 's')
+# Signatures checked per message; more than this is abuse, not mail
+MAX_SIGNATURES = 10
+# Body bytes read per chunk
+CHUNK_SIZE = 64 * 1024
+
+_FIELD_NAME_RE = re.compile(rb'([!-9;-~]+)[ \t]*:')
+_LINE_END_RE = re.compile(rb'\r?\n')
+_HEADER_END_RE = re.compile(rb'\r?\n\r?\n')
+_UNFOLD_RE = re.compile(rb'\r?\n')
+_WSP_RE = re.compile(rb'[ \t]+')
+_RELAXED_EOL_RE = re.compile(rb' ?\r?\n')
+_TRAILING_CRLF_RE = re.compile(rb'(?:\r\n)+\Z')
+# The b= tag value inside a DKIM-Signature (but not bh=)
+_B_TAG_RE = re.compile(rb'(^|;)([ \t\r\n]*b[ \t\r\n]*=)[^;]*')
+
+class DKIMError(Exception):
+    """A signature or key problem, carrying the result it maps to"""
+
+    def __init__(self, result: str, reason: str):
+        super().__init__(reason)
+        self.result = result
+        self.reason = reason
+
+@dataclass
+class DKIMResult:
+    """Outcome of verifying one DKIM-Signature header"""
+    result: str
+    domain: str = ''
+    selector: str = ''
+    algorithm: str = ''
+    identity: str = ''
+    reason: str = ''
+    testing: bool = False  # key published with t=y
+
+    @property
+    def passed(self) -> bool:
+        return self.result == PASS
+
+    def to_text(self) -> str:
+        """Render in Authentication-Results style"""
+        parts = [f"dkim={self.result}"]
+        if self.reason:
+            parts.append(f"({self.reason})")
+        if self.domain:
+            parts.append(f"header.d={self.domain}")
+        if self.selector:
+            parts.append(f"header.s={self.selector}")
+        if self.algorithm:
+            parts.append(f"header.a={self.algorithm}")
+        return ' '.join(parts)
+
+    def to_dict(self) -> Dict:
+        return {
+            'result': self.result,
+            'domain': self.domain,
+            'selector': self.selector,
+            'algorithm': self.algorithm,
+            'identity': self.identity,
+            'reason': self.reason,
+            'testing': self.testing
+        }
+
+def parse_tag_list(value: str) -> Dict[str, str]:
+    """Parse a DKIM tag=value list (RFC 6376 section 3.2)"""
+    tags = {}
+    for part in value.split(';'):
+        part = part.strip()
+        if not part:
+            continue
+        name, sep, tag_value = part.partition('=')
+        name = name.strip()
+        if not sep or not name:
+            raise DKIMError(PERMERROR, 'malformed tag list')
+        if name in tags:
+            raise DKIMError(PERMERROR, f'duplicate {name}= tag')
+        tags[name] = tag_value.strip()
+    return tags
+
+def decode_base64(value: str, what: str) -> bytes:
+    try:
+        return base64.b64decode(''.join(value.split()), validate=True)
+    except (binascii.Error, ValueError):
+        raise DKIMError(PERMERROR, f'invalid base64 in {what}')
+
+def split_header_fields(raw: bytes) -> List[Tuple[str, bytes]]:
+    """Split a raw header block into (lowercase name, field) pairs
+
+    Each field keeps its original bytes, with folded lines re-joined by
+    CRLF, so it can be canonicalized with either method. Lines that are not
+    headers (an mbox 'From ' line, garbage) are skipped.
+    """
+    fields: List[Tuple[str, List[bytes]]] = []
+    for line in _LINE_END_RE.split(raw):
+        if line[:1] in (b' ', b'\t'):
+            if fields:
+                fields[-1][1].append(line)
+            continue
+        match = _FIELD_NAME_RE.match(line)
+        if match:
+            fields.append((match.group(1).decode('ascii').lower(), [line]))
+    return [(name, b'\r\n'.join(lines)) for name, lines in fields]
+
+def canonicalize_header(field: bytes, method: str) -> bytes:
+    """Canonicalize one header field, including its trailing CRLF"""
+    if method == 'simple':
+        return field + b'\r\n'
+    name, value = field.split(b':', 1)
+    value = _WSP_RE.sub(b' ', _UNFOLD_RE.sub(b'', value)).strip(b' ')
+    return name.rstrip(b' \t').lower() + b':' + value + b'\r\n'
+
+def strip_signature_value(field: bytes) -> bytes:
+    """A signature header with its b= value emptied, as it was when signed"""
+    name, value = field.split(b':', 1)
+    return name + b':' + _B_TAG_RE.sub(rb'\1\2', value)
+
+class BodyHasher:
+    """Incremental DKIM body hash over a stream of chunks
+
+    Line endings are normalized to CRLF. Runs of empty lines are held back
+    until a non-empty line follows them, so trailing empty lines are
+    dropped without buffering the body. The l= limit applies to the
+    canonicalized bytes.
+    """
+
+    def __init__(self, method: str, hash_name: str, length: Optional[int] = None):
+        self.method = method
+        self.limit = length
+        self.length = 0
+        self._hash = hashlib.new(hash_name)
+        self._partial = b''
+        self._pending_empty = 0
+
+    def _emit(self, data: bytes):
+        if self.limit is not None:
+            data = data[:self.limit - self.length]
+        if data:
+            self._hash.update(data)
+            self.length += len(data)
+
+    def _lines(self, block: bytes):
+        """Hash a run of complete lines (block ends with a newline)"""
+        if self.method == 'relaxed':
+            block = _RELAXED_EOL_RE.sub(b'\r\n', _WSP_RE.sub(b' ', block))
+        else:
+            block = _LINE_END_RE.sub(b'\r\n', block)
+        trailing = _TRAILING_CRLF_RE.search(block)
+        empty_lines = (trailing.end() - trailing.start()) // 2
+        if trailing.start() == 0:
+            # Nothing but empty lines: hold them until we know they aren't trailing
+            self._pending_empty += empty_lines
+            return
+        if self._pending_empty:
+            self._emit(b'\r\n' * self._pending_empty)
+        # Keep the CRLF that ends the last non-empty line
+        self._emit(block[:trailing.start() + 2])
+        self._pending_empty = empty_lines - 1
+
+    def update(self, chunk: bytes):
+        """Feed the next chunk of the raw body"""
+        if self.limit is not None and self.length >= self.limit:
+            return
+        end = chunk.rfind(b'\n')
+        if end < 0:
+            self._partial += chunk
+            return
+        self._lines(self._partial + chunk[:end + 1])
+        self._partial = chunk[end + 1:]
+
+    def digest(self) -> bytes:
+        """Finish the stream and return the body hash"""
+        if self._partial:
+            # A body without a final line break is treated as if it had one
+            self._lines(self._partial + b'\n')
+            self._partial = b''
+        if self.method == 'simple' and self.length == 0 and self.limit != 0:
+            # The simple canonical form of an empty body is a single CRLF
+            self._emit(b'\r\n')
+        return self._hash.digest()
+
+@dataclass
+class DKIMSignature:
+    """A parsed DKIM-Signature header field"""
+    raw: bytes
+    algorithm: str
+    domain: str
+    selector: str
+    signed_headers: List[str]
+    signature: bytes
+    body_hash: bytes
+    header_canon: str = 'simple'
+    body_canon: str = 'simple'
+    body_length: Optional[int] = None
+    identity: str = ''
+    timestamp: Optional[int] = None
+    expiration: Optional[int] = None
+    tags: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def key_type(self) -> str:
+        return ALGORITHMS[self.algorithm][0]
+
+    @property
+    def hash_name(self) -> str:
+        return ALGORITHMS[self.algorithm][1]
+
+    @property
+    def body_spec(self) -> Tuple[str, str, Optional[int]]:
+        """What hash_body() needs to compute this signature's body hash"""
+        return self.body_canon, self.hash_name, self.body_length
+
+    @classmethod
+    def parse(cls, raw_field: bytes, arc: bool = False) -> 'DKIMSignature':
+        """Parse and validate a raw DKIM-Signature (or ARC-Message-Signature) field"""
+        tags = parse_tag_list(raw_field.split(b':', 1)[1].decode('latin-1'))
+        missing = [tag for tag in (_ARC_REQUIRED_TAGS if arc else _REQUIRED_TAGS) if tag not in tags]
+        if missing:
+            raise DKIMError(PERMERROR, f"missing {', '.join(t + '=' for t in missing)} tag")
+        if not arc and tags['v'] != '1':
+            raise DKIMError(PERMERROR, f"unsupported version v={tags['v']}")
+
+        algorithm = tags['a'].lower()
+        if algorithm not in ALGORITHMS:
+            raise DKIMError(PERMERROR, f'unsupported algorithm {algorithm}')
+
+        canon = tags.get('c', 'simple/simple').lower()
+        header_canon, _, body_canon = canon.partition('/')
+        body_canon = body_canon or 'simple'
+        if header_canon not in ('simple', 'relaxed') or body_canon not in ('simple', 'relaxed'):
+            raise DKIMError(PERMERROR, f'unsupported canonicalization {canon}')
+
+        signed_headers = [name.strip().lower() for name in tags['h'].split(':') if name.strip()]
+        if 'from' not in signed_headers:
+            raise DKIMError(PERMERROR, 'From header not signed')
+        if arc and 'arc-seal' in signed_headers:
+            raise DKIMError(PERMERROR, 'ARC-Seal must not be signed by h=')
+
+        domain = tags['d'].lower().rstrip('.')
+        identity = tags['i'] if arc else tags.get('i', '@' + domain)
+        identity_domain = identity.rpartition('@')[2].lower().rstrip('.')
+        if not arc and identity_domain != domain and not identity_domain.endswith('.' + domain):
+            raise DKIMError(PERMERROR, 'i= domain is not within d=')
+
+        try:
+            body_length = int(tags['l']) if 'l' in tags else None
+            timestamp = int(tags['t']) if 't' in tags else None
+            expiration = int(tags['x']) if 'x' in tags else None
+        except ValueError:
+            raise DKIMError(PERMERROR, 'non-numeric l=, t= or x= tag')
+        if timestamp is not None and expiration is not None and expiration < timestamp:
+            raise DKIMError(PERMERROR, 'x= is earlier than t=')
+
+        return cls(
+            raw=raw_field,
+            algorithm=algorithm,
+            domain=domain,
+            selector=tags['s'].strip(),
+            signed_headers=signed_headers,
+            signature=decode_base64(tags['b'], 'b='),
+            body_hash=decode_base64(tags['bh'], 'bh='),
+            header_canon=header_canon,
+            body_canon=body_canon,
+            body_length=body_length,
+            identity=identity,
+            timestamp=timestamp,
+            expiration=expiration,
+            tags=tags
+        )
+
+    def signed_data(self, fields: List[Tuple[str, bytes]]) -> bytes:
+        """The canonicalized header data the signature covers"""
+        # Repeated names are consumed from the bottom of the header up
+        available: Dict[str, List[bytes]] = {}
+        for name, raw in fields:
+            available.setdefault(name, []).append(raw)
+        parts = []
+        for name in self.signed_headers:
+            instances = available.get(name)
+            if instances:
+                parts.append(canonicalize_header(instances.pop(), self.header_canon))
+        own = canonicalize_header(strip_signature_value(self.raw), self.header_canon)
+        parts.append(own[:-2])
+        return b''.join(parts)
+
+@dataclass
+class DKIMKey:
+    """A parsed DKIM public key record (RFC 6376 section 3.6.1)"""
+    key_type: str
+    key_data: bytes
+    public_key: object
+    hashes: Tuple[str, ...] = ()
+    flags: Tuple[str, ...] = ()
+    services: Tuple[str, ...] = ('*',)
+
+    @property
+    def testing(self) -> bool:
+        return 'y' in self.flags
+
+    @property
+    def strict(self) -> bool:
+        """t=s: the i= domain must equal d= exactly"""
+        return 's' in self.flags
+
+    @classmethod
+    def from_record(cls, record: str) -> 'DKIMKey':
+        """Parse a key TXT record"""
+        tags = parse_tag_list(record)
+        if 'v' in tags and tags['v'] != 'DKIM1':
+            raise DKIMError(PERMERROR, f"unsupported key version v={tags['v']}")
+        if 'p' not in tags:
+            raise DKIMError(PERMERROR, 'key record has no p= tag')
+        if not tags['p'].strip():
+            raise DKIMError(PERMERROR, 'key revoked')
+
+        def split(name, default=''):
+            return tuple(v.strip().lower() for v in tags.get(name, default).split(':') if v.strip())
+
+        return cls.load(tags.get('k', 'rsa').lower(), decode_base64(tags['p'], 'key p='),
+                        split('h'), split('t'), split('s', '*'))
+
+    @classmethod
+    def from_cached(cls, cached: CachedKey) -> 'DKIMKey':
+        def split(value):
+            return tuple(v for v in value.split(':') if v)
+        return cls.load(cached.key_type, cached.key_data, split(cached.hashes),
+                        split(cached.flags), split(cached.services))
+
+    @classmethod
+    def load(cls, key_type: str, key_data: bytes, hashes=(), flags=(), services=('*',)) -> 'DKIMKey':
+        """Build a key from decoded key material"""
+        if not HAVE_CRYPTOGRAPHY:
+            raise DKIMError(NEUTRAL, "the 'cryptography' package is not installed")
+        try:
+            if key_type == 'rsa':
+                public_key = serialization.load_der_public_key(key_data)
+                if not isinstance(public_key, rsa.RSAPublicKey):
+                    raise DKIMError(PERMERROR, 'k=rsa but the key is not RSA')
+                if public_key.key_size < MIN_RSA_BITS:
+                    raise DKIMError(PERMERROR, f'{public_key.key_size}-bit RSA key is too short')
+            elif key_type == 'ed25519':
+                public_key = ed25519.Ed25519PublicKey.from_public_bytes(key_data)
+            else:
+                raise DKIMError(PERMERROR, f'unsupported key type k={key_type}')
+        except (ValueError, UnsupportedAlgorithm):
+            raise DKIMError(PERMERROR, 'unparseable public key')
+        return cls(key_type, key_data, public_key, tuple(hashes), tuple(flags), tuple(services))
+
+    def check_usable(self, algorithm: str):
+        """Raise DKIMError unless this key may check a signature made with algorithm"""
+        key_type, hash_name = ALGORITHMS[algorithm]
+        if self.key_type != key_type:
+            raise DKIMError(PERMERROR, f'key type {self.key_type} does not match a={algorithm}')
+        if self.hashes and hash_name not in self.hashes:
+            raise DKIMError(PERMERROR, f'key does not allow {hash_name}')
+        if '*' not in self.services and 'email' not in self.services:
+            raise DKIMError(PERMERROR, 'key is not for email')
+
+    def to_cached(self) -> CachedKey:
+        return CachedKey(self.key_type, self.key_data, ':'.join(self.hashes),
+                         ':'.join(self.flags), ':'.join(self.services))
+
+    def verify(self, signature: bytes, data: bytes, hash_name: str) -> bool:
+        """Check a signature over canonicalized header data"""
+        try:
+            if self.key_type == 'ed25519':
+                # RFC 8463 signs the SHA-256 digest, not the data itself
+                self.public_key.verify(signature, hashlib.sha256(data).digest())
+            else:
+                algorithm = hashes.SHA256() if hash_name == 'sha256' else hashes.SHA1()
+                self.public_key.verify(signature, data, padding.PKCS1v15(), algorithm)
+        except InvalidSignature:
+            return False
+        return True
+
+class DKIMKeyStore:
+    """DKIM public keys by (selector, domain), fetched and parsed once
+
+    Keys live in memory for the life of the store and on disk in a
+    DKIMKeyCache shared with other processes. Concurrent requests for the
+    same key wait for a single fetch. Missing or broken keys are remembered
+    for negative_ttl seconds; DNS failures are not remembered.
+    """
+
+    _default: Optional['DKIMKeyStore'] = None
+    _default_lock = threading.Lock()
+
+    def __init__(self, dns_service=None, cache: Optional[DKIMKeyCache] = None,
+                 use_cache: bool = True, negative_ttl: float = 300.0):
+        if dns_service is None:
+            from dns_lookup import DNSLookupService
+            dns_service = DNSLookupService()
+        self.dns_service = dns_service
+        self.cache = cache if cache is not None or not use_cache else DKIMKeyCache.default()
+        self.negative_ttl = negative_ttl
+        self._keys: Dict[Tuple[str, str], Tuple[float, object]] = {}
+        self._lock = threading.Lock()
+        self._fetch_locks: Dict[Tuple[str, str], threading.Lock] = {}
+        # Key records queried from DNS, for statistics
+        self.fetches = 0
+
+    @classmethod
+    def default(cls) -> 'DKIMKeyStore':
+        """Process-wide store, so every verifier shares one set of parsed keys"""
+        with cls._default_lock:
+            if cls._default is None:
+                cls._default = cls()
+            return cls._default
+
+    def _memo(self, key: Tuple[str, str]):
+        with self._lock:
+            entry = self._keys.get(key)
+        if entry and entry[0] > time.monotonic():
+            return entry[1]
+        return None
+
+    def get(self, selector: str, domain: str) -> DKIMKey:
+        """The key for a selector, raising DKIMError if it can't be used"""
+        key = (selector.lower(), domain.lower().rstrip('.'))
+        entry = self._memo(key)
+        if entry is None:
+            with self._lock:
+                fetch_lock = self._fetch_locks.setdefault(key, threading.Lock())
+            with fetch_lock:
+                entry = self._memo(key)
+                if entry is None:
+                    entry = self._load(*key)
+        if isinstance(entry, DKIMError):
+            raise DKIMError(entry.result, entry.reason)
+        return entry
+
+    def _load(self, selector: str, domain: str):
+        """Load a key from the disk cache or DNS and memoize the outcome"""
+        key = (selector, domain)
+        if self.cache is not None:
+            cached = self.cache.get(selector, domain)
+            if cached is not None:
+                try:
+                    return self._remember(key, DKIMKey.from_cached(cached), DKIMKeyCache.DEFAULT_TTL)
+                except DKIMError:
+                    pass
+
+        self.fetches += 1
+        try:
+            answers = self.dns_service._resolve(f'{selector}._domainkey.{domain}', 'TXT')
+        except (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer):
+            return self._remember(key, DKIMError(PERMERROR, 'no key for signature'), self.negative_ttl)
+        except dns.exception.DNSException as e:
+            # Transient: report it but let the next message try again
+            return DKIMError(TEMPERROR, f'key lookup failed: {e.__class__.__name__}')
+
+        error = DKIMError(PERMERROR, 'no key for signature')
+        for rdata in answers:
+            try:
+                parsed = DKIMKey.from_record(self.dns_service._extract_txt_string(rdata))
+            except DKIMError as e:
+                error = e
+                continue
+            if self.cache is not None:
+                self.cache.put(selector, domain, parsed.to_cached())
+            return self._remember(key, parsed, DKIMKeyCache.DEFAULT_TTL)
+        return self._remember(key, error, self.negative_ttl)
+
+    def _remember(self, key: Tuple[str, str], value, ttl: float):
+        with self._lock:
+            self._keys[key] = (time.monotonic() + ttl, value)
+        return value
+
+    def clear(self):
+        """Forget every key held in memory"""
+        with self._lock:
+            self._keys.clear()
+
+BodySpec = Tuple[str, str, Optional[int]]  # (canonicalization, hash, l= length)
+
+def hash_body(specs: Iterable[BodySpec], body: Iterable[bytes]) -> Dict[BodySpec, bytes]:
+    """Compute every requested body hash in one streaming pass over the body
+
+    The body is not read at all when nothing is requested.
+    """
+    hashers = {spec: BodyHasher(*spec) for spec in specs}
+    if not hashers:
+        return {}
+    for chunk in body:
+        for hasher in hashers.values():
+            hasher.update(chunk)
+    return {spec: hasher.digest() for spec, hasher in hashers.items()}
+
+def iter_chunks(fp: BinaryIO, size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """Read a file handle in fixed-size chunks"""
+    while True:
+        chunk = fp.read(size)
+        if not chunk:
+            return
+        yield chunk
+
+def _iter_view(data, start: int, size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """Chunks of a bytes-like object or mmap without copying the whole body"""
+    view = memoryview(data)
+    try:
+        for offset in range(start, len(view), size):
+            yield view[offset:offset + size].tobytes()
+    finally:
+        view.release()
+
+def split_message(data: Union[bytes, bytearray, memoryview]) -> Tuple[bytes, Iterator[bytes]]:
+    """Split a raw message held in memory into its header block and lazily read body chunks"""
+    end = _HEADER_END_RE.search(data, 0, MAX_HEADER_BYTES)
+    if end is None:
+        return bytes(data[:MAX_HEADER_BYTES]), iter(())
+    return bytes(data[:end.start()]), _iter_view(data, end.end())
+
+@dataclass
+class PendingVerification:
+    """DKIM signatures checked as far as possible without reading the body"""
+    fields: List[Tuple[str, bytes]]
+    results: List[DKIMResult]
+    checks: List[Tuple[int, DKIMSignature, DKIMKey]]
+
+    @property
+    def body_specs(self) -> Set[BodySpec]:
+        return {signature.body_spec for _, signature, _ in self.checks}
+
+class DKIMVerifier:
+    """Verifies every DKIM-Signature on a message
+
+    Verification runs in two phases so that other stages (ARC) can share
+    the single pass over the body: prepare() parses signatures and fetches
+    keys, hash_body() reads the body once for everything pending, and
+    complete() checks the hashes and signatures.
+    """
+
+    def __init__(self, key_store: Optional[DKIMKeyStore] = None, max_signatures: int = MAX_SIGNATURES):
+        self.key_store = key_store or DKIMKeyStore.default()
+        self.max_signatures = max_signatures
+
+    def verify(self, header_block: bytes, body: Iterable[bytes],
+               now: Optional[float] = None) -> List[DKIMResult]:
+        """Verify a message given its raw header block and its body as chunks
+
+        Results are returned in header order. The body is only read when at
+        least one signature got far enough to need its body hash.
+        """
+        pending = self.prepare(split_header_fields(header_block), now)
+        return self.complete(pending, hash_body(pending.body_specs, body))
+
+    def prepare(self, fields: List[Tuple[str, bytes]], now: Optional[float] = None) -> PendingVerification:
+        """Parse each signature and run every check that needs no body"""
+        raw_signatures = [raw for name, raw in fields if name == 'dkim-signature'][:self.max_signatures]
+        now = time.time() if now is None else now
+
+        results: List[DKIMResult] = []
+        checks: List[Tuple[int, DKIMSignature, DKIMKey]] = []
+        for raw in raw_signatures:
+            result = DKIMResult(result=PERMERROR)
+            results.append(result)
+            try:
+                signature = DKIMSignature.parse(raw)
+                result.domain, result.selector = signature.domain, signature.selector
+                result.algorithm, result.identity = signature.algorithm, signature.identity
+                key = self._precheck(signature, now)
+            except DKIMError as e:
+                result.result, result.reason = e.result, e.reason
+                continue
+            result.testing = key.testing
+            checks.append((len(results) - 1, signature, key))
+        return PendingVerification(fields, results, checks)
+
+    def complete(self, pending: PendingVerification, digests: Dict[BodySpec, bytes]) -> List[DKIMResult]:
+        """Finish verification given the body hashes from hash_body()"""
+        for index, signature, key in pending.checks:
+            result = pending.results[index]
+            if digests[signature.body_spec] != signature.body_hash:
+                result.result, result.reason = FAIL, 'body hash mismatch'
+            elif not key.verify(signature.signature, signature.signed_data(pending.fields),
+                                signature.hash_name):
+                result.result, result.reason = FAIL, 'signature did not verify'
+            else:
+                result.result = PASS
+                if signature.body_length is not None:
+                    result.reason = f'only the first {signature.body_length} body bytes are signed'
+        return pending.results
+
+    def _precheck(self, signature: DKIMSignature, now: float) -> DKIMKey:
+        """Checks that need no body: policy, expiry and the public key"""
+        if not HAVE_CRYPTOGRAPHY:
+            raise DKIMError(NEUTRAL, "the 'cryptography' package is not installed")
+        if signature.algorithm in REJECTED_ALGORITHMS:
+            raise DKIMError(PERMERROR, f'{signature.algorithm} is no longer accepted (RFC 8301)')
+        if signature.expiration is not None and signature.expiration < now:
+            raise DKIMError(FAIL, 'signature expired')
+
+        key = self.key_store.get(signature.selector, signature.domain)
+        key.check_usable(signature.algorithm)
+        if key.strict and signature.identity.rpartition('@')[2].lower() != signature.domain:
+            raise DKIMError(PERMERROR, 'key requires i= to match d= exactly')
+        return key
+
+    def verify_bytes(self, data: Union[bytes, bytearray, memoryview]) -> List[DKIMResult]:
+        """Verify a raw message held in memory (bytes or mmap)"""
+        return self.verify(*split_message(data))
+
+    def verify_stream(self, header_block: bytes, fp: BinaryIO) -> List[DKIMResult]:
+        """Verify a message whose headers were already read from fp, reading the rest as body"""
+        return self.verify(header_block, iter_chunks(fp))
+
+    def verify_file(self, source: Union[str, BinaryIO]) -> List[DKIMResult]:
+        """Verify a message from a path or a binary file handle positioned at its start"""
+        if isinstance(source, str):
+            with open(source, 'rb') as fp:
+                return self.verify_stream(read_header_block(fp), fp)
+        return self.verify_stream(read_header_block(source), source)
@@ -3,83 +3,19 @@ DNS Lookup Service Module
 Handles DNS queries for DMARC, SPF, DKIM records
 """
 
+import asyncio
+import dns.asyncresolver
 import dns.resolver
 import dns.exception
-from typing import Optional, List, Dict
-from functools import lru_cache
+import dns.reversename
+from typing import Optional, List, Dict, Iterable, Tuple
 import re
 
-class DNSLookupService:
-    """Service for DNS record lookups"""
-    
-    def __init__(self):
-        self.resolver = dns.resolver.Resolver()
-        self.resolver.timeout = 3
-        self.resolver.lifetime = 5
-        
-    @lru_cache(maxsize=128)
-    def get_dmarc_record(self, domain: str) -> Optional[str]:
-        """Get DMARC record for a domain"""
-        if not domain:
-            return None
-            
-        try:
-            # DMARC records are at _dmarc.domain
-            dmarc_domain = f'_dmarc.{domain}'
-            answers = self.resolver.resolve(dmarc_domain, 'TXT')
-            
-            for rdata in answers:
-                txt_string = self._extract_txt_string(rdata)
-                if txt_string and txt_string.startswith('v=DMARC1'):
-                    return txt_string
-                    
-        except (dns.resolver.NoAnswer, dns.resolver.NXDOMAIN):
-            # Try organizational domain if subdomain fails
-            if domain.count('.') > 1:
-                parent_domain = '.'.join(domain.split('.')[1:])
-                return self.get_dmarc_record(parent_domain)
-        except dns.exception.DNSException:
-            pass
-            
-        return None
-    
-    @lru_cache(maxsize=128)
-    def get_spf_record(self, domain: str) -> Optional[str]:
-        """Get SPF record for a domain"""
-        if not domain:
-            return None
-            
-        try:
-            answers = self.resolver.resolve(domain, 'TXT')
-            
-            for rdata in answers:
-                txt_string = self._extract_txt_string(rdata)
-                if txt_string and txt_string.startswith('v=spf1'):
-                    return txt_string
-                    
-        except (dns.resolver.NoAnswer, dns.resolver.NXDOMAIN, dns.exception.DNSException):
-            pass
-            
-        return None
-    
-    def get_dkim_selector_record(self, selector: str, domain: str) -> Optional[str]:
-        """Get DKIM record for a specific selector and domain"""
-        if not selector or not domain:
-            return None
-            
-        try:
-            dkim_domain = f'{selector}._domainkey.{domain}'
-            answers = self.resolver.resolve(dkim_domain, 'TXT')
-            
-            for rdata in answers:
-                txt_string = self._extract_txt_string(rdata)
-                if txt_string:
-                    return txt_string
-                    
-        except (dns.resolver.NoAnswer, dns.resolver.NXDOMAIN, dns.exception.DNSException):
-            pass
-            
-        return None
+from cache_store import DNSCache
+from psl import organizational_domain
+
+class DNSRecordParsing:
+    """Record parsing helpers shared by the blocking and asyncio lookup services"""
     
     def parse_dmarc_policy(self, dmarc_record: str) -> Dict[str, str]:
         """Parse DMARC record into components"""
@@ -124,43 +60,169 @@ class DNSLookupService:
         
         return components
     
-    def check_spf_alignment(self, spf_record: str, sender_ip: str) -> bool:
-        """Check if sender IP is authorized by SPF record"""
-        if not spf_record or not sender_ip:
-            return False
+    def _dmarc_candidates(self, domain: str) -> List[str]:
+        """Names to look for a DMARC record at: the domain, then its organizational domain"""
+        domain = (domain or '').strip().rstrip('.').lower()
+        if not domain:
+            return []
+        org_domain = organizational_domain(domain)
+        return [domain] if org_domain == domain else [domain, org_domain]
+    
+    def _select_dmarc_record(self, answers) -> Optional[str]:
+        """The DMARC record among a name's TXT answers"""
+        for rdata in answers:
+            txt_string = self._extract_txt_string(rdata)
+            if txt_string and txt_string.startswith('v=DMARC1'):
+                return txt_string
+        return None
+    
+    def _extract_txt_string(self, rdata) -> str:
+        """Extract text string from DNS TXT record data"""
+        try:
+            # Handle different formats of TXT records
+            if hasattr(rdata, 'strings'):
+                # Concatenate multiple strings in the TXT record
+                return ''.join(s.decode('utf-8') if isinstance(s, bytes) else s 
+                              for s in rdata.strings)
+            else:
+                return str(rdata).strip('"')
+        except:
+            return str(rdata)
+    
+    def _ip_in_range(self, ip: str, ip_range: str) -> bool:
+        """Check if IP is in the specified range"""
+        try:
+            import ipaddress
             
-        # Parse SPF mechanisms
-        parts = spf_record.split()
+            # Handle single IP or CIDR notation
+            if '/' in ip_range:
+                network = ipaddress.ip_network(ip_range, strict=False)
+                ip_addr = ipaddress.ip_address(ip)
+                return ip_addr in network
+            else:
+                return ip == ip_range
+                
+        except ValueError:
+            return False
+
+class DNSLookupService(DNSRecordParsing):
+    """Service for DNS record lookups
+    
+    Answers are kept in a persistent DNSCache (shared with other processes)
+    for their TTL; pass use_cache=False to always query the network.
+    """
+    
+    def __init__(self, cache: Optional[DNSCache] = None, use_cache: bool = True):
+        self.resolver = dns.resolver.Resolver()
+        self.resolver.timeout = 3
+        self.resolver.lifetime = 5
+        self.cache = cache if cache is not None or not use_cache else DNSCache.default()
+        self._spf_evaluator = None
+    
+    def _resolve(self, qname: str, rdtype: str):
+        """Resolve a query, answering from the cache when possible"""
+        if self.cache is not None:
+            cached = self.cache.lookup(qname, rdtype)
+            if cached is not None:
+                return cached
+        try:
+            answer = self.resolver.resolve(qname, rdtype)
+        except dns.exception.DNSException as e:
+            if self.cache is not None:
+                self.cache.store_error(qname, rdtype, e)
+            raise
+        if self.cache is not None:
+            self.cache.store_answer(qname, rdtype, answer)
+        return list(answer)
         
-        for part in parts:
-            # Check IP4 mechanism
-            if part.startswith('ip4:'):
-                ip_range = part[4:]
-                if self._ip_in_range(sender_ip, ip_range):
-                    return True
+    def get_dmarc_record(self, domain: str) -> Optional[str]:
+        """Get DMARC record for a domain"""
+        record, _ = self.find_dmarc_record(domain)
+        return record
+    
+    def find_dmarc_record(self, domain: str) -> Tuple[Optional[str], Optional[str]]:
+        """Get the DMARC record for a domain and the domain it was published at
+        
+        Per RFC 7489 section 6.6.3 at most two names are queried: the domain
+        itself, then its organizational domain.
+        """
+        for candidate in self._dmarc_candidates(domain):
+            try:
+                answers = self._resolve(f'_dmarc.{candidate}', 'TXT')
+            except (dns.resolver.NoAnswer, dns.resolver.NXDOMAIN):
+                continue
+            except dns.exception.DNSException:
+                break
+            record = self._select_dmarc_record(answers)
+            if record:
+                return record, candidate
+        return None, None
+    
+    def get_spf_record(self, domain: str) -> Optional[str]:
+        """Get SPF record for a domain"""
+        if not domain:
+            return None
+            
+        try:
+            answers = self._resolve(domain, 'TXT')
+            
+            for rdata in answers:
+                txt_string = self._extract_txt_string(rdata)
+                if txt_string and txt_string.startswith('v=spf1'):
+                    return txt_string
+                    
+        except (dns.resolver.NoAnswer, dns.resolver.NXDOMAIN, dns.exception.DNSException):
+            pass
             
-            # Check IP6 mechanism
-            elif part.startswith('ip6:'):
-                ip_range = part[4:]
-                if self._ip_in_range(sender_ip, ip_range):
-                    return True
+        return None
+    
+    def get_dkim_selector_record(self, selector: str, domain: str) -> Optional[str]:
+        """Get DKIM record for a specific selector and domain"""
+        if not selector or not domain:
+            return None
             
-            # Include mechanism would require recursive lookup
-            elif part.startswith('include:'):
-                # This would require recursive SPF lookup
-                pass
+        try:
+            dkim_domain = f'{selector}._domainkey.{domain}'
+            answers = self._resolve(dkim_domain, 'TXT')
             
-            # A mechanism
-            elif part == 'a' or part.startswith('a:'):
-                # This would require A record lookup
-                pass
+            for rdata in answers:
+                txt_string = self._extract_txt_string(rdata)
+                if txt_string:
+                    return txt_string
+                    
+        except (dns.resolver.NoAnswer, dns.resolver.NXDOMAIN, dns.exception.DNSException):
+            pass
             
-            # MX mechanism
-            elif part == 'mx' or part.startswith('mx:'):
-                # This would require MX record lookup
-                pass
+        return None
+    
+    @property
+    def spf_evaluator(self):
+        """Shared RFC 7208 evaluator that memoizes compiled policies"""
+        if self._spf_evaluator is None:
+            from spf_eval import SPFEvaluator
+            self._spf_evaluator = SPFEvaluator(self)
+        return self._spf_evaluator
+    
+    def evaluate_spf(self, sender_ip: str, domain: str, sender: str = '') -> str:
+        """Full SPF check_host() result (pass, fail, softfail, neutral, none, permerror, temperror)"""
+        if not sender_ip or not domain:
+            return 'none'
+        return self.spf_evaluator.check_host(sender_ip, domain, sender)
+    
+    def check_spf_alignment(self, spf_record: str, sender_ip: str, domain: Optional[str] = None) -> bool:
+        """Check if sender IP is authorized by SPF record
         
-        return False
+        With a domain, that domain's published policy is evaluated; otherwise
+        the given record is. Either way include, a, mx and redirect are
+        resolved per RFC 7208.
+        """
+        if not sender_ip:
+            return False
+        if domain:
+            return self.evaluate_spf(sender_ip, domain) == 'pass'
+        if not spf_record:
+            return False
+        return self.spf_evaluator.check_record(spf_record, sender_ip) == 'pass'
     
     def get_mx_records(self, domain: str) -> List[str]:
         """Get MX records for a domain"""
@@ -170,7 +232,7 @@ class DNSLookupService:
         mx_records = []
         
         try:
-            answers = self.resolver.resolve(domain, 'MX')
+            answers = self._resolve(domain, 'MX')
             
             for rdata in answers:
                 mx_records.append({
@@ -194,7 +256,7 @@ class DNSLookupService:
         a_records = []
         
         try:
-            answers = self.resolver.resolve(domain, 'A')
+            answers = self._resolve(domain, 'A')
             
             for rdata in answers:
                 a_records.append(str(rdata))
@@ -204,23 +266,31 @@ class DNSLookupService:
         
         return a_records
     
+    def get_aaaa_records(self, domain: str) -> List[str]:
+        """Get AAAA records for a domain"""
+        if not domain:
+            return []
+        
+        try:
+            return [str(rdata) for rdata in self._resolve(domain, 'AAAA')]
+        except dns.exception.DNSException:
+            return []
+    
     def get_ptr_record(self, ip: str) -> Optional[str]:
-        """Get PTR record for an IP address"""
+        """Get PTR record for an IP address (IPv4 or IPv6)"""
         if not ip:
             return None
             
         try:
             # Convert IP to reverse DNS format
-            parts = ip.split('.')
-            reversed_ip = '.'.join(reversed(parts))
-            ptr_domain = f'{reversed_ip}.in-addr.arpa'
+            ptr_domain = dns.reversename.from_address(ip).to_text()
             
-            answers = self.resolver.resolve(ptr_domain, 'PTR')
+            answers = self._resolve(ptr_domain, 'PTR')
             
             if answers:
                 return str(answers[0]).rstrip('.')
                 
-        except (dns.resolver.NoAnswer, dns.resolver.NXDOMAIN, dns.exception.DNSException):
+        except (dns.exception.DNSException, ValueError):
             pass
         
         return None
@@ -252,35 +322,268 @@ class DNSLookupService:
                 result['valid'] = True
         
         return result
+
+class AsyncDNSLookupService(DNSRecordParsing):
+    """asyncio counterpart of DNSLookupService
     
-    def _extract_txt_string(self, rdata) -> str:
-        """Extract text string from DNS TXT record data"""
-        try:
-            # Handle different formats of TXT records
-            if hasattr(rdata, 'strings'):
-                # Concatenate multiple strings in the TXT record
-                return ''.join(s.decode('utf-8') if isinstance(s, bytes) else s 
-                              for s in rdata.strings)
-            else:
-                return str(rdata).strip('"')
-        except:
-            return str(rdata)
+    Exposes the same lookups as coroutines so the records for one message,
+    or for many messages, can be resolved concurrently on one event loop.
+    At most `max_concurrency` queries are in flight at any time.
+    """
     
-    def _ip_in_range(self, ip: str, ip_range: str) -> bool:
-        """Check if IP is in the specified range"""
+    def __init__(self, max_concurrency: int = 20, cache: Optional[DNSCache] = None,
+                 use_cache: bool = True, rate_limit: Optional[float] = None):
+        self.resolver = dns.asyncresolver.Resolver()
+        self.resolver.timeout = 3
+        self.resolver.lifetime = 5
+        self.max_concurrency = max_concurrency
+        # Maximum network queries per second (cache hits are not limited)
+        self.rate_limit = rate_limit
+        self.cache = cache if cache is not None or not use_cache else DNSCache.default()
+        self._semaphore = None
+        self._next_slot = 0.0
+        self._inflight: Dict[tuple, asyncio.Future] = {}
+        self._spf_evaluator = None
+    
+    async def _resolve(self, qname: str, rdtype: str):
+        """Resolve a query, answering from the cache when possible
+        
+        Concurrent requests for the same name and type share one query.
+        """
+        if self.cache is not None:
+            cached = self.cache.lookup(qname, rdtype)
+            if cached is not None:
+                return cached
+        key = (qname.lower().rstrip('.'), rdtype)
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._query(qname, rdtype))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+    
+    async def _wait_for_rate_slot(self):
+        """Space network queries evenly to honor rate_limit"""
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        slot = max(now, self._next_slot)
+        self._next_slot = slot + 1.0 / self.rate_limit
+        if slot > now:
+            await asyncio.sleep(slot - now)
+    
+    async def _query(self, qname: str, rdtype: str):
+        """Send one query while holding an in-flight slot and cache the outcome"""
+        if self._semaphore is None:
+            # Created lazily so it binds to the running event loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        if self.rate_limit:
+            await self._wait_for_rate_slot()
+        async with self._semaphore:
+            try:
+                answer = await self.resolver.resolve(qname, rdtype)
+            except dns.exception.DNSException as e:
+                if self.cache is not None:
+                    self.cache.store_error(qname, rdtype, e)
+                raise
+        if self.cache is not None:
+            self.cache.store_answer(qname, rdtype, answer)
+        return list(answer)
+    
+    async def get_dmarc_record(self, domain: str) -> Optional[str]:
+        """Get DMARC record for a domain"""
+        record, _ = await self.find_dmarc_record(domain)
+        return record
+    
+    async def find_dmarc_record(self, domain: str) -> Tuple[Optional[str], Optional[str]]:
+        """Get the DMARC record for a domain and the domain it was published at
+        
+        At most two names are queried: the domain, then its organizational domain.
+        """
+        for candidate in self._dmarc_candidates(domain):
+            try:
+                answers = await self._resolve(f'_dmarc.{candidate}', 'TXT')
+            except (dns.resolver.NoAnswer, dns.resolver.NXDOMAIN):
+                continue
+            except dns.exception.DNSException:
+                break
+            record = self._select_dmarc_record(answers)
+            if record:
+                return record, candidate
+        return None, None
+    
+    async def get_spf_record(self, domain: str) -> Optional[str]:
+        """Get SPF record for a domain"""
+        if not domain:
+            return None
+        
         try:
-            import ipaddress
+            answers = await self._resolve(domain, 'TXT')
             
-            # Handle single IP or CIDR notation
-            if '/' in ip_range:
-                network = ipaddress.ip_network(ip_range, strict=False)
-                ip_addr = ipaddress.ip_address(ip)
-                return ip_addr in network
-            else:
-                return ip == ip_range
-                
-        except ValueError:
+            for rdata in answers:
+                txt_string = self._extract_txt_string(rdata)
+                if txt_string and txt_string.startswith('v=spf1'):
+                    return txt_string
+        
+        except dns.exception.DNSException:
+            pass
+        
+        return None
+    
+    @property
+    def spf_evaluator(self):
+        """RFC 7208 evaluator backed by a blocking DNSLookupService on the same cache
+        
+        Its queries do not count against max_concurrency or rate_limit.
+        """
+        if self._spf_evaluator is None:
+            from spf_eval import SPFEvaluator
+            self._spf_evaluator = SPFEvaluator(
+                DNSLookupService(cache=self.cache, use_cache=self.cache is not None))
+        return self._spf_evaluator
+    
+    async def evaluate_spf(self, sender_ip: str, domain: str, sender: str = '') -> str:
+        """Full SPF check_host() result, evaluated in a worker thread"""
+        if not sender_ip or not domain:
+            return 'none'
+        return await asyncio.to_thread(self.spf_evaluator.check_host, sender_ip, domain, sender)
+    
+    async def check_spf_alignment(self, spf_record: str, sender_ip: str,
+                                  domain: Optional[str] = None) -> bool:
+        """Check if sender IP is authorized by SPF record (see DNSLookupService)"""
+        if not sender_ip:
             return False
+        if domain:
+            return await self.evaluate_spf(sender_ip, domain) == 'pass'
+        if not spf_record:
+            return False
+        result = await asyncio.to_thread(self.spf_evaluator.check_record, spf_record, sender_ip)
+        return result == 'pass'
+    
+    async def get_dkim_selector_record(self, selector: str, domain: str) -> Optional[str]:
+        """Get DKIM record for a specific selector and domain"""
+        if not selector or not domain:
+            return None
+        
+        try:
+            answers = await self._resolve(f'{selector}._domainkey.{domain}', 'TXT')
+            
+            for rdata in answers:
+                txt_string = self._extract_txt_string(rdata)
+                if txt_string:
+                    return txt_string
+        
+        except dns.exception.DNSException:
+            pass
+        
+        return None
+    
+    async def get_mx_records(self, domain: str) -> List[Dict]:
+        """Get MX records for a domain"""
+        if not domain:
+            return []
+        
+        mx_records = []
+        
+        try:
+            answers = await self._resolve(domain, 'MX')
+            
+            for rdata in answers:
+                mx_records.append({
+                    'priority': rdata.preference,
+                    'host': str(rdata.exchange).rstrip('.')
+                })
+            
+            mx_records.sort(key=lambda x: x['priority'])
+        
+        except dns.exception.DNSException:
+            pass
+        
+        return mx_records
+    
+    async def get_a_records(self, domain: str) -> List[str]:
+        """Get A records for a domain"""
+        if not domain:
+            return []
+        
+        try:
+            answers = await self._resolve(domain, 'A')
+            return [str(rdata) for rdata in answers]
+        except dns.exception.DNSException:
+            return []
+    
+    async def get_aaaa_records(self, domain: str) -> List[str]:
+        """Get AAAA records for a domain"""
+        if not domain:
+            return []
+        
+        try:
+            return [str(rdata) for rdata in await self._resolve(domain, 'AAAA')]
+        except dns.exception.DNSException:
+            return []
+    
+    async def get_ptr_record(self, ip: str) -> Optional[str]:
+        """Get PTR record for an IP address (IPv4 or IPv6)"""
+        if not ip:
+            return None
+        
+        try:
+            ptr_domain = dns.reversename.from_address(ip).to_text()
+            answers = await self._resolve(ptr_domain, 'PTR')
+            if answers:
+                return str(answers[0]).rstrip('.')
+        except (dns.exception.DNSException, ValueError):
+            pass
+        
+        return None
+    
+    async def verify_dkim_selector(self, dkim_signature: str) -> Dict[str, str]:
+        """Extract and verify DKIM selector from signature"""
+        result = {
+            'selector': '',
+            'domain': '',
+            'record': None,
+            'valid': False
+        }
+        
+        if not dkim_signature:
+            return result
+        
+        selector_match = re.search(r'\bs=([^;]+)', dkim_signature)
+        domain_match = re.search(r'\bd=([^;]+)', dkim_signature)
+        
+        if selector_match and domain_match:
+            result['selector'] = selector_match.group(1).strip()
+            result['domain'] = domain_match.group(1).strip()
+            
+            dkim_record = await self.get_dkim_selector_record(result['selector'], result['domain'])
+            if dkim_record:
+                result['record'] = dkim_record
+                result['valid'] = True
+        
+        return result
+    
+    async def lookup_domain(self, domain: str, dkim_selector: Optional[str] = None) -> Dict:
+        """Fetch the DMARC, SPF, MX (and optionally DKIM) records of one domain concurrently"""
+        lookups = [
+            self.get_dmarc_record(domain),
+            self.get_spf_record(domain),
+            self.get_mx_records(domain),
+            self.get_dkim_selector_record(dkim_selector, domain) if dkim_selector else asyncio.sleep(0)
+        ]
+        dmarc, spf, mx, dkim = await asyncio.gather(*lookups)
+        return {
+            'domain': domain,
+            'dmarc': dmarc,
+            'spf': spf,
+            'mx': mx,
+            'dkim': dkim
+        }
+    
+    async def lookup_domains(self, domains: Iterable[str]) -> Dict[str, Dict]:
+        """Fetch records for many domains concurrently, e.g. every sender in a batch"""
+        unique = list(dict.fromkeys(d.lower().rstrip('.') for d in domains if d))
+        results = await asyncio.gather(*(self.lookup_domain(d) for d in unique))
+        return dict(zip(unique, results))
 
 class DNSValidator:
     """Validator for DNS-based email authentication"""
@@ -290,6 +593,65 @@ class DNSValidator:
     
     def validate_domain_authentication(self, domain: str) -> Dict[str, any]:
         """Validate all authentication records for a domain"""
+        return self.assess_domain(
+            domain,
+            self.dns_service.get_dmarc_record(domain),
+            self.dns_service.get_spf_record(domain),
+            self.dns_service.get_mx_records(domain)
+        )
+    
+    def validate_domains(self, domains: Iterable[str], max_concurrency: int = 100,
+                         rate_limit: Optional[float] = 200.0, progress=None) -> List[Dict[str, any]]:
+        """Validate many domains concurrently (blocking wrapper around validate_domains_async)"""
+        return asyncio.run(self.validate_domains_async(
+            domains, max_concurrency=max_concurrency, rate_limit=rate_limit, progress=progress))
+    
+    async def validate_domains_async(self, domains: Iterable[str], max_concurrency: int = 100,
+                                     rate_limit: Optional[float] = 200.0, progress=None,
+                                     service: Optional[AsyncDNSLookupService] = None) -> List[Dict[str, any]]:
+        """Validate many domains concurrently
+        
+        Network queries are capped at `max_concurrency` in flight and
+        `rate_limit` per second. Identical queries (e.g. the DMARC record of
+        an organizational domain shared by many subdomains) are sent once and
+        answered from the DNS cache afterwards. `progress(done, total)` is
+        called as domains finish.
+        """
+        if service is None:
+            service = AsyncDNSLookupService(max_concurrency=max_concurrency, rate_limit=rate_limit)
+        unique = list(dict.fromkeys(d.strip().lower().rstrip('.') for d in domains if d and d.strip()))
+        results: Dict[str, Dict] = {}
+        queue: asyncio.Queue = asyncio.Queue()
+        for domain in unique:
+            queue.put_nowait(domain)
+        
+        async def validate(domain: str) -> Dict:
+            (dmarc, dmarc_domain), spf, mx = await asyncio.gather(
+                service.find_dmarc_record(domain),
+                service.get_spf_record(domain),
+                service.get_mx_records(domain)
+            )
+            result = self.assess_domain(domain, dmarc, spf, mx)
+            result['dmarc_domain'] = dmarc_domain
+            return result
+        
+        async def worker():
+            while True:
+                try:
+                    domain = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                results[domain] = await validate(domain)
+                if progress:
+                    progress(len(results), len(unique))
+        
+        # A fixed set of workers keeps the number of live coroutines bounded
+        await asyncio.gather(*(worker() for _ in range(min(max_concurrency, len(unique)) or 1)))
+        return [results[domain] for domain in unique]
+    
+    def assess_domain(self, domain: str, dmarc: Optional[str], spf: Optional[str],
+                      mx: List[Dict]) -> Dict[str, any]:
+        """Build the posture result and recommendations from already fetched records"""
         result = {
             'domain': domain,
             'has_dmarc': False,
@@ -302,7 +664,6 @@ class DNSValidator:
         }
         
         # Check DMARC
-        dmarc = self.dns_service.get_dmarc_record(domain)
         if dmarc:
             result['has_dmarc'] = True
             result['dmarc_policy'] = self.dns_service.parse_dmarc_policy(dmarc)
@@ -319,7 +680,6 @@ class DNSValidator:
             )
         
         # Check SPF
-        spf = self.dns_service.get_spf_record(domain)
         if spf:
             result['has_spf'] = True
             result['spf_record'] = spf
@@ -340,7 +700,6 @@ class DNSValidator:
             )
         
         # Check MX records
-        mx = self.dns_service.get_mx_records(domain)
         if mx:
             result['has_mx'] = True
             result['mx_records'] = mx
@@ -349,4 +708,4 @@ class DNSValidator:
                 "No MX records found. Domain may not be configured to receive email."
             )
         
-        return result
\ No newline at end of file
+        return result
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Domain Scan Module
+Bulk DMARC/SPF/MX posture audit for large domain lists
+
+Usage:
+    python -m domain_scan example.com example.org -o posture.csv
+    python -m domain_scan -f domains.txt --rate 300 -o posture.csv
+    python -m domain_scan --from-results results.jsonl -o posture.csv
+"""
+
+import argparse
+import csv
+import json
+import sys
+from typing import Dict, Iterable, Iterator, List, Optional, TextIO
+
+from dns_lookup import DNSValidator
+
+REPORT_COLUMNS = [
+    'domain', 'issues', 'has_dmarc', 'dmarc_policy', 'dmarc_subdomain_policy', 'dmarc_pct',
+    'dmarc_domain', 'dmarc_inherited', 'has_spf', 'spf_all', 'has_mx', 'mx_count',
+    'recommendations', 'dmarc_record', 'spf_record'
+]
+
+# Columns sorted numerically rather than as text
+_NUMERIC_COLUMNS = {'issues', 'dmarc_pct', 'mx_count'}
+
+def read_domain_file(stream: TextIO) -> Iterator[str]:
+    """Domains from a text file: one per line, '#' starts a comment"""
+    for line in stream:
+        domain = line.split('#', 1)[0].strip()
+        if domain:
+            yield domain
+
+def read_result_domains(stream: TextIO) -> Iterator[str]:
+    """From and Return-Path domains from batch_analyze JSON-lines output"""
+    for line in stream:
+        try:
+            sender = json.loads(line).get('result', {}).get('sender', {})
+        except (ValueError, AttributeError):
+            continue
+        for key in ('from_domain', 'return_path_domain'):
+            if sender.get(key):
+                yield sender[key]
+
+def _spf_all(spf: Optional[str]) -> str:
+    """The 'all' mechanism of an SPF record, if any"""
+    for term in (spf or '').split():
+        if term.lstrip('+-~?').lower() == 'all':
+            return term if term[0] in '+-~?' else '+' + term
+    return ''
+
+def report_row(result: Dict) -> Dict:
+    """Flatten a validate_domain_authentication() result into a report row"""
+    policy = result.get('dmarc_policy') or {}
+    dmarc_domain = result.get('dmarc_domain') or ''
+    return {
+        'domain': result['domain'],
+        'issues': len(result['recommendations']),
+        'has_dmarc': result['has_dmarc'],
+        'dmarc_policy': policy.get('p', ''),
+        'dmarc_subdomain_policy': policy.get('sp', ''),
+        'dmarc_pct': policy.get('pct', '100' if policy else ''),
+        'dmarc_domain': dmarc_domain,
+        'dmarc_inherited': bool(dmarc_domain) and dmarc_domain != result['domain'],
+        'has_spf': result['has_spf'],
+        'spf_all': _spf_all(result.get('spf_record')),
+        'has_mx': result['has_mx'],
+        'mx_count': len(result['mx_records']),
+        'recommendations': ' | '.join(result['recommendations']),
+        'dmarc_record': '; '.join(f"{k}={v}" for k, v in policy.items()),
+        'spf_record': result.get('spf_record') or ''
+    }
+
+def sort_rows(rows: List[Dict], column: str, descending: bool) -> List[Dict]:
+    """Sort report rows by a column, numerically where appropriate"""
+    def key(row):
+        value = row.get(column, '')
+        if column in _NUMERIC_COLUMNS:
+            try:
+                return (0, float(value))
+            except (TypeError, ValueError):
+                return (1, 0.0)
+        return (0, str(value).lower())
+    # Stable sorts: ties stay in domain order whichever direction is chosen
+    by_domain = sorted(rows, key=lambda row: row['domain'])
+    return sorted(by_domain, key=key, reverse=descending)
+
+def write_report(rows: Iterable[Dict], output: TextIO):
+    """Write report rows as CSV"""
+    writer = csv.DictWriter(output, fieldnames=REPORT_COLUMNS)
+    writer.writeheader()
+    writer.writerows(rows)
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    """Create the command-line argument parser"""
+    parser = argparse.ArgumentParser(
+        prog='domain_scan',
+        description='Audit DMARC, SPF and MX posture for many domains'
+    )
+    parser.add_argument('domains', nargs='*', help='Domains to scan')
+    parser.add_argument('-f', '--file', action='append', default=[],
+                        help="File with one domain per line ('-' for stdin, repeatable)")
+    parser.add_argument('--from-results', action='append', default=[],
+                        help='batch_analyze JSON-lines output to take From/Return-Path domains from')
+    parser.add_argument('-o', '--output', help='CSV report file (default: stdout)')
+    parser.add_argument('--sort', default='issues', choices=REPORT_COLUMNS,
+                        help='Column to sort the report by (default: issues)')
+    parser.add_argument('--ascending', action='store_true', help='Sort ascending')
+    parser.add_argument('-c', '--concurrency', type=int, default=100,
+                        help='Maximum DNS queries in flight')
+    parser.add_argument('--rate', type=float, default=200.0,
+                        help='Maximum DNS queries per second (0 for unlimited)')
+    parser.add_argument('-q', '--quiet', action='store_true', help='Suppress progress output')
+    return parser
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command-line entry point"""
+    args = build_arg_parser().parse_args(argv)
+
+    domains = list(args.domains)
+    for path in args.file:
+        if path == '-':
+            domains.extend(read_domain_file(sys.stdin))
+        else:
+            with open(path, 'r', encoding='utf-8') as f:
+                domains.extend(read_domain_file(f))
+    for path in args.from_results:
+        with open(path, 'r', encoding='utf-8') as f:
+            domains.extend(read_result_domains(f))
+
+    if not domains:
+        build_arg_parser().error('no domains given')
+
+    def progress(done: int, total: int):
+        if done == total or done % 500 == 0:
+            print(f"{done}/{total} domains", file=sys.stderr)
+
+    results = DNSValidator().validate_domains(
+        domains, max_concurrency=args.concurrency, rate_limit=args.rate or None,
+        progress=None if args.quiet else progress)
+    rows = sort_rows([report_row(r) for r in results], args.sort, not args.ascending)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8', newline='') as output:
+            write_report(rows, output)
+    else:
+        write_report(rows, sys.stdout)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,12 +5,77 @@ Handles email parsing, authentication checking, and relay chain analysis
 
 import email.parser
 import email.utils
+import hashlib
+import itertools
 import re
 import datetime
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional, Tuple, Callable
+from typing import BinaryIO, Dict, FrozenSet, Iterable, List, Optional, Tuple, Callable, Union
 import ipaddress
 
+from received_parser import tokenize_received, parse_received_date, extract_ip
+from auth_results import AuthResultsHeader, collect_authentication_results
+from psl import domains_aligned
+from relay_hops import RelayHop, chain_is_reversed
+
+# Part of every result cache key. Bump it whenever a change to the analysis
+# would produce different output for the same message, so old entries miss.
+ANALYZER_VERSION = 3
+
+# Upper bound on the header block read from a file. Guards against binary or
+# malformed input that has no blank line separating headers from the body.
+MAX_HEADER_BYTES = 8 * 1024 * 1024
+
+# End of the header block: the first empty line
+_HEADER_END_RE = re.compile(r'\r?\n\r?\n')
+_HEADER_END_BYTES_RE = re.compile(rb'\r?\n\r?\n')
+_NON_SPACE_RE = re.compile(r'\S')
+_NON_SPACE_BYTES_RE = re.compile(rb'\S')
+
+def split_header_block(data: Union[str, bytes, bytearray, memoryview]) -> Union[str, bytes]:
+    """Return the header block of a message (everything before the first blank line)"""
+    pattern = _HEADER_END_RE if isinstance(data, str) else _HEADER_END_BYTES_RE
+    end = pattern.search(data, 0, MAX_HEADER_BYTES)
+    block = data[:end.start()] if end else data[:MAX_HEADER_BYTES]
+    return block if isinstance(block, (str, bytes)) else bytes(block)
+
+def has_body(data: Union[str, bytes, bytearray, memoryview]) -> bool:
+    """True if a message goes on past its header block; the body is searched, not copied"""
+    text = isinstance(data, str)
+    end = (_HEADER_END_RE if text else _HEADER_END_BYTES_RE).search(data, 0, MAX_HEADER_BYTES)
+    return end is not None and (_NON_SPACE_RE if text else _NON_SPACE_BYTES_RE).search(data, end.end()) is not None
+
+def _peek_body(fp: BinaryIO, size: int = 64 * 1024) -> Tuple[bool, bytes]:
+    """Read a file handle up to the first byte of a non-blank body: (found, bytes read)"""
+    chunks = []
+    while True:
+        chunk = fp.read(size)
+        if not chunk:
+            return False, b''.join(chunks)
+        chunks.append(chunk)
+        if not chunk.isspace():
+            return True, b''.join(chunks)
+
+def read_header_block(fp: BinaryIO, max_bytes: int = MAX_HEADER_BYTES) -> bytes:
+    """Read the header block from a binary file handle, leaving the body unread"""
+    lines = []
+    total = 0
+    while total < max_bytes:
+        line = fp.readline(max_bytes - total)
+        if not line or line in (b'\n', b'\r\n'):
+            break
+        lines.append(line)
+        total += len(line)
+    return b''.join(lines)
+
+def decode_header_block(raw: bytes) -> str:
+    """Decode raw header bytes without dropping 8-bit characters"""
+    try:
+        return raw.decode('utf-8')
+    except UnicodeDecodeError:
+        # latin-1 maps every byte, so nothing is silently discarded
+        return raw.decode('latin-1')
+
 @dataclass
 class EmailParseResult:
     """Data class for email analysis results"""
@@ -23,6 +88,12 @@ class EmailParseResult:
     dkim_aligned: bool = False
     dkim_authenticated: bool = False
     dkim_status: str = "none"
+    # dkim_verify.DKIMResult per signature, when the analyzer verified them itself
+    dkim_results: List = field(default_factory=list)
+    # ARC chain (RFC 8617): none, pass or fail, plus arc_verify.ARCInstance per hop
+    arc_status: str = "none"
+    arc_info: str = ""
+    arc_instances: List = field(default_factory=list)
     
     # DNS records
     dmarc_txt: str = ""
@@ -33,21 +104,29 @@ class EmailParseResult:
     headers: Dict[str, str] = field(default_factory=dict)
     auth_results: str = ""
     spf_info: str = ""
+    authentication_results: List[AuthResultsHeader] = field(default_factory=list)
     
     # IP and relay information
     sender_ip: Optional[str] = None
     ip_info: Dict = field(default_factory=dict)
-    relays: List[Dict] = field(default_factory=list)
+    relays: List[RelayHop] = field(default_factory=list)
     
     # Timing
     total_delay: float = 0.0
     delay_source: str = "Calculated"
+    # Hops stamped earlier than the hop before them (clock skew or reordering)
+    skewed_hops: List[int] = field(default_factory=list)
     end_to_end_latency_header: str = ""
     
     # Domains
     from_domain: str = ""
     return_path_domain: str = ""
     
+    # Result cache bookkeeping (cache_store.ResultCache), not part of the analysis
+    cache_key: str = field(default="", repr=False, compare=False)
+    # Network sections ('ip', 'dns') restored from the cache and still fresh
+    cached_sections: FrozenSet[str] = field(default=frozenset(), repr=False, compare=False)
+    
     def to_dict(self) -> Dict:
         """Convert to dictionary for JSON export"""
         return {
@@ -68,8 +147,15 @@ class EmailParseResult:
                     'aligned': self.dkim_aligned,
                     'authenticated': self.dkim_authenticated,
                     'status': self.dkim_status,
-                    'info': self.dkim_info
-                }
+                    'info': self.dkim_info,
+                    'signatures': [signature.to_dict() for signature in self.dkim_results]
+                },
+                'arc': {
+                    'status': self.arc_status,
+                    'info': self.arc_info,
+                    'instances': [instance.to_dict() for instance in self.arc_instances]
+                },
+                'results': [header.to_dict() for header in self.authentication_results]
             },
             'sender': {
                 'ip': self.sender_ip,
@@ -80,7 +166,8 @@ class EmailParseResult:
             'delivery': {
                 'total_delay': self.total_delay,
                 'delay_source': self.delay_source,
-                'relays': self.relays
+                'skewed_hops': self.skewed_hops,
+                'relays': [relay.to_dict() for relay in self.relays]
             },
             'headers': self.headers
         }
@@ -88,17 +175,199 @@ class EmailParseResult:
 class EmailAnalyzer:
     """Core email analysis engine"""
     
-    def __init__(self):
-        self.parser = email.parser.Parser()
+    def __init__(self, dkim_verifier=None, arc_validator=None, result_cache=None):
+        # Only headers are analyzed, so never parse (or even read) the body
+        self.parser = email.parser.HeaderParser()
+        # Optional dkim_verify.DKIMVerifier and arc_verify.ARCValidator.
+        # Signature checks are the only stages that need the body, which
+        # they stream (once for both) rather than parse.
+        self.dkim_verifier = dkim_verifier
+        self.arc_validator = arc_validator
+        # Optional cache_store.ResultCache: a message analyzed before is
+        # returned from disk instead of being parsed again
+        self.result_cache = result_cache
+        self._headers_only: Optional['EmailAnalyzer'] = None
+    
+    @property
+    def verifies_signatures(self) -> bool:
+        return self.dkim_verifier is not None or self.arc_validator is not None
+    
+    def without_signatures(self) -> 'EmailAnalyzer':
+        """This analyzer minus its signature stages, for headers that came without a body"""
+        if not self.verifies_signatures:
+            return self
+        if self._headers_only is None:
+            self._headers_only = EmailAnalyzer(result_cache=self.result_cache)
+        return self._headers_only
         
     def analyze(self, header_text: str, progress_callback: Optional[Callable] = None) -> EmailParseResult:
-        """Analyze email headers and return results"""
-        result = EmailParseResult()
-        
-        # Parse email
+        """Analyze email headers and return results
+        
+        Pasted headers, and those kept by .msg and PST files, have no body.
+        Signatures are then left unverified, since every body hash would
+        mismatch: the receiver's Authentication-Results stand, and an ARC
+        chain is reported as none.
+        """
+        if self.verifies_signatures and not has_body(header_text):
+            return self._mark_headers_only(self.without_signatures().analyze(header_text, progress_callback))
         if progress_callback:
             progress_callback(20, "Parsing email structure...")
+        data = None
+        if self.verifies_signatures or self.result_cache is not None:
+            # The original bytes are gone; surrogateescape round-trips anything decoded that way
+            data = header_text.encode('utf-8', 'surrogateescape')
+        key, cached = self._lookup_bytes(data)
+        if cached is not None:
+            return self._from_cache(cached, progress_callback)
+        msg = self.parser.parsestr(split_header_block(header_text))
+        signatures = self._verify_message(data) if self.verifies_signatures else None
+        return self._store(key, self._analyze_message(msg, progress_callback, signatures))
+    
+    def analyze_bytes(self, data: Union[bytes, bytearray, memoryview],
+                      progress_callback: Optional[Callable] = None) -> EmailParseResult:
+        """Analyze a raw message held in memory (bytes or mmap), touching only its headers"""
+        if self.verifies_signatures and not has_body(data):
+            return self._mark_headers_only(self.without_signatures().analyze_bytes(data, progress_callback))
+        if progress_callback:
+            progress_callback(20, "Parsing email structure...")
+        key, cached = self._lookup_bytes(data)
+        if cached is not None:
+            return self._from_cache(cached, progress_callback)
+        header_text = decode_header_block(split_header_block(data))
         msg = self.parser.parsestr(header_text)
+        signatures = self._verify_message(data) if self.verifies_signatures else None
+        return self._store(key, self._analyze_message(msg, progress_callback, signatures))
+    
+    def analyze_file(self, source: Union[str, BinaryIO],
+                     progress_callback: Optional[Callable] = None) -> EmailParseResult:
+        """Analyze a message from a path or binary file handle without reading its body"""
+        if progress_callback:
+            progress_callback(20, "Parsing email structure...")
+        if isinstance(source, str):
+            with open(source, 'rb') as fp:
+                return self._analyze_stream(fp, progress_callback)
+        return self._analyze_stream(source, progress_callback)
+    
+    def _analyze_stream(self, fp: BinaryIO, progress_callback: Optional[Callable]) -> EmailParseResult:
+        """Analyze an open file; the body is read only to verify signatures"""
+        raw_headers = read_header_block(fp)
+        peeked = b''
+        if self.verifies_signatures:
+            body_start = fp.tell() if fp.seekable() else None
+            found, peeked = _peek_body(fp)
+            if not found:
+                return self._mark_headers_only(self.without_signatures().analyze_bytes(raw_headers, progress_callback))
+            if body_start is not None:
+                fp.seek(body_start)
+                peeked = b''
+        key, cached = self._lookup_stream(raw_headers, fp)
+        if cached is not None:
+            return self._from_cache(cached, progress_callback)
+        signatures = None
+        if self.verifies_signatures:
+            from dkim_verify import iter_chunks
+            body = itertools.chain((peeked,), iter_chunks(fp)) if peeked else iter_chunks(fp)
+            signatures = self._verify_signatures(raw_headers, body)
+        msg = self.parser.parsestr(decode_header_block(raw_headers))
+        return self._store(key, self._analyze_message(msg, progress_callback, signatures))
+    
+    def _mark_headers_only(self, result: EmailParseResult) -> EmailParseResult:
+        """Note on a result analyzed without signatures that its ARC chain went unchecked"""
+        if self.arc_validator is not None and any(name.lower() == 'arc-seal' for name in result.headers):
+            # The newest ARC-Message-Signature covers the body too
+            result.arc_info = "Not verifiable (headers only)"
+        return result
+    
+    def cache_key(self, header_block: bytes, body: Optional[Iterable[bytes]] = None) -> str:
+        """Result cache key of a message
+        
+        Covers the analyzer version, the signature stages that run, and the
+        header block with its line endings normalized. When signatures are
+        verified the body is hashed in as well, since their results depend on it.
+        """
+        digest = hashlib.sha256(b'%d:%d:%d\n' % (ANALYZER_VERSION, self.dkim_verifier is not None,
+                                                 self.arc_validator is not None))
+        digest.update(header_block.replace(b'\r\n', b'\n').rstrip(b'\n'))
+        if body is not None:
+            digest.update(b'\n\n')
+            for chunk in body:
+                digest.update(chunk)
+        return digest.hexdigest()
+    
+    def _lookup(self, header_block: bytes,
+                body: Optional[Iterable[bytes]] = None) -> Tuple[str, Optional[EmailParseResult]]:
+        """Cache key of a message plus its cached result, if any"""
+        key = self.cache_key(header_block, body)
+        cached = self.result_cache.get(key)
+        if cached is None:
+            return key, None
+        result, fresh = cached
+        result.cache_key, result.cached_sections = key, fresh
+        return key, result
+    
+    def _lookup_bytes(self, data: Union[bytes, bytearray, memoryview, None]
+                      ) -> Tuple[str, Optional[EmailParseResult]]:
+        """Cache lookup for a message held in memory"""
+        if self.result_cache is None:
+            return '', None
+        if not self.verifies_signatures:
+            return self._lookup(split_header_block(data))
+        from dkim_verify import split_message
+        return self._lookup(*split_message(data))
+    
+    def _lookup_stream(self, header_block: bytes, fp: BinaryIO) -> Tuple[str, Optional[EmailParseResult]]:
+        """Cache lookup for an open file positioned at the start of the body"""
+        if self.result_cache is None:
+            return '', None
+        if not self.verifies_signatures:
+            return self._lookup(header_block)
+        if not fp.seekable():
+            # The body would have to be read twice on a miss; go without the cache
+            return '', None
+        from dkim_verify import iter_chunks
+        body_start = fp.tell()
+        key, cached = self._lookup(header_block, iter_chunks(fp))
+        if cached is None:
+            fp.seek(body_start)
+        return key, cached
+    
+    def _from_cache(self, result: EmailParseResult, progress_callback: Optional[Callable]) -> EmailParseResult:
+        if progress_callback:
+            progress_callback(100, "Loaded previous analysis from cache")
+        return result
+    
+    def _store(self, key: str, result: EmailParseResult) -> EmailParseResult:
+        """Save a fresh analysis to the result cache"""
+        if key:
+            result.cache_key = key
+            # Signature results depend on DNS keys, so they age out with them
+            self.result_cache.put(key, result, verified=self.verifies_signatures)
+        return result
+    
+    def _verify_message(self, data: Union[bytes, bytearray, memoryview]) -> Tuple[Optional[List], object]:
+        """Verify signatures on a raw message held in memory"""
+        from dkim_verify import split_message
+        return self._verify_signatures(*split_message(data))
+    
+    def _verify_signatures(self, header_block: bytes, body: Iterable[bytes]) -> Tuple[Optional[List], object]:
+        """Run the DKIM and ARC stages: (DKIM results, ARC result)
+        
+        Both stages see the same split of the header block, and every body
+        hash either of them needs is computed in one pass over the body.
+        """
+        from dkim_verify import hash_body, split_header_fields
+        fields = split_header_fields(header_block)
+        dkim = self.dkim_verifier.prepare(fields) if self.dkim_verifier is not None else None
+        arc = self.arc_validator.prepare(fields) if self.arc_validator is not None else None
+        specs = (dkim.body_specs if dkim else set()) | (arc.body_specs if arc else set())
+        digests = hash_body(specs, body)
+        return (self.dkim_verifier.complete(dkim, digests) if dkim else None,
+                self.arc_validator.complete(arc, digests) if arc else None)
+    
+    def _analyze_message(self, msg, progress_callback: Optional[Callable] = None,
+                         signatures: Optional[Tuple[Optional[List], object]] = None) -> EmailParseResult:
+        """Run the analysis stages over a parsed header block"""
+        result = EmailParseResult()
         result.headers = dict(msg.items())
         
         # Extract domains
@@ -109,7 +378,10 @@ class EmailAnalyzer:
         # Check authentication
         if progress_callback:
             progress_callback(40, "Checking authentication...")
-        self._check_authentication(msg, result)
+        dkim_results, arc_result = signatures or (None, None)
+        self._check_authentication(msg, result, dkim_results)
+        if arc_result is not None:
+            self._apply_arc(result, arc_result)
         
         # Process relay chain
         if progress_callback:
@@ -152,14 +424,14 @@ class EmailAnalyzer:
         
         return from_domain, rp_domain
     
-    def _check_authentication(self, msg, result: EmailParseResult):
+    def _check_authentication(self, msg, result: EmailParseResult, dkim_results: Optional[List] = None):
         """Check email authentication (SPF, DKIM, DMARC)"""
         # Get authentication results header
         auth_results = msg.get('Authentication-Results', '')
         result.auth_results = auth_results
         
-        # Check alignment
-        result.spf_aligned = result.from_domain == result.return_path_domain if result.return_path_domain else False
+        # Relaxed alignment (the DMARC default): organizational domains must match
+        result.spf_aligned = domains_aligned(result.from_domain, result.return_path_domain)
         
         # Check DKIM signature
         dkim_signature = msg.get('DKIM-Signature', '')
@@ -167,35 +439,51 @@ class EmailAnalyzer:
             d_match = re.search(r'\bd=([^;]+)', dkim_signature)
             if d_match:
                 d_domain = d_match.group(1).strip()
-                result.dkim_aligned = result.from_domain == d_domain
+                result.dkim_aligned = domains_aligned(result.from_domain, d_domain)
             result.dkim_info = dkim_signature[:200] + "..." if len(dkim_signature) > 200 else dkim_signature
         else:
             result.dkim_info = "No DKIM-Signature found"
         
-        # Parse authentication results
-        if auth_results:
+        # Parse every Authentication-Results / ARC-Authentication-Results header once
+        result.authentication_results = collect_authentication_results(msg)
+        
+        # The topmost plain header was added by the final receiving server
+        primary = next((h for h in result.authentication_results if not h.is_arc), None)
+        if primary:
             # SPF
-            spf_result = re.search(r'spf=([a-zA-Z]+)', auth_results)
-            if spf_result:
-                result.spf_status = spf_result.group(1)
-                result.spf_authenticated = result.spf_status.lower() == 'pass'
+            spf = primary.first('spf')
+            if spf:
+                result.spf_status = spf.result
+                result.spf_authenticated = spf.passed
+                result.spf_info = spf.to_text()
             
-            # Extract detailed SPF info
-            spf_info_match = re.search(r'spf=[^;]+(?:;[^;]+)*', auth_results)
-            if spf_info_match:
-                result.spf_info = spf_info_match.group(0)
-            
-            # DKIM
-            dkim_result = re.search(r'dkim=([a-zA-Z]+)', auth_results)
-            if dkim_result:
-                result.dkim_status = dkim_result.group(1)
-                result.dkim_authenticated = result.dkim_status.lower() == 'pass'
+            # DKIM - a message may carry several signatures; any passing one counts
+            dkim_claims = primary.methods('dkim')
+            if dkim_claims:
+                passing = next((d for d in dkim_claims if d.passed), None)
+                result.dkim_status = (passing or dkim_claims[0]).result
+                result.dkim_authenticated = passing is not None
             
             # DMARC
-            dmarc_result = re.search(r'dmarc=([a-zA-Z]+)', auth_results)
-            if dmarc_result:
-                result.dmarc_status = dmarc_result.group(1)
-                result.dmarc_compliant = result.dmarc_status.lower() == 'pass'
+            dmarc = primary.first('dmarc')
+            if dmarc:
+                result.dmarc_status = dmarc.result
+                result.dmarc_compliant = dmarc.passed
+        
+        # Signatures verified here take precedence over the receiver's dkim= claim
+        if dkim_results:
+            result.dkim_results = dkim_results
+            passing = next((d for d in dkim_results if d.passed), None)
+            result.dkim_status = (passing or dkim_results[0]).result
+            result.dkim_authenticated = passing is not None
+            if passing:
+                result.dkim_aligned = domains_aligned(result.from_domain, passing.domain)
+    
+    def _apply_arc(self, result: EmailParseResult, arc_result):
+        """Record an arc_verify.ARCResult on the parse result"""
+        result.arc_status = arc_result.result
+        result.arc_info = arc_result.to_text()
+        result.arc_instances = arc_result.instances
     
     def _process_relays(self, msg, result: EmailParseResult):
         """Process the relay chain from Received headers"""
@@ -207,79 +495,46 @@ class EmailAnalyzer:
             relays.append(relay)
         
         # Check if we need to reverse the order based on timestamps
-        if len(relays) > 1 and relays[0]['time_dt'] and relays[1]['time_dt']:
-            if relays[1]['time_dt'] < relays[0]['time_dt']:
-                relays = list(reversed(relays))
-                for idx, r in enumerate(relays, 1):
-                    r['hop'] = idx
+        if len(relays) > 1 and chain_is_reversed(relays):
+            relays = list(reversed(relays))
+            for idx, r in enumerate(relays, 1):
+                r.hop = idx
         
         result.relays = relays
     
-    def _parse_received_header(self, header: str, hop: int) -> Dict:
+    def _parse_received_header(self, header: str, hop: int) -> RelayHop:
         """Parse a single Received header"""
-        relay = {
-            'hop': hop,
-            'from': '',
-            'by': '',
-            'with': '',
-            'time': '',
-            'time_dt': None,
-            'delay': 0,
-            'blacklist': True,
-            'ip': ''
-        }
-        
-        # Extract components
-        from_match = re.search(r'from\s+(.+?)\s+by', header, re.IGNORECASE | re.DOTALL)
-        if from_match:
-            relay['from'] = from_match.group(1).strip()
-        
-        by_match = re.search(r'by\s+(.+?)\s+(with|id|;|$)', header, re.IGNORECASE | re.DOTALL)
-        if by_match:
-            relay['by'] = by_match.group(1).strip()
-        
-        with_match = re.search(r'with\s+(.+?)\s+(id|;|$)', header, re.IGNORECASE | re.DOTALL)
-        if with_match:
-            relay['with'] = with_match.group(1).strip()
-        
-        # Extract timestamp
-        time_match = re.search(r';\s*(.+)$', header)
-        if time_match:
-            time_str = time_match.group(1).strip()
-            try:
-                relay['time_dt'] = email.utils.parsedate_to_datetime(time_str)
-                relay['time'] = relay['time_dt'].strftime('%m/%d/%Y %I:%M:%S %p')
-            except:
-                relay['time'] = time_str
-        
-        # Extract IP
-        relay['ip'] = self._extract_ip_from_text(relay['from'])
-        
-        return relay
+        tokens = tokenize_received(header)
+        return RelayHop(
+            hop,
+            from_=tokens['from'],
+            by=tokens['by'],
+            with_=tokens['with'],
+            id=tokens['id'],
+            for_=tokens['for'],
+            ip=extract_ip(tokens['from']),
+            time_dt=parse_received_date(tokens['date']),
+            date_text=tokens['date']
+        )
     
     def _extract_ip_from_text(self, text: str) -> str:
         """Extract IP address from text"""
-        # IPv4 pattern
-        ipv4_pattern = r'(?:(?:25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)\.){3}(?:25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)'
-        # IPv6 pattern (simplified)
-        ipv6_pattern = r'(?:[0-9a-fA-F]{1,4}:){7}[0-9a-fA-F]{1,4}'
-        
-        # Try IPv4 first
-        ipv4_match = re.search(ipv4_pattern, text)
-        if ipv4_match:
-            return ipv4_match.group(0)
-        
-        # Try IPv6
-        ipv6_match = re.search(ipv6_pattern, text)
-        if ipv6_match:
-            return ipv6_match.group(0)
-        
-        return ''
+        return extract_ip(text)
     
     def _extract_sender_ip(self, msg, result: EmailParseResult):
         """Extract sender IP address"""
         auth_results = result.auth_results
         
+        # Prefer the connecting IP recorded as a structured property
+        for header in result.authentication_results:
+            if header.is_arc:
+                continue
+            for entry in header.results:
+                candidate = entry.get('smtp.remote-ip') or entry.get('policy.iprev')
+                if candidate and self._is_valid_ip(candidate) and not self._is_private_ip(candidate):
+                    result.sender_ip = candidate
+                    return
+        
         # Try to find IP in authentication results
         ip_match = re.search(r'(?:sender\s*ip\s*is|client-ip=)\s*([\[\(]?[\d\.:a-fA-F]+[\]\)]?)', 
                             auth_results, re.IGNORECASE)
@@ -291,8 +546,8 @@ class EmailAnalyzer:
         
         # Fall back to first public IP in relay chain
         for relay in result.relays:
-            if relay['ip'] and self._is_valid_ip(relay['ip']) and not self._is_private_ip(relay['ip']):
-                result.sender_ip = relay['ip']
+            if relay.ip and self._is_valid_ip(relay.ip) and not self._is_private_ip(relay.ip):
+                result.sender_ip = relay.ip
                 return
     
     def _calculate_delays(self, msg, result: EmailParseResult):
@@ -312,10 +567,12 @@ class EmailAnalyzer:
         relays = result.relays
         
         for i in range(1, len(relays)):
-            if relays[i-1]['time_dt'] and relays[i]['time_dt']:
-                delta = (relays[i]['time_dt'] - relays[i-1]['time_dt']).total_seconds()
-                relays[i]['delay'] = max(delta, 0)
-                calculated_delay += relays[i]['delay']
+            if relays[i-1].timestamp is not None and relays[i].timestamp is not None:
+                step = relays[i].timestamp - relays[i-1].timestamp
+                if step < 0:
+                    result.skewed_hops.append(relays[i].hop)
+                relays[i].delay = max(step, 0)
+                calculated_delay += relays[i].delay
         
         result.total_delay = calculated_delay
         result.delay_source = "Calculated from Received headers"
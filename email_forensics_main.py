@@ -15,17 +15,34 @@ from PySide6.QtWidgets import (
     QTextEdit, QPushButton, QLabel, QTreeWidget, QTreeWidgetItem,
     QTabWidget, QTableWidget, QTableWidgetItem, QHeaderView,
     QSplitter, QGroupBox, QMessageBox, QFileDialog, QProgressBar,
-    QStatusBar, QMenuBar, QMenu, QToolBar, QStyle, QStyleFactory
+    QStatusBar, QMenuBar, QMenu, QToolBar, QStyle, QStyleFactory, QInputDialog
+)
+from PySide6.QtCore import (
+    Qt, QThread, Signal, QTimer, QMimeData, QPropertyAnimation, QEasingCurve,
+    QObject, QRunnable, QThreadPool
 )
-from PySide6.QtCore import Qt, QThread, Signal, QTimer, QMimeData, QPropertyAnimation, QEasingCurve
 from PySide6.QtGui import QAction, QIcon, QFont, QColor, QPalette, QDragEnterEvent, QDropEvent, QClipboard
 
 # Import core modules
-from email_core import EmailAnalyzer, EmailParseResult
-from ip_lookup import IPLookupService
+from email_core import EmailAnalyzer, EmailParseResult, decode_header_block, read_header_block
+from ip_lookup import IPLookupService, BlacklistChecker
 from dns_lookup import DNSLookupService
+from dkim_verify import DKIMVerifier
+from arc_verify import ARCValidator
+from cache_store import SECTION_DNS, SECTION_IP, ResultCache
+from enrichment import BatchEnricher, IPEnrichment, is_public_ip
 from config_manager import ConfigManager, ThemeManager
 from export_manager import ExportManager
+from mailbox_ingest import MBOX_EXTENSIONS, MboxReader, MessageRef, read_message
+from msg_reader import MsgFormatError, MsgReader
+from pst_reader import PST_EXTENSIONS, PstReader
+
+# Header bytes shown in the editor for a message loaded from a file; the
+# analysis itself reads the file, so nothing past this is ever decoded
+PREVIEW_BYTES = 64 * 1024
+
+# Files the input area accepts by drag and drop
+DROP_EXTENSIONS = ('.eml', '.msg') + MBOX_EXTENSIONS + PST_EXTENSIONS
 
 class AnalysisThread(QThread):
     """Background thread for email analysis"""
@@ -33,26 +50,93 @@ class AnalysisThread(QThread):
     error = Signal(str)
     progress = Signal(int, str)
     
-    def __init__(self, header_text):
+    def __init__(self, header_text, dkim_verifier=None, arc_validator=None, result_cache=None,
+                 source=None):
         super().__init__()
         self.header_text = header_text
-        self.analyzer = EmailAnalyzer()
+        # File path or mbox MessageRef to analyze as raw bytes instead of header_text
+        self.source = source
+        self.analyzer = EmailAnalyzer(dkim_verifier=dkim_verifier, arc_validator=arc_validator,
+                                      result_cache=result_cache)
     
     def run(self):
         try:
             self.progress.emit(10, "Parsing email headers...")
-            result = self.analyzer.analyze(self.header_text, progress_callback=self.progress.emit)
+            if isinstance(self.source, MessageRef):
+                data = read_message(self.source)
+                try:
+                    result = self.analyzer.analyze_bytes(data, progress_callback=self.progress.emit)
+                finally:
+                    data.release()
+            elif self.source:
+                result = self.analyzer.analyze_file(self.source, progress_callback=self.progress.emit)
+            else:
+                result = self.analyzer.analyze(self.header_text, progress_callback=self.progress.emit)
             self.finished.emit(result)
         except Exception as e:
             self.error.emit(str(e))
 
+class EnrichmentSignals(QObject):
+    """Signals emitted by enrichment tasks, tagged with the analysis generation"""
+    ip_data = Signal(int, str, str, object)   # generation, ip, kind, value
+    dns_data = Signal(int, str, object)       # generation, kind, value
+    task_done = Signal(int)
+
+class EnrichmentTask(QRunnable):
+    """One network lookup run on the enrichment thread pool
+    
+    Tasks belonging to an older analysis are skipped if they have not started
+    yet, and their results are dropped if they were already running.
+    """
+    
+    def __init__(self, generation: int, current_generation, lookup, emit, done):
+        super().__init__()
+        self.generation = generation
+        self.current_generation = current_generation
+        self.lookup = lookup
+        self.emit = emit
+        self.done = done
+    
+    def run(self):
+        try:
+            if self.generation != self.current_generation():
+                return
+            try:
+                value = self.lookup()
+            except Exception as e:
+                value = {'error': str(e)}
+            if self.generation == self.current_generation():
+                self.emit(value)
+        finally:
+            self.done(self.generation)
+
 class EmailForensicsApp(QMainWindow):
     def __init__(self):
         super().__init__()
         self.config = ConfigManager()
         self.export_manager = ExportManager()
         self.current_result = None
+        # File or mbox message previewed in the editor, analyzed from its raw bytes
+        self.input_source = None
         self.clipboard_monitor_enabled = False
+        
+        # Progressive IP/DNS/blacklist enrichment of the current result
+        self.enrichment_pool = QThreadPool(self)
+        self.enrichment_pool.setMaxThreadCount(8)
+        self.enrichment_generation = 0
+        self.enrichment_pending = 0
+        self.enrichment_entries = {}
+        # Result cache sections refreshed by the lookups in flight
+        self.enrichment_sections = set()
+        self.enrichment_signals = EnrichmentSignals()
+        self.enrichment_signals.ip_data.connect(self.on_enrichment_ip_data)
+        self.enrichment_signals.dns_data.connect(self.on_enrichment_dns_data)
+        self.enrichment_signals.task_done.connect(self.on_enrichment_task_done)
+        self.ip_service = None
+        self.dns_service = None
+        self.blacklist_checker = None
+        self.result_cache = None
+        
         self.init_ui()
         self.setup_clipboard_monitor()
         self.apply_theme()
@@ -130,6 +214,14 @@ class EmailForensicsApp(QMainWindow):
         open_msg_action.triggered.connect(self.open_msg_file)
         file_menu.addAction(open_msg_action)
         
+        open_mbox_action = QAction("Open Mail&box", self)
+        open_mbox_action.triggered.connect(self.open_mailbox)
+        file_menu.addAction(open_mbox_action)
+        
+        open_pst_action = QAction("Open &PST Archive", self)
+        open_pst_action.triggered.connect(self.open_pst_archive)
+        file_menu.addAction(open_pst_action)
+        
         save_action = QAction("&Export Results", self)
         save_action.setShortcut("Ctrl+S")
         save_action.triggered.connect(self.export_results)
@@ -413,7 +505,7 @@ class EmailForensicsApp(QMainWindow):
         if event.mimeData().hasUrls():
             for url in event.mimeData().urls():
                 file_path = url.toLocalFile().lower()
-                if file_path.endswith('.eml') or file_path.endswith('.msg'):
+                if file_path.endswith(DROP_EXTENSIONS):
                     event.acceptProposedAction()
                     return
         event.ignore()
@@ -429,22 +521,37 @@ class EmailForensicsApp(QMainWindow):
             elif file_lower.endswith('.msg'):
                 self.load_msg_file(file)
                 break
+            elif file_lower.endswith(MBOX_EXTENSIONS):
+                self.load_mbox_message(file)
+                break
+            elif file_lower.endswith(PST_EXTENSIONS):
+                self.load_pst_message(file)
+                break
     
     def analyze_headers(self):
         """Analyze the email headers"""
-        header_text = self.input_text.toPlainText().strip()
+        # Once the preview has been edited, the edited text is what gets analyzed
+        source = None if self.input_text.document().isModified() else self.input_source
+        header_text = '' if source else self.input_text.toPlainText().strip()
         
-        if not header_text:
+        if not source and not header_text:
             QMessageBox.warning(self, "Warning", "Please enter email headers to analyze.")
             return
         
+        # Lookups for the previous message are no longer wanted
+        self.cancel_enrichment()
+        
         # Disable UI during analysis
         self.analyze_button.setEnabled(False)
         self.progress_bar.setVisible(True)
         self.status_bar.showMessage("Analyzing...")
         
         # Start analysis in background thread
-        self.analysis_thread = AnalysisThread(header_text)
+        dkim_verifier = DKIMVerifier() if self.config.get('verify_dkim', True) else None
+        arc_validator = ARCValidator() if self.config.get('verify_arc', True) else None
+        self.result_cache = ResultCache.default()
+        self.analysis_thread = AnalysisThread(header_text, dkim_verifier, arc_validator, self.result_cache,
+                                              source)
         self.analysis_thread.finished.connect(self.on_analysis_complete)
         self.analysis_thread.error.connect(self.on_analysis_error)
         self.analysis_thread.progress.connect(self.on_analysis_progress)
@@ -459,18 +566,128 @@ class EmailForensicsApp(QMainWindow):
         """Handle analysis completion"""
         self.current_result = result
         
-        # Fetch IP information if we have a sender IP
-        if result.sender_ip:
-            self.status_bar.showMessage("Fetching IP information...")
-            ip_service = IPLookupService(api_key=self.config.get('ipinfo_api_key'))
-            result.ip_info = ip_service.get_ip_info(result.sender_ip)
-        
+        # Show the parsed results right away; network data fills in as it arrives
         self.display_results(result)
         
         # Re-enable UI
         self.analyze_button.setEnabled(True)
         self.progress_bar.setVisible(False)
-        self.status_bar.showMessage("Analysis complete", 5000)
+        self.status_bar.showMessage("Analysis loaded from cache" if result.cached_sections
+                                    else "Analysis complete", 5000)
+        
+        self.start_enrichment(result)
+    
+    def _ensure_lookup_services(self):
+        """Create the shared lookup services on first use"""
+        if self.ip_service is None:
+            self.ip_service = IPLookupService(api_key=self.config.get('ipinfo_api_key'),
+                                              offline=self.config.get('offline_ip_lookup', False))
+            self.dns_service = DNSLookupService()
+            # Every enrichment thread may be checking an IP at the same time
+            self.blacklist_checker = BlacklistChecker(concurrent_ips=self.enrichment_pool.maxThreadCount())
+    
+    def closeEvent(self, event):
+        """Stop lookups and release the blacklist checker's threads"""
+        self.cancel_enrichment()
+        if self.blacklist_checker is not None:
+            self.blacklist_checker.close()
+        super().closeEvent(event)
+    
+    def cancel_enrichment(self):
+        """Drop queued lookups and ignore results of ones still running"""
+        self.enrichment_generation += 1
+        self.enrichment_pool.clear()
+        self.enrichment_pending = 0
+        self.enrichment_entries = {}
+        self.enrichment_sections = set()
+    
+    def _submit_enrichment(self, lookup, emit):
+        """Queue a lookup for the current generation"""
+        task = EnrichmentTask(self.enrichment_generation, lambda: self.enrichment_generation,
+                              lookup, emit, self.enrichment_signals.task_done.emit)
+        self.enrichment_pending += 1
+        self.enrichment_pool.start(task)
+    
+    def start_enrichment(self, result: EmailParseResult):
+        """Look up IP, DNS and blacklist data for a result in the background"""
+        self.cancel_enrichment()
+        self._ensure_lookup_services()
+        generation = self.enrichment_generation
+        signals = self.enrichment_signals
+        
+        # Sections restored from the result cache are still fresh; skip their lookups
+        ips = []
+        if SECTION_IP not in result.cached_sections:
+            ips = [ip for ip in dict.fromkeys([result.sender_ip] + [r.ip for r in result.relays])
+                   if is_public_ip(ip)]
+            self.enrichment_sections.add(SECTION_IP)
+        for ip in ips:
+            self.enrichment_entries[ip] = IPEnrichment(ip=ip)
+            for kind, lookup in (('info', self.ip_service.get_ip_info),
+                                 ('ptr', self.dns_service.get_ptr_record),
+                                 ('blacklists', self.blacklist_checker.check_ip)):
+                self._submit_enrichment(
+                    lambda lookup=lookup, ip=ip: lookup(ip),
+                    lambda value, ip=ip, kind=kind: signals.ip_data.emit(generation, ip, kind, value)
+                )
+        
+        refresh_dns = SECTION_DNS not in result.cached_sections
+        if refresh_dns:
+            self.enrichment_sections.add(SECTION_DNS)
+        if result.from_domain and refresh_dns:
+            self._submit_enrichment(
+                lambda: self.dns_service.get_dmarc_record(result.from_domain),
+                lambda value: signals.dns_data.emit(generation, 'dmarc', value)
+            )
+        spf_domain = result.return_path_domain or result.from_domain
+        if spf_domain and refresh_dns:
+            self._submit_enrichment(
+                lambda: self.dns_service.get_spf_record(spf_domain),
+                lambda value: signals.dns_data.emit(generation, 'spf', value)
+            )
+        
+        if self.enrichment_pending:
+            self.status_bar.showMessage("Looking up IP, DNS and blacklist data...")
+    
+    def on_enrichment_ip_data(self, generation: int, ip: str, kind: str, value):
+        """Merge one IP lookup into the current result"""
+        entry = self.enrichment_entries.get(ip)
+        if generation != self.enrichment_generation or entry is None or self.current_result is None:
+            return
+        if kind == 'info':
+            entry.info = value or {}
+        elif kind == 'ptr':
+            entry.ptr = value if isinstance(value, str) else None
+        elif kind == 'blacklists':
+            entry.blacklists = value if isinstance(value, dict) and 'error' not in value else {}
+        BatchEnricher.apply(self.current_result, {ip: entry})
+        
+        if ip == self.current_result.sender_ip:
+            self.update_ip_table(self.current_result)
+        self.update_relay_table(self.current_result)
+    
+    def on_enrichment_dns_data(self, generation: int, kind: str, value):
+        """Fill in a DNS record of the current result"""
+        if generation != self.enrichment_generation or self.current_result is None:
+            return
+        if isinstance(value, str):
+            if kind == 'dmarc':
+                self.current_result.dmarc_txt = value
+            elif kind == 'spf':
+                self.current_result.spf_txt = value
+            self.update_dns_text(self.current_result)
+    
+    def on_enrichment_task_done(self, generation: int):
+        """Track outstanding lookups and finish up when the last one returns"""
+        if generation != self.enrichment_generation:
+            return
+        self.enrichment_pending -= 1
+        if self.enrichment_pending <= 0 and self.current_result is not None:
+            if self.result_cache is not None and self.current_result.cache_key:
+                self.result_cache.update_sections(self.current_result.cache_key, self.current_result,
+                                                  self.enrichment_sections)
+            self.update_raw_text(self.current_result)
+            self.status_bar.showMessage("IP, DNS and blacklist lookups complete", 5000)
     
     def on_analysis_error(self, error_msg: str):
         """Handle analysis error"""
@@ -536,6 +753,18 @@ class EmailForensicsApp(QMainWindow):
         dkim_auth_item.setText(1, result.dkim_status.upper())
         dkim_auth_item.setText(2, "✅ Pass" if result.dkim_authenticated else "❌ Fail")
         
+        # ARC - only shown when the message went through ARC-sealing forwarders
+        if result.arc_instances:
+            arc_item = QTreeWidgetItem(self.auth_tree)
+            arc_item.setText(0, f"ARC Chain ({len(result.arc_instances)} hops)")
+            arc_item.setText(1, result.arc_status.upper())
+            arc_item.setText(2, "✅ Valid" if result.arc_status == "pass" else "❌ Broken")
+            for instance in result.arc_instances:
+                hop_item = QTreeWidgetItem(arc_item)
+                hop_item.setText(0, f"i={instance.instance} {instance.authserv_id or instance.domain}")
+                hop_item.setText(1, f"cv={instance.chain_status}")
+                hop_item.setText(2, instance.seal or "not checked")
+        
         self.auth_tree.expandAll()
         
     def update_ip_table(self, result: EmailParseResult):
@@ -572,6 +801,11 @@ class EmailForensicsApp(QMainWindow):
         
         if result.dkim_info:
             dns_text += f"DKIM Info:\n{result.dkim_info}"
+        if result.dkim_results:
+            dns_text += "\n\nDKIM Verification:\n"
+            dns_text += "\n".join(signature.to_text() for signature in result.dkim_results)
+        if result.arc_info:
+            dns_text += f"\n\nARC:\n{result.arc_info}"
         
         self.dns_text.setPlainText(dns_text)
     
@@ -581,36 +815,36 @@ class EmailForensicsApp(QMainWindow):
         
         for i, relay in enumerate(result.relays):
             # Hop
-            hop_item = QTableWidgetItem(str(relay['hop']))
+            hop_item = QTableWidgetItem(str(relay.hop))
             hop_item.setTextAlignment(Qt.AlignCenter)
             self.relay_table.setItem(i, 0, hop_item)
             
             # Delay
-            delay_item = QTableWidgetItem(f"{relay['delay']:.2f}s")
+            delay_item = QTableWidgetItem(f"{relay.delay:.2f}s")
             delay_item.setTextAlignment(Qt.AlignCenter)
             self.relay_table.setItem(i, 1, delay_item)
             
             # From - full text with tooltip
-            from_item = QTableWidgetItem(relay['from'])
-            from_item.setToolTip(relay['from'])  # Full text in tooltip
+            from_item = QTableWidgetItem(relay.from_)
+            from_item.setToolTip(relay.from_)  # Full text in tooltip
             self.relay_table.setItem(i, 2, from_item)
             
             # By - full text with tooltip
-            by_item = QTableWidgetItem(relay['by'])
-            by_item.setToolTip(relay['by'])  # Full text in tooltip
+            by_item = QTableWidgetItem(relay.by)
+            by_item.setToolTip(relay.by)  # Full text in tooltip
             self.relay_table.setItem(i, 3, by_item)
             
             # With
-            with_item = QTableWidgetItem(relay['with'])
-            with_item.setToolTip(relay['with'])
+            with_item = QTableWidgetItem(relay.with_)
+            with_item.setToolTip(relay.with_)
             self.relay_table.setItem(i, 4, with_item)
             
             # Time
-            time_item = QTableWidgetItem(relay['time'])
+            time_item = QTableWidgetItem(relay.time)
             self.relay_table.setItem(i, 5, time_item)
             
             # Blacklist
-            blacklist_item = QTableWidgetItem("✅" if relay['blacklist'] else "❌")
+            blacklist_item = QTableWidgetItem("✅" if relay.blacklist else "❌")
             blacklist_item.setTextAlignment(Qt.AlignCenter)
             self.relay_table.setItem(i, 6, blacklist_item)
         
@@ -634,12 +868,24 @@ class EmailForensicsApp(QMainWindow):
         raw_json = json.dumps(result.to_dict(), indent=2, default=str)
         self.raw_text.setPlainText(raw_json)
     
+    def set_input(self, text: str, source=None):
+        """Fill the editor; `source` is the file or mbox message the text previews"""
+        self.input_text.setPlainText(text)
+        self.input_text.document().setModified(False)
+        self.input_source = source
+    
+    def set_input_preview(self, header_block: bytes, source) -> bool:
+        """Show the start of a message's header block; True if it was cut short"""
+        self.set_input(decode_header_block(header_block[:PREVIEW_BYTES]), source)
+        return len(header_block) > PREVIEW_BYTES
+    
     def clear_input(self):
         """Clear input text"""
-        self.input_text.clear()
+        self.set_input('')
     
     def clear_all(self):
         """Clear all data"""
+        self.cancel_enrichment()
         self.clear_input()
         self.auth_tree.clear()
         self.ip_table.setRowCount(0)
@@ -654,7 +900,7 @@ class EmailForensicsApp(QMainWindow):
     def paste_from_clipboard(self):
         """Paste text from clipboard"""
         clipboard = QApplication.clipboard()
-        self.input_text.setPlainText(clipboard.text())
+        self.set_input(clipboard.text())
     
     def open_eml_file(self):
         """Open and load an EML file"""
@@ -672,19 +918,120 @@ class EmailForensicsApp(QMainWindow):
         if file_path:
             self.load_msg_file(file_path)
     
+    def open_mailbox(self):
+        """Pick a message out of an mbox file"""
+        file_path, _ = QFileDialog.getOpenFileName(
+            self, "Open Mailbox", "", "Mailbox Files (*.mbox *.mbx);;All Files (*.*)"
+        )
+        if file_path:
+            self.load_mbox_message(file_path)
+    
+    def load_mbox_message(self, file_path: str, number: int = 0):
+        """Load message `number` (from 1) of an mbox, asking which when not given"""
+        try:
+            # The index saved by the first scan makes later opens instant
+            with MboxReader(file_path, index=True) as mbox:
+                self.status_bar.showMessage(f"Scanning {os.path.basename(file_path)}...")
+                count = len(mbox)
+                if not count:
+                    QMessageBox.warning(self, "Empty Mailbox", "No messages were found in this file.")
+                    return
+                if not number:
+                    number, ok = QInputDialog.getInt(
+                        self, "Open Mailbox", f"Message number (1 - {count}):", 1, 1, count
+                    )
+                    if not ok:
+                        self.status_bar.clearMessage()
+                        return
+                # Only the headers are copied out; analysis reads the message from the map
+                truncated = self.set_input_preview(mbox.header_block(number - 1), mbox.ref(number - 1))
+            self.status_bar.showMessage(
+                f"Loaded message {number} of {count}: {os.path.basename(file_path)}"
+                + (" (headers truncated in preview)" if truncated else ""), 5000
+            )
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Failed to load mailbox:\n{str(e)}")
+    
+    def open_pst_archive(self):
+        """Pick a message out of an Outlook PST/OST archive"""
+        file_path, _ = QFileDialog.getOpenFileName(
+            self, "Open PST Archive", "", "Outlook Data Files (*.pst *.ost);;All Files (*.*)"
+        )
+        if file_path:
+            self.load_pst_message(file_path)
+    
+    def load_pst_message(self, file_path: str, number: int = 0):
+        """Load the headers of message `number` (from 1) of a PST, asking which when not given"""
+        try:
+            with PstReader(file_path) as pst:
+                self.status_bar.showMessage(f"Scanning {os.path.basename(file_path)}...")
+                # Only node ids are kept; headers are read for the chosen message alone
+                messages = list(pst)
+                count = len(messages)
+                if not count:
+                    QMessageBox.warning(self, "Empty Archive", "No messages were found in this file.")
+                    return
+                if not number:
+                    number, ok = QInputDialog.getInt(
+                        self, "Open PST Archive", f"Message number (1 - {count}):", 1, 1, count
+                    )
+                    if not ok:
+                        self.status_bar.clearMessage()
+                        return
+                message = messages[number - 1]
+                headers = pst.transport_headers(message)
+            if not headers:
+                QMessageBox.warning(self, "No Headers Found",
+                    f"Message {number} ({message.folder or 'top level'}) has no Internet headers.")
+                return
+            self.set_input(headers)
+            self.status_bar.showMessage(
+                f"Loaded message {number} of {count} ({message.folder}): {os.path.basename(file_path)}", 5000
+            )
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Failed to load PST archive:\n{str(e)}")
+    
     def load_eml_file(self, file_path: str):
         """Load EML file content"""
         try:
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                content = f.read()
-            self.input_text.setPlainText(content)
-            self.status_bar.showMessage(f"Loaded: {os.path.basename(file_path)}", 5000)
+            # The body is never read; analysis goes back to the file for the raw bytes
+            with open(file_path, 'rb') as f:
+                header_block = read_header_block(f, PREVIEW_BYTES + 1)
+            truncated = self.set_input_preview(header_block, file_path)
+            self.status_bar.showMessage(f"Loaded: {os.path.basename(file_path)}"
+                                        + (" (headers truncated in preview)" if truncated else ""), 5000)
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Failed to load EML file:\n{str(e)}")
     
     def load_msg_file(self, file_path: str):
         """Load MSG file content"""
         try:
+            # Read just the transport headers stream, not the whole message
+            try:
+                with MsgReader(file_path) as msg:
+                    headers = msg.transport_headers()
+                    basic_headers = msg.basic_headers() if headers is None else ''
+            except MsgFormatError:
+                # Not a compound file we can read; extract_msg may still cope
+                headers = basic_headers = None
+            
+            if headers:
+                self.set_input(headers)
+                self.status_bar.showMessage(f"Loaded MSG: {os.path.basename(file_path)}", 5000)
+                return
+            if basic_headers:
+                self.set_input(basic_headers)
+                QMessageBox.information(self, "Limited Headers", 
+                    "This MSG file contains limited header information. " +
+                    "For best results, use 'View Source' in Outlook to get full headers.")
+                self.status_bar.showMessage(f"Loaded MSG: {os.path.basename(file_path)}", 5000)
+                return
+            if basic_headers is not None:
+                QMessageBox.warning(self, "No Headers Found", 
+                    "Could not extract email headers from this MSG file.\n" +
+                    "Try opening the email in Outlook and using File → Properties → Internet Headers.")
+                return
+            
             # Try to import extract_msg for MSG support
             try:
                 import extract_msg
@@ -710,7 +1057,7 @@ class EmailForensicsApp(QMainWindow):
                 # Get the email headers if available
                 if hasattr(msg, 'header') and msg.header:
                     # Full headers are available
-                    self.input_text.setPlainText(msg.header)
+                    self.set_input(msg.header)
                 else:
                     # Try to get transport headers
                     transport_headers = ""
@@ -720,12 +1067,12 @@ class EmailForensicsApp(QMainWindow):
                         transport_headers = msg._properties.get('transport_message_headers', '')
                     
                     if transport_headers:
-                        self.input_text.setPlainText(transport_headers)
+                        self.set_input(transport_headers)
                     else:
                         # Fallback: use basic headers we collected
                         headers_text = '\n'.join(headers)
                         if headers_text:
-                            self.input_text.setPlainText(headers_text)
+                            self.set_input(headers_text)
                             QMessageBox.information(self, "Limited Headers", 
                                 "This MSG file contains limited header information. " +
                                 "For best results, use 'View Source' in Outlook to get full headers.")
@@ -778,7 +1125,7 @@ class EmailForensicsApp(QMainWindow):
             
             if found_headers:
                 headers_text = ''.join(found_headers)
-                self.input_text.setPlainText(headers_text)
+                self.set_input(headers_text)
                 QMessageBox.information(self, "Partial Headers", 
                     "Extracted partial headers from MSG file.\n" +
                     "For complete headers, install 'extract-msg' package:\n" +
@@ -850,7 +1197,7 @@ class EmailForensicsApp(QMainWindow):
                     QMessageBox.Yes | QMessageBox.No
                 )
                 if response == QMessageBox.Yes:
-                    self.input_text.setPlainText(text)
+                    self.set_input(text)
                     self.analyze_headers()
     
     def show_settings(self):
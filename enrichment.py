@@ -0,0 +1,165 @@
+"""
+Enrichment Module
+Bulk IP enrichment (geo/ASN, PTR, DNSBL) for many analysis results at once
+"""
+
+import dataclasses
+import ipaddress
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional
+
+from dns_lookup import DNSLookupService
+from email_core import EmailParseResult
+from ip_lookup import BlacklistChecker, IPLookupService
+
+@dataclass
+class IPEnrichment:
+    """Everything looked up for one IP address"""
+    ip: str
+    info: Dict = field(default_factory=dict)
+    ptr: Optional[str] = None
+    blacklists: Dict[str, Optional[bool]] = field(default_factory=dict)
+
+    @property
+    def listed(self) -> bool:
+        """True if any blacklist reported the address as listed"""
+        return any(listed is True for listed in self.blacklists.values())
+
+    @property
+    def complete(self) -> bool:
+        """False if some blacklist gave no answer (timeout or DNS error)"""
+        return all(listed is not None for listed in self.blacklists.values())
+
+    def to_dict(self) -> Dict:
+        return {
+            'ip': self.ip,
+            'info': self.info,
+            'ptr': self.ptr,
+            'blacklists': self.blacklists,
+            'listed': self.listed
+        }
+
+def is_public_ip(ip: Optional[str]) -> bool:
+    """Check if a string is a globally routable IP address worth looking up"""
+    if not ip:
+        return False
+    try:
+        address = ipaddress.ip_address(ip)
+    except ValueError:
+        return False
+    return not (address.is_private or address.is_loopback or address.is_multicast
+                or address.is_reserved or address.is_link_local or address.is_unspecified)
+
+def collect_ips(results: Iterable[EmailParseResult]) -> List[str]:
+    """Unique public sender and relay IPs across results, in first-seen order"""
+    seen = {}
+    for result in results:
+        if is_public_ip(result.sender_ip):
+            seen.setdefault(result.sender_ip, None)
+        for relay in result.relays:
+            ip = relay.ip
+            if is_public_ip(ip):
+                seen.setdefault(ip, None)
+    return list(seen)
+
+class BatchEnricher:
+    """Enriches many EmailParseResults, looking up each unique IP once per run
+
+    IPs are collected from every sender and relay, deduplicated against a
+    run-wide memo, resolved concurrently on a bounded thread pool, and the
+    answers are joined back into the results.
+    """
+
+    def __init__(self, ip_service: Optional[IPLookupService] = None,
+                 dns_service: Optional[DNSLookupService] = None,
+                 blacklist_checker: Optional[BlacklistChecker] = None,
+                 max_workers: int = 16, check_blacklists: bool = True,
+                 resolve_ptr: bool = True):
+        self.ip_service = ip_service or IPLookupService()
+        self.dns_service = dns_service or DNSLookupService()
+        self.check_blacklists = check_blacklists
+        self.blacklist_checker = blacklist_checker or (BlacklistChecker(concurrent_ips=max_workers)
+                                                       if check_blacklists else None)
+        self.resolve_ptr = resolve_ptr
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='enrich')
+        self._memo: Dict[str, IPEnrichment] = {}
+        # IPs whose unanswered blacklists have had their one retry
+        self._retried = set()
+        self._lock = threading.Lock()
+
+    def _lookup(self, ip: str) -> IPEnrichment:
+        """Resolve everything for one IP (runs on the pool)"""
+        entry = IPEnrichment(ip=ip)
+        try:
+            entry.info = self.ip_service.get_ip_info(ip)
+        except Exception as e:
+            entry.info = {'error': str(e), 'ip': ip}
+        if self.resolve_ptr:
+            entry.ptr = self.dns_service.get_ptr_record(ip)
+        if self.blacklist_checker is not None:
+            entry.blacklists = self.blacklist_checker.check_ip(ip)
+        return entry
+
+    def _recheck(self, entry: IPEnrichment) -> IPEnrichment:
+        """Ask only the blacklists that gave no answer before (runs on the pool)"""
+        unanswered = [name for name, listed in entry.blacklists.items() if listed is None]
+        answers = self.blacklist_checker.check_ip(entry.ip, unanswered)
+        blacklists = dict(entry.blacklists)
+        blacklists.update((name, listed) for name, listed in answers.items() if listed is not None)
+        return dataclasses.replace(entry, blacklists=blacklists)
+
+    def enrich_ips(self, ips: Iterable[str]) -> Dict[str, IPEnrichment]:
+        """Look up IPs not seen earlier in this run and return entries for all of them"""
+        ips = list(dict.fromkeys(ips))
+        with self._lock:
+            entries = {ip: self._memo[ip] for ip in ips if ip in self._memo}
+            # Blacklists that did not answer get one more chance when the IP comes back
+            retry = [entry for entry in entries.values()
+                     if not entry.complete and entry.ip not in self._retried]
+            self._retried.update(entry.ip for entry in retry)
+        missing = [ip for ip in ips if ip not in entries]
+        for entry in self._executor.map(self._lookup, missing):
+            entries[entry.ip] = entry
+            with self._lock:
+                self._memo[entry.ip] = entry
+        for entry in self._executor.map(self._recheck, retry):
+            entries[entry.ip] = entry
+            with self._lock:
+                self._memo[entry.ip] = entry
+        return {ip: entries[ip] for ip in ips}
+
+    def enrich(self, results: List[EmailParseResult]) -> Dict[str, IPEnrichment]:
+        """Enrich a group of results in place and return the per-IP entries"""
+        enrichments = self.enrich_ips(collect_ips(results))
+        for result in results:
+            self.apply(result, enrichments)
+        return enrichments
+
+    @staticmethod
+    def apply(result: EmailParseResult, enrichments: Dict[str, IPEnrichment]):
+        """Join enrichment entries back into one result"""
+        sender = enrichments.get(result.sender_ip)
+        if sender:
+            result.ip_info = sender.info
+        for relay in result.relays:
+            entry = enrichments.get(relay.ip)
+            if entry is None:
+                continue
+            relay.ip_info = entry.info
+            relay.ptr = entry.ptr
+            relay.blacklists = entry.blacklists
+            # True means "clean", matching the relay table's check mark
+            relay.blacklist = not entry.listed
+
+    @property
+    def unique_ips(self) -> int:
+        """Number of distinct IPs looked up so far"""
+        return len(self._memo)
+
+    def close(self):
+        """Release worker threads"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        if self.blacklist_checker is not None:
+            self.blacklist_checker.close()
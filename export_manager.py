@@ -208,12 +208,12 @@ class ExportManager:
             relay_data = [['Hop', 'Delay', 'From', 'Time']]
             for relay in result.relays[:15]:  # Limit to first 15 relays for PDF
                 # Use Paragraph for 'from' to enable wrapping
-                from_paragraph = Paragraph(relay['from'], self.styles['Normal'])
+                from_paragraph = Paragraph(relay.from_, self.styles['Normal'])
                 relay_data.append([
-                    str(relay['hop']),
-                    f"{relay['delay']:.2f}s",
+                    str(relay.hop),
+                    f"{relay.delay:.2f}s",
                     from_paragraph,
-                    relay['time']
+                    relay.time
                 ])
             # Adjust column widths: give more space to 'From'
             relay_table = Table(relay_data, colWidths=[0.7*inch, 0.8*inch, 3.5*inch, 1.5*inch])
@@ -366,6 +366,24 @@ class ExportManager:
                            'Pass' if result.dkim_authenticated else 'Fail'])
             writer.writerow([])
             
+            # Per-method results from every Authentication-Results header
+            if result.authentication_results:
+                writer.writerow(['=== Authentication-Results Detail ==='])
+                writer.writerow(['Header', 'Instance', 'Authserv-ID', 'Method', 'Result', 'Reason', 'Properties'])
+                for header in result.authentication_results:
+                    header_name = 'ARC-Authentication-Results' if header.is_arc else 'Authentication-Results'
+                    for entry in header.results:
+                        writer.writerow([
+                            header_name,
+                            header.instance if header.is_arc else '',
+                            header.authserv_id,
+                            entry.method,
+                            entry.result,
+                            entry.reason,
+                            ' '.join(f"{key}={value}" for key, value in entry.properties.items())
+                        ])
+                writer.writerow([])
+            
             # Domain information
             writer.writerow(['=== Domain Information ==='])
             writer.writerow(['From Domain', result.from_domain])
@@ -390,13 +408,13 @@ class ExportManager:
             writer.writerow(['Hop', 'Delay (s)', 'From', 'By', 'With', 'Time', 'IP'])
             for relay in result.relays:
                 writer.writerow([
-                    relay['hop'],
-                    f"{relay['delay']:.2f}",
-                    relay['from'],
-                    relay['by'],
-                    relay['with'],
-                    relay['time'],
-                    relay.get('ip', '')
+                    relay.hop,
+                    f"{relay.delay:.2f}",
+                    relay.from_,
+                    relay.by,
+                    relay.with_,
+                    relay.time,
+                    relay.ip
                 ])
             writer.writerow([])
             
@@ -445,6 +463,19 @@ class ExportManager:
             f.write("PASS\n" if result.dkim_authenticated else "FAIL\n")
             f.write("\n")
             
+            # Per-method results from every Authentication-Results header
+            if result.authentication_results:
+                f.write("AUTHENTICATION-RESULTS DETAIL\n")
+                f.write("-" * 40 + "\n")
+                for header in result.authentication_results:
+                    if header.is_arc:
+                        f.write(f"ARC-Authentication-Results i={header.instance} ({header.authserv_id}):\n")
+                    else:
+                        f.write(f"Authentication-Results ({header.authserv_id}):\n")
+                    for entry in header.results:
+                        f.write(f"  {entry.to_text()}\n")
+                f.write("\n")
+            
             # Domain Information
             f.write("DOMAIN INFORMATION\n")
             f.write("-" * 40 + "\n")
@@ -472,17 +503,17 @@ class ExportManager:
             
             f.write("Detailed Relay Information:\n")
             for relay in result.relays:
-                f.write(f"\nHop {relay['hop']}:\n")
-                f.write(f"  Delay: {relay['delay']:.2f} seconds\n")
-                f.write(f"  From: {relay['from']}\n")
-                if relay['by']:
-                    f.write(f"  By: {relay['by']}\n")
-                if relay['with']:
-                    f.write(f"  Protocol: {relay['with']}\n")
-                if relay['time']:
-                    f.write(f"  Time: {relay['time']}\n")
-                if relay.get('ip'):
-                    f.write(f"  IP: {relay['ip']}\n")
+                f.write(f"\nHop {relay.hop}:\n")
+                f.write(f"  Delay: {relay.delay:.2f} seconds\n")
+                f.write(f"  From: {relay.from_}\n")
+                if relay.by:
+                    f.write(f"  By: {relay.by}\n")
+                if relay.with_:
+                    f.write(f"  Protocol: {relay.with_}\n")
+                if relay.time:
+                    f.write(f"  Time: {relay.time}\n")
+                if relay.ip:
+                    f.write(f"  IP: {relay.ip}\n")
             f.write("\n")
             
             # DNS Records
@@ -767,16 +798,16 @@ class ExportManager:
                 </tr>"""
             
             for relay in result.relays[:20]:  # Limit to 20 relays for HTML
-                from_text = relay['from'][:50] + '...' if len(relay['from']) > 50 else relay['from']
-                by_text = relay['by'][:30] + '...' if len(relay['by']) > 30 else relay['by']
+                from_text = relay.from_[:50] + '...' if len(relay.from_) > 50 else relay.from_
+                by_text = relay.by[:30] + '...' if len(relay.by) > 30 else relay.by
                 
                 html += f"""
                 <tr>
-                    <td>{relay['hop']}</td>
-                    <td>{relay['delay']:.2f}s</td>
-                    <td title="{relay['from']}">{from_text}</td>
-                    <td title="{relay['by']}">{by_text}</td>
-                    <td>{relay['time']}</td>
+                    <td>{relay.hop}</td>
+                    <td>{relay.delay:.2f}s</td>
+                    <td title="{relay.from_}">{from_text}</td>
+                    <td title="{relay.by}">{by_text}</td>
+                    <td>{relay.time}</td>
                 </tr>"""
             
             html += """
@@ -991,8 +1022,8 @@ class ExportManager:
                 f.write("|-----|-------|------|------|\n")
                 
                 for relay in result.relays[:15]:
-                    from_text = relay['from'][:40] + '...' if len(relay['from']) > 40 else relay['from']
-                    f.write(f"| {relay['hop']} | {relay['delay']:.2f}s | {from_text} | {relay['time']} |\n")
+                    from_text = relay.from_[:40] + '...' if len(relay.from_) > 40 else relay.from_
+                    f.write(f"| {relay.hop} | {relay.delay:.2f}s | {from_text} | {relay.time} |\n")
                 
                 if len(result.relays) > 15:
                     f.write(f"\n*... and {len(result.relays) - 15} more relay hops*\n")
@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""
+IP Database Module
+Offline IP-to-ASN/geo lookups for air-gapped analysis
+
+The database is built once from an iptoasn.com style TSV/CSV file
+(range_start, range_end, AS number, country code, AS description) into a
+compact binary file of disjoint sorted ranges. Lookups memory-map that file
+and binary search it, so opening is instant and a lookup takes microseconds.
+
+Usage:
+    python -m ip_database build ip2asn-combined.tsv -o ip_database.bin
+    python -m ip_database lookup 8.8.8.8 2001:4860::8888
+"""
+
+import argparse
+import bisect
+import csv
+import ipaddress
+import mmap
+import os
+import struct
+import sys
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from config_manager import ConfigManager
+
+MAGIC = b'EFIPDB\x00\x01'
+# magic, record count, IPv4 range count, IPv6 range count,
+# then offsets of the record table, both range tables and the string blob
+_HEADER = struct.Struct('<8sIIIQQQQ')
+# AS number, country code, org offset in the string blob, org length
+_RECORD = struct.Struct('<I2sIH')
+# Ranges are stored as big-endian packed addresses so that comparing the raw
+# bytes orders them numerically; each is followed by a record index
+_INDEX = struct.Struct('<I')
+_WIDTH = {4: 4, 6: 16}
+
+# Well-known cloud provider ranges, compiled once into a range table
+CLOUD_RANGES = {
+    'Google': ['8.8.0.0/12', '35.0.0.0/8', '104.16.0.0/12'],
+    'Amazon AWS': ['52.0.0.0/8', '54.0.0.0/8', '18.0.0.0/8'],
+    'Microsoft Azure': ['13.64.0.0/11', '20.0.0.0/8', '40.0.0.0/8'],
+    'Cloudflare': ['104.16.0.0/12', '172.64.0.0/13', '173.245.48.0/20']
+}
+
+def flatten_ranges(ranges: Iterable[Tuple[int, int, int]]) -> List[Tuple[int, int, int]]:
+    """Turn possibly nested (start, end, value) ranges into disjoint sorted ones
+
+    Where ranges nest, the innermost (most specific) one wins, which gives
+    longest-prefix-match semantics for CIDR input. Adjacent pieces with the
+    same value are merged.
+    """
+    out: List[Tuple[int, int, int]] = []
+
+    def emit(start, end, value):
+        if start > end:
+            return
+        if out and out[-1][2] == value and out[-1][1] + 1 == start:
+            out[-1] = (out[-1][0], end, value)
+        else:
+            out.append((start, end, value))
+
+    stack: List[Tuple[int, int, int]] = []
+    cursor = 0
+    for start, end, value in sorted(ranges, key=lambda r: (r[0], -r[1])):
+        while stack and stack[-1][1] < start:
+            top = stack.pop()
+            emit(cursor, top[1], top[2])
+            cursor = max(cursor, top[1] + 1)
+        if stack:
+            emit(cursor, start - 1, stack[-1][2])
+        stack.append((start, end, value))
+        cursor = start
+    while stack:
+        top = stack.pop()
+        emit(cursor, top[1], top[2])
+        cursor = max(cursor, top[1] + 1)
+    return out
+
+class RangeTable:
+    """In-memory disjoint range table searched with bisect"""
+
+    def __init__(self, ranges: Iterable[Tuple[int, int, object]]):
+        values: List[object] = []
+        index: Dict[object, int] = {}
+        flat_input = []
+        for start, end, value in ranges:
+            if value not in index:
+                index[value] = len(values)
+                values.append(value)
+            flat_input.append((start, end, index[value]))
+        flat = flatten_ranges(flat_input)
+        self._starts = [r[0] for r in flat]
+        self._ends = [r[1] for r in flat]
+        self._values = [values[r[2]] for r in flat]
+
+    def lookup(self, value: int):
+        position = bisect.bisect_right(self._starts, value) - 1
+        if position >= 0 and value <= self._ends[position]:
+            return self._values[position]
+        return None
+
+def _build_cloud_tables() -> Dict[int, RangeTable]:
+    ranges = {4: [], 6: []}
+    for provider, networks in CLOUD_RANGES.items():
+        for network in networks:
+            net = ipaddress.ip_network(network, strict=False)
+            ranges[net.version].append(
+                (int(net.network_address), int(net.broadcast_address), provider))
+    return {version: RangeTable(items) for version, items in ranges.items()}
+
+_CLOUD_TABLES = _build_cloud_tables()
+
+def cloud_provider(ip: str) -> Optional[str]:
+    """Name of the cloud provider owning an address, if it is in a known range"""
+    try:
+        address = ipaddress.ip_address(ip)
+    except ValueError:
+        return None
+    return _CLOUD_TABLES[address.version].lookup(int(address))
+
+def iter_source_rows(path: Union[str, Path]) -> Iterator[Tuple[str, str, int, str, str]]:
+    """Read (start, end, asn, country, org) rows from an iptoasn TSV or CSV file"""
+    with open(path, 'r', encoding='utf-8', errors='replace', newline='') as f:
+        sample = f.readline()
+        f.seek(0)
+        delimiter = '\t' if '\t' in sample else ','
+        for row in csv.reader(f, delimiter=delimiter):
+            if len(row) < 3 or row[0].startswith('#'):
+                continue
+            try:
+                asn = int(row[2].upper().lstrip('AS') or 0)
+            except ValueError:
+                # Header line
+                continue
+            country = row[3].strip().upper() if len(row) > 3 else ''
+            org = row[4].strip() if len(row) > 4 else ''
+            yield row[0].strip(), row[1].strip(), asn, country, org
+
+def build_database(source: Union[str, Path], output: Union[str, Path]) -> Dict[str, int]:
+    """Compile a TSV/CSV source into the binary database format"""
+    records: List[Tuple[int, str, str]] = []
+    record_index: Dict[Tuple[int, str, str], int] = {}
+    ranges = {4: [], 6: []}
+
+    for start_text, end_text, asn, country, org in iter_source_rows(source):
+        if asn == 0:
+            # iptoasn marks unrouted space with AS0 "Not routed"
+            continue
+        try:
+            start = ipaddress.ip_address(start_text)
+            end = ipaddress.ip_address(end_text)
+        except ValueError:
+            continue
+        if start.version != end.version or int(end) < int(start):
+            continue
+        key = (asn, country, org)
+        if key not in record_index:
+            record_index[key] = len(records)
+            records.append(key)
+        ranges[start.version].append((int(start), int(end), record_index[key]))
+
+    strings = bytearray()
+    string_offsets: Dict[str, int] = {}
+    record_blob = bytearray()
+    for asn, country, org in records:
+        encoded = org.encode('utf-8')[:0xFFFF]
+        if org not in string_offsets:
+            string_offsets[org] = len(strings)
+            strings += encoded
+        record_blob += _RECORD.pack(asn, country.encode('ascii', 'replace')[:2].ljust(2),
+                                    string_offsets[org], len(encoded))
+
+    tables = {}
+    for version, items in ranges.items():
+        width = _WIDTH[version]
+        blob = bytearray()
+        flat = flatten_ranges(items)
+        for start, end, index in flat:
+            blob += start.to_bytes(width, 'big') + end.to_bytes(width, 'big') + _INDEX.pack(index)
+        tables[version] = (len(flat), blob)
+
+    records_offset = _HEADER.size
+    v4_offset = records_offset + len(record_blob)
+    v6_offset = v4_offset + len(tables[4][1])
+    strings_offset = v6_offset + len(tables[6][1])
+
+    output = Path(output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    temp = output.with_suffix(output.suffix + '.tmp')
+    with open(temp, 'wb') as f:
+        f.write(_HEADER.pack(MAGIC, len(records), tables[4][0], tables[6][0],
+                             records_offset, v4_offset, v6_offset, strings_offset))
+        f.write(record_blob)
+        f.write(tables[4][1])
+        f.write(tables[6][1])
+        f.write(strings)
+    os.replace(temp, output)
+
+    return {'records': len(records), 'ipv4_ranges': tables[4][0], 'ipv6_ranges': tables[6][0]}
+
+class IPDatabase:
+    """Memory-mapped offline IP-to-ASN/country database"""
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        with open(self.path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, self._record_count, v4_count, v6_count, self._records_offset,
+         v4_offset, v6_offset, self._strings_offset) = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            self._mm.close()
+            raise ValueError(f"{self.path} is not an IP database file")
+        self._tables = {4: (v4_offset, v4_count), 6: (v6_offset, v6_count)}
+
+    @classmethod
+    def default(cls) -> Optional['IPDatabase']:
+        """Open the database configured by 'ip_database_path', or None if absent"""
+        config = ConfigManager()
+        path = config.get('ip_database_path') or config.config_dir / 'ip_database.bin'
+        try:
+            return cls(path)
+        except (OSError, ValueError, struct.error):
+            return None
+
+    def close(self):
+        self._mm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self) -> int:
+        return self._tables[4][1] + self._tables[6][1]
+
+    def lookup(self, ip: str) -> Optional[Dict[str, str]]:
+        """Find the range containing an address
+
+        Returns a dict with 'asn', 'org', 'country' and 'prefix' (the
+        matched start-end range), or None if the address is not covered.
+        """
+        try:
+            address = ipaddress.ip_address(ip.strip())
+        except (ValueError, AttributeError):
+            return None
+        key = address.packed
+        width = len(key)
+        offset, count = self._tables[address.version]
+        entry_size = 2 * width + _INDEX.size
+        mm = self._mm
+
+        # Last range whose start is <= the address
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = offset + mid * entry_size
+            if mm[start:start + width] <= key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == 0:
+            return None
+        entry = offset + (lo - 1) * entry_size
+        end = mm[entry + width:entry + 2 * width]
+        if key > end:
+            return None
+
+        record = _INDEX.unpack_from(mm, entry + 2 * width)[0]
+        asn, country, org_offset, org_length = _RECORD.unpack_from(
+            mm, self._records_offset + record * _RECORD.size)
+        org_start = self._strings_offset + org_offset
+        factory = ipaddress.IPv4Address if width == 4 else ipaddress.IPv6Address
+        return {
+            'asn': f'AS{asn}',
+            'org': mm[org_start:org_start + org_length].decode('utf-8', 'replace'),
+            'country': country.decode('ascii').strip(),
+            'prefix': f"{factory(mm[entry:entry + width])}-{factory(end)}"
+        }
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(prog='ip_database',
+                                     description='Build or query the offline IP database')
+    sub = parser.add_subparsers(dest='command', required=True)
+    build = sub.add_parser('build', help='Compile an iptoasn TSV/CSV file')
+    build.add_argument('source', help='ip2asn-combined.tsv or a CSV with the same columns')
+    build.add_argument('-o', '--output', help='Output file (default: configured database path)')
+    lookup = sub.add_parser('lookup', help='Look up addresses')
+    lookup.add_argument('ips', nargs='+')
+    lookup.add_argument('-d', '--database', help='Database file (default: configured path)')
+    args = parser.parse_args(argv)
+
+    config = ConfigManager()
+    default_path = config.get('ip_database_path') or config.config_dir / 'ip_database.bin'
+
+    if args.command == 'build':
+        stats = build_database(args.source, args.output or default_path)
+        print(f"{stats['records']} records, {stats['ipv4_ranges']} IPv4 ranges, "
+              f"{stats['ipv6_ranges']} IPv6 ranges")
+        return 0
+
+    with IPDatabase(args.database or default_path) as db:
+        for ip in args.ips:
+            print(f"{ip}: {db.lookup(ip) or 'not found'}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
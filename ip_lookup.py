@@ -7,19 +7,24 @@ import requests
 import ipaddress
 import dns.resolver
 import dns.exception
-from typing import Dict, Optional, List
+import dns.reversename
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Dict, Iterable, Optional, List
 from functools import lru_cache
-import json
-import os
-from pathlib import Path
+
+from cache_store import IPInfoCache
+from ip_database import IPDatabase, cloud_provider
 
 class IPLookupService:
     """Service for IP geolocation and reputation checking"""
     
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, cache: Optional[IPInfoCache] = None,
+                 ip_database: Optional[IPDatabase] = None, offline: bool = False):
         self.api_key = api_key
-        self.cache_dir = Path.home() / ".email_forensics" / "ip_cache"
-        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.cache = cache if cache is not None else IPInfoCache.default()
+        self.ip_database = ip_database if ip_database is not None else IPDatabase.default()
+        # Never contact ipinfo.io or DNS-based ASN services (air-gapped use)
+        self.offline = offline
         self.session = requests.Session()
         self.session.headers.update({'User-Agent': 'EmailForensics/1.0'})
     
@@ -34,6 +39,9 @@ class IPLookupService:
         if cached:
             return cached
         
+        if self.offline:
+            return self._get_offline_ip_info(ip)
+        
         try:
             # Try IPInfo API
             url = f'https://ipinfo.io/{ip}/json'
@@ -52,9 +60,9 @@ class IPLookupService:
                 return self._get_fallback_ip_info(ip)
                 
         except requests.exceptions.Timeout:
-            return {'error': 'Request timed out', 'ip': ip}
+            return self._get_offline_ip_info(ip) or {'error': 'Request timed out', 'ip': ip}
         except requests.exceptions.RequestException as e:
-            return {'error': f'Request failed: {str(e)}', 'ip': ip}
+            return self._get_offline_ip_info(ip) or {'error': f'Request failed: {str(e)}', 'ip': ip}
         except Exception as e:
             return {'error': f'Unexpected error: {str(e)}', 'ip': ip}
     
@@ -153,29 +161,35 @@ class IPLookupService:
     
     def _get_cached_ip_info(self, ip: str) -> Optional[Dict]:
         """Get cached IP information"""
-        cache_file = self.cache_dir / f"{ip.replace('.', '_')}.json"
-        if cache_file.exists():
-            try:
-                with open(cache_file, 'r') as f:
-                    data = json.load(f)
-                    # Check if cache is still valid (7 days)
-                    import time
-                    if time.time() - data.get('_cached_at', 0) < 7 * 24 * 3600:
-                        return data
-            except:
-                pass
-        return None
+        if self.cache is None:
+            return None
+        return self.cache.get(ip)
     
     def _cache_ip_info(self, ip: str, data: Dict):
         """Cache IP information"""
-        cache_file = self.cache_dir / f"{ip.replace('.', '_')}.json"
-        try:
-            import time
-            data['_cached_at'] = time.time()
-            with open(cache_file, 'w') as f:
-                json.dump(data, f)
-        except:
-            pass
+        if self.cache is not None:
+            self.cache.put(ip, data)
+    
+    def _get_offline_ip_info(self, ip: str) -> Dict:
+        """Get IP information from the local database and known cloud ranges only"""
+        info = {}
+        
+        record = self.ip_database.lookup(ip) if self.ip_database else None
+        if record:
+            info = {
+                'ip': ip,
+                'asn': record['asn'],
+                'org': f"{record['asn']} {record['org']}".strip(),
+                'country': record['country'],
+                'prefix': record['prefix'],
+                'source': 'offline'
+            }
+        
+        provider = cloud_provider(ip)
+        if provider and not info:
+            info = {'ip': ip, 'org': provider, 'source': 'offline'}
+        
+        return info
     
     def _get_fallback_ip_info(self, ip: str) -> Dict:
         """Get fallback IP information when API is unavailable"""
@@ -186,30 +200,16 @@ class IPLookupService:
         if ptr:
             info['hostname'] = ptr
         
-        # Try to get ASN info
-        asn_info = self.get_asn_info(ip)
-        if asn_info:
-            info.update(asn_info)
-        
-        # Check if it's a known range
-        try:
-            ip_obj = ipaddress.ip_address(ip)
-            
-            # Check for known cloud providers
-            cloud_ranges = {
-                'Google': ['8.8.0.0/12', '35.0.0.0/8', '104.16.0.0/12'],
-                'Amazon AWS': ['52.0.0.0/8', '54.0.0.0/8', '18.0.0.0/8'],
-                'Microsoft Azure': ['13.64.0.0/11', '20.0.0.0/8', '40.0.0.0/8'],
-                'Cloudflare': ['104.16.0.0/12', '172.64.0.0/13', '173.245.48.0/20']
-            }
-            
-            for provider, ranges in cloud_ranges.items():
-                for range_str in ranges:
-                    if ip_obj in ipaddress.ip_network(range_str):
-                        info['org'] = provider
-                        break
-        except:
-            pass
+        # Prefer the local database; only ask Team Cymru when it has no answer
+        offline = self._get_offline_ip_info(ip)
+        if offline.get('asn'):
+            info.update(offline)
+        else:
+            asn_info = self.get_asn_info(ip)
+            if asn_info:
+                info.update(asn_info)
+            if offline.get('org'):
+                info['org'] = offline['org']
         
         return info
     
@@ -248,23 +248,55 @@ class BlacklistChecker:
         ('dul.dnsbl.sorbs.net', 'SORBS DUL')
     ]
     
-    def __init__(self):
+    def __init__(self, deadline: float = 2.5, concurrent_ips: int = 1):
         self.resolver = dns.resolver.Resolver()
-        self.resolver.timeout = 2
-        self.resolver.lifetime = 2
+        self.resolver.timeout = min(2, deadline)
+        self.resolver.lifetime = deadline
+        # Overall time budget for one check_ip call, shared by all zones
+        self.deadline = deadline
+        # One thread per zone for each IP that callers check at the same time,
+        # so no zone waits in a queue while the deadline runs
+        self._executor = ThreadPoolExecutor(max_workers=len(self.BLACKLISTS) * max(1, concurrent_ips),
+                                            thread_name_prefix='dnsbl')
     
-    def check_ip(self, ip: str) -> Dict[str, Optional[bool]]:
-        """Check an IP against multiple blacklists"""
+    def check_ip(self, ip: str, zones: Optional[Iterable[str]] = None) -> Dict[str, Optional[bool]]:
+        """Check an IP against multiple blacklists
+        
+        All zones are queried concurrently. Zones that have not answered when
+        the deadline expires are reported as None (unknown). `zones` limits
+        the check to some blacklists, by name.
+        """
         if not self._is_valid_public_ip(ip):
             return {}
         
-        results = {}
-        reversed_ip = '.'.join(reversed(ip.split('.')))
+        reversed_ip = self._reverse_ip(ip)
+        futures = {
+            bl_name: self._executor.submit(self._check_single_blacklist, reversed_ip, bl_host)
+            for bl_host, bl_name in self.BLACKLISTS
+            if zones is None or bl_name in zones
+        }
+        done, not_done = wait(futures.values(), timeout=self.deadline)
         
-        for bl_host, bl_name in self.BLACKLISTS:
-            results[bl_name] = self._check_single_blacklist(reversed_ip, bl_host)
+        for future in not_done:
+            future.cancel()
         
-        return results
+        return {bl_name: future.result() if future in done else None
+                for bl_name, future in futures.items()}
+    
+    def close(self):
+        """Release the worker threads"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+    
+    def __enter__(self) -> 'BlacklistChecker':
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+    
+    def _reverse_ip(self, ip: str) -> str:
+        """Reverse an IP into DNSBL query form (octets for IPv4, nibbles for IPv6)"""
+        name = dns.reversename.from_address(ip).to_text(omit_final_dot=True)
+        return name.rsplit('.', 2)[0]
     
     def _check_single_blacklist(self, reversed_ip: str, blacklist: str) -> Optional[bool]:
         """Check a single blacklist"""
@@ -0,0 +1,387 @@
+"""
+Mailbox Ingest Module
+Streams messages out of mbox files and Maildir trees for analysis
+
+An mbox is memory-mapped and its "From " separator lines are found in one
+forward pass. Each message is handed out as a memoryview of the map, so
+bodies are never copied, and the first message can be analyzed while the
+rest of the file is still being scanned. Maildir trees are walked lazily,
+one file per message.
+
+A scan can be saved as a sidecar index (<mbox>.idx) so that later opens
+find message N with one seek instead of rescanning the file.
+"""
+
+import hashlib
+import mmap
+import os
+import re
+import struct
+import sys
+import tempfile
+from array import array
+from functools import lru_cache
+from typing import BinaryIO, Iterator, List, NamedTuple, Optional, Union
+
+from email_core import split_header_block
+
+# File names treated as mbox files when walking a directory
+MBOX_EXTENSIONS = ('.mbox', '.mbx')
+
+# Message folders of a Maildir; tmp holds deliveries still being written
+MAILDIR_FOLDERS = ('new', 'cur')
+
+_FROM = b'From '
+_NEW_FROM = b'\nFrom '
+
+INDEX_SUFFIX = '.idx'
+# Bump the last digit when the record layout changes
+_INDEX_MAGIC = b'MBXIDX01'
+# Magic, mbox size, mbox mtime in ns, message count
+_INDEX_HEADER = struct.Struct('<8sQqQ')
+# "From " line offset, header block length, Message-ID hash
+_INDEX_RECORD = struct.Struct('<QI8s')
+
+_MESSAGE_ID_RE = re.compile(rb'^message-id:[ \t]*(?:\r?\n[ \t]+)?([^\s]+)', re.IGNORECASE | re.MULTILINE)
+_NO_MESSAGE_ID = bytes(8)
+
+class MessageRef(NamedTuple):
+    """Location of one message inside an mbox
+
+    Small and picklable, so worker processes can be handed references and
+    map the file themselves.
+    """
+    path: str
+    index: int      # position in the mbox, counting from 0
+    offset: int     # first byte after the "From " line
+    end: int        # one past the last byte of the message
+
+    def __str__(self) -> str:
+        # Messages are numbered from 1 for people
+        return f"{self.path}#{self.index + 1}"
+
+def _normalize_message_id(message_id: Union[str, bytes]) -> bytes:
+    if isinstance(message_id, str):
+        message_id = message_id.encode('utf-8', 'surrogateescape')
+    return message_id.strip().strip(b'<>')
+
+def message_id_hash(message_id: Union[str, bytes]) -> bytes:
+    """8-byte digest of a Message-ID, without its angle brackets"""
+    return hashlib.blake2b(_normalize_message_id(message_id), digest_size=8).digest()
+
+def _header_message_id_hash(header_block: bytes) -> bytes:
+    match = _MESSAGE_ID_RE.search(header_block)
+    return message_id_hash(match.group(1)) if match else _NO_MESSAGE_ID
+
+class IndexEntry(NamedTuple):
+    """One message of an mbox index"""
+    start: int              # offset of its "From " line
+    header_length: int      # bytes of the header block after the "From " line
+    message_id_hash: bytes  # message_id_hash() of its Message-ID, zeros if it has none
+
+def _index_paths(mbox_path: str) -> List[str]:
+    """Where an index may live: beside the mbox, else in the cache directory"""
+    from config_manager import ConfigManager
+    digest = hashlib.sha256(os.path.realpath(mbox_path).encode('utf-8', 'surrogateescape')).hexdigest()
+    cache_dir = ConfigManager().get_cache_dir() / 'mbox_index'
+    return [mbox_path + INDEX_SUFFIX, str(cache_dir / f'{digest[:32]}{INDEX_SUFFIX}')]
+
+class MboxIndex:
+    """Sidecar index of an mbox: message number to byte offsets
+
+    Fixed-size records follow a small header, so entry n is one unpack at a
+    computed offset of the mapped file. The header records the size and
+    modification time of the mbox; once either changes the index is ignored
+    and rebuilt.
+    """
+
+    def __init__(self, path: str, data: mmap.mmap, count: int):
+        self.path = path
+        self._data = data
+        self.count = count
+
+    @classmethod
+    def open(cls, mbox_path: str, stat: os.stat_result) -> Optional['MboxIndex']:
+        """The index of an mbox, if one exists and still matches the file"""
+        for path in _index_paths(mbox_path):
+            try:
+                with open(path, 'rb') as f:
+                    data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (OSError, ValueError):
+                continue
+            if len(data) >= _INDEX_HEADER.size:
+                magic, size, mtime_ns, count = _INDEX_HEADER.unpack_from(data)
+                if (magic == _INDEX_MAGIC and size == stat.st_size and mtime_ns == stat.st_mtime_ns
+                        and len(data) == _INDEX_HEADER.size + count * _INDEX_RECORD.size):
+                    return cls(path, data, count)
+            data.close()
+        return None
+
+    def __len__(self) -> int:
+        return self.count
+
+    def entry(self, number: int) -> IndexEntry:
+        """Entry of message `number` (from 0)"""
+        return IndexEntry(*_INDEX_RECORD.unpack_from(self._data, _INDEX_HEADER.size
+                                                     + number * _INDEX_RECORD.size))
+
+    def start(self, number: int) -> int:
+        return self.entry(number).start
+
+    def find(self, message_id: Union[str, bytes]) -> List[int]:
+        """Numbers (from 0) of the messages whose Message-ID hashes the same"""
+        wanted = message_id_hash(message_id)
+        return [number for number, (_, _, digest)
+                in enumerate(_INDEX_RECORD.iter_unpack(self._data[_INDEX_HEADER.size:]))
+                if digest == wanted]
+
+    def close(self):
+        self._data.close()
+
+class _IndexWriter:
+    """Writes an index as an mbox is scanned, and keeps it only if the scan finishes"""
+
+    def __init__(self, mbox_path: str, stat: os.stat_result):
+        self.mbox_path = mbox_path
+        self.stat = stat
+        self.count = 0
+        self.path = ''
+        self._file: Optional[BinaryIO] = None
+        self._temp = ''
+        for path in _index_paths(mbox_path):
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+                fd, self._temp = tempfile.mkstemp(prefix='.mbox-', suffix=INDEX_SUFFIX,
+                                                  dir=os.path.dirname(os.path.abspath(path)))
+            except OSError:
+                continue
+            self.path = path
+            self._file = os.fdopen(fd, 'wb')
+            self._file.write(bytes(_INDEX_HEADER.size))
+            break
+
+    def add(self, start: int, header_block: bytes):
+        if self._file is not None:
+            self._file.write(_INDEX_RECORD.pack(start, len(header_block),
+                                                _header_message_id_hash(header_block)))
+            self.count += 1
+
+    def finish(self):
+        if self._file is None:
+            return
+        try:
+            self._file.seek(0)
+            self._file.write(_INDEX_HEADER.pack(_INDEX_MAGIC, self.stat.st_size,
+                                                self.stat.st_mtime_ns, self.count))
+            self._file.close()
+            os.replace(self._temp, self.path)
+        except OSError as e:
+            print(f"Warning: cannot save index of {self.mbox_path}: {e}", file=sys.stderr)
+            self.abort()
+        self._file = None
+
+    def abort(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        try:
+            os.remove(self._temp)
+        except OSError:
+            pass
+
+def is_mbox(path: str) -> bool:
+    """True for a file that starts with an mbox "From " line"""
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(_FROM)) == _FROM
+    except OSError:
+        return False
+
+def is_maildir(path: str) -> bool:
+    return all(os.path.isdir(os.path.join(path, name)) for name in ('cur', 'new', 'tmp'))
+
+class MboxReader:
+    """Memory-mapped mbox file
+
+    Separators are lines starting with "From " (mboxo/mboxrd). Body lines
+    quoted as ">From " are left as stored.
+
+    With `index` set, a valid sidecar index replaces the scan. When there is
+    none, the first complete scan writes one.
+    """
+
+    def __init__(self, path: Union[str, os.PathLike], index: bool = False):
+        self.path = os.fspath(path)
+        self._file = open(self.path, 'rb')
+        stat = os.fstat(self._file.fileno())
+        self.size = stat.st_size
+        # An empty file cannot be mapped
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b''
+        # Offset of every "From " line found so far, when there is no index
+        self.starts = array('Q')
+        self.scanned = False
+        self.index: Optional[MboxIndex] = None
+        self._index_writer: Optional[_IndexWriter] = None
+        if index:
+            self.index = MboxIndex.open(self.path, stat)
+            if self.index is None:
+                self._index_writer = _IndexWriter(self.path, stat)
+
+    def _scan_next(self) -> bool:
+        """Find the next "From " line after those already known"""
+        data = self._map
+        if not self.starts and data[:len(_FROM)] == _FROM:
+            start = 0
+        else:
+            # Anything before the first separator is not a message
+            found = data.find(_NEW_FROM, self.starts[-1] if self.starts else 0)
+            if found < 0:
+                self.scanned = True
+                if self._index_writer is not None:
+                    if self.starts:
+                        self._index_message(self.starts[-1], self.size)
+                    self._index_writer.finish()
+                    self._index_writer = None
+                return False
+            start = found + 1
+        if self._index_writer is not None and self.starts:
+            self._index_message(self.starts[-1], start)
+        self.starts.append(start)
+        return True
+
+    def _index_message(self, start: int, stop: int):
+        ref = self._ref(0, start, stop)
+        self._index_writer.add(start, split_header_block(memoryview(self._map)[ref.offset:ref.end]))
+
+    def _known(self, count: int) -> int:
+        """Number of "From " lines known, scanning on until `count` are if the file has them"""
+        if self.index is not None:
+            return len(self.index)
+        while len(self.starts) < count and not self.scanned:
+            self._scan_next()
+        return len(self.starts)
+
+    def _start(self, index: int) -> int:
+        return self.index.start(index) if self.index is not None else self.starts[index]
+
+    def _separators(self) -> Iterator[int]:
+        """Offsets of the "From " lines, scanning the file only once"""
+        index = 0
+        while index < self._known(index + 1):
+            yield self._start(index)
+            index += 1
+
+    def _ref(self, index: int, start: int, stop: int) -> MessageRef:
+        data = self._map
+        line_end = data.find(b'\n', start, stop)
+        offset = stop if line_end < 0 else line_end + 1
+        # Writers put a blank line before the next "From "; it is not part of the message
+        if stop - offset >= 2 and data[stop - 2:stop] == b'\n\n':
+            stop -= 1
+        return MessageRef(self.path, index, offset, stop)
+
+    def __iter__(self) -> Iterator[MessageRef]:
+        """References to every message, yielded as the file is scanned"""
+        previous = None
+        index = 0
+        for start in self._separators():
+            if previous is not None:
+                yield self._ref(index, previous, start)
+                index += 1
+            previous = start
+        if previous is not None:
+            yield self._ref(index, previous, self.size)
+
+    def __len__(self) -> int:
+        """Number of messages; scans the rest of the file if needed"""
+        return self._known(sys.maxsize)
+
+    def ref(self, index: int) -> MessageRef:
+        """Reference to message `index` (from 0)"""
+        if index < 0:
+            index += len(self)
+        # The end of a message is the start of the next one
+        known = self._known(index + 2)
+        if not 0 <= index < known:
+            raise IndexError(f"{self.path} has no message {index}")
+        stop = self._start(index + 1) if index + 1 < known else self.size
+        return self._ref(index, self._start(index), stop)
+
+    def header_block(self, index: int) -> bytes:
+        """Header block of message `index`, read straight from its offset when indexed"""
+        ref = self.ref(index)
+        if self.index is not None:
+            return self._map[ref.offset:ref.offset + self.index.entry(ref.index).header_length]
+        return split_header_block(self.message(ref))
+
+    def find(self, message_id: Union[str, bytes]) -> List[int]:
+        """Numbers (from 0) of the messages with a Message-ID"""
+        # Index hits are only candidates until the header itself is checked
+        candidates = self.index.find(message_id) if self.index is not None else range(len(self))
+        wanted = _normalize_message_id(message_id)
+        found = []
+        for index in candidates:
+            match = _MESSAGE_ID_RE.search(self.header_block(index))
+            if match and _normalize_message_id(match.group(1)) == wanted:
+                found.append(index)
+        return found
+
+    def message(self, ref: Union[MessageRef, int]) -> memoryview:
+        """Raw bytes of a message as a view of the map, without copying"""
+        if not isinstance(ref, MessageRef):
+            ref = self.ref(ref)
+        return memoryview(self._map)[ref.offset:ref.end]
+
+    def close(self):
+        if self._index_writer is not None:
+            # Stopped before the end of the file; a partial index is no use
+            self._index_writer.abort()
+            self._index_writer = None
+        if self.index is not None:
+            self.index.close()
+        if isinstance(self._map, mmap.mmap):
+            try:
+                self._map.close()
+            except BufferError:
+                # Views handed out are still alive; the map goes when they do
+                pass
+        self._file.close()
+
+    def __enter__(self) -> 'MboxReader':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+@lru_cache(maxsize=16)
+def _reader(path: str, size: int, mtime_ns: int) -> MboxReader:
+    # Size and mtime are part of the key so a mailbox written to since is mapped afresh
+    return MboxReader(path)
+
+def read_message(ref: MessageRef) -> memoryview:
+    """Bytes of a referenced message; each process keeps its mboxes mapped"""
+    stat = os.stat(ref.path)
+    return _reader(ref.path, stat.st_size, stat.st_mtime_ns).message(ref)
+
+def iter_maildir(root: str) -> Iterator[str]:
+    """Message files of a Maildir and of any Maildirs nested in it (Maildir++ .Folders)"""
+    stack = [root]
+    while stack:
+        folder = stack.pop()
+        for name in MAILDIR_FOLDERS:
+            try:
+                with os.scandir(os.path.join(folder, name)) as entries:
+                    for entry in entries:
+                        # Dot files are not deliveries
+                        if not entry.name.startswith('.') and entry.is_file(follow_symlinks=False):
+                            yield entry.path
+            except OSError as e:
+                print(f"Warning: cannot read {folder}: {e}", file=sys.stderr)
+        try:
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    if (entry.name not in ('cur', 'new', 'tmp') and entry.is_dir(follow_symlinks=False)
+                            and is_maildir(entry.path)):
+                        stack.append(entry.path)
+        except OSError as e:
+            print(f"Warning: cannot read {folder}: {e}", file=sys.stderr)
@@ -0,0 +1,328 @@
+"""
+MSG Reader Module
+Reads the transport headers of Outlook .msg files without parsing the rest
+
+A .msg file is an OLE compound file (MS-CFB) holding one stream per MAPI
+property. The original Internet headers are the PR_TRANSPORT_MESSAGE_HEADERS
+property, stored as the __substg1.0_007D001F stream (007D001E in ANSI
+files). This reader follows only the sector chains that lead to that stream:
+the directory entries on the way, the FAT sectors those chains cross and,
+for a small stream, the mini stream sectors holding it. Bodies, attachments
+and recipients are never read.
+"""
+
+import datetime
+import os
+import struct
+from typing import BinaryIO, Dict, List, Optional, Union
+
+from email_core import decode_header_block
+
+_SIGNATURE = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+_HEADER = struct.Struct('<8s16sHHHHH6sIIIIIIIII')
+_DIRECTORY_ENTRY = struct.Struct('<64sHBBIII16sIQQIQ')
+_DIRECTORY_ENTRY_SIZE = 128
+
+# Sector numbers above this are markers (free, end of chain, FAT, DIFAT)
+_MAX_SECTOR = 0xFFFFFFFA
+_NO_STREAM = 0xFFFFFFFF
+
+_STREAM = 2
+
+# MAPI property types of string properties
+PT_UNICODE = 0x001F
+PT_STRING8 = 0x001E
+
+# MAPI property ids
+PR_TRANSPORT_MESSAGE_HEADERS = 0x007D
+PR_SUBJECT = 0x0037
+PR_CLIENT_SUBMIT_TIME = 0x0039
+PR_DISPLAY_TO = 0x0E04
+PR_DISPLAY_CC = 0x0E03
+PR_INTERNET_MESSAGE_ID = 0x1035
+PR_SENDER_NAME = 0x0C1A
+PR_SENDER_EMAIL_ADDRESS = 0x0C1F
+PR_SENDER_SMTP_ADDRESS = 0x5D01
+
+_PT_SYSTIME = 0x0040
+# Size of the header before the fixed-size property entries of a top-level message
+_PROPERTIES_HEADER_SIZE = 32
+_PROPERTIES_STREAM = '__properties_version1.0'
+_FILETIME_EPOCH = datetime.datetime(1601, 1, 1, tzinfo=datetime.timezone.utc)
+
+class MsgFormatError(ValueError):
+    """The file is not a readable compound file"""
+
+class _DirectoryEntry:
+    __slots__ = ('name', 'type', 'left', 'right', 'child', 'start', 'size')
+
+    def __init__(self, data: bytes):
+        (raw_name, name_length, self.type, _, self.left, self.right, self.child,
+         _, _, _, _, self.start, self.size) = _DIRECTORY_ENTRY.unpack(data)
+        # The length counts the terminating NUL
+        self.name = raw_name[:max(name_length - 2, 0)].decode('utf-16-le', 'replace')
+
+def _name_key(name: str):
+    """Order of names in a storage's directory tree: shorter first, then case-insensitive"""
+    return len(name), name.upper()
+
+class _Chain:
+    """Sector numbers of a FAT chain, followed only as far as they are needed"""
+
+    def __init__(self, next_sector, start: int, limit: int):
+        self._next_sector = next_sector
+        self._sectors: List[int] = []
+        self._next = start
+        self._limit = limit
+
+    def sector(self, index: int) -> int:
+        while len(self._sectors) <= index:
+            if self._next > _MAX_SECTOR or len(self._sectors) >= self._limit:
+                raise MsgFormatError("Sector chain ends early or loops")
+            self._sectors.append(self._next)
+            self._next = self._next_sector(self._next)
+        return self._sectors[index]
+
+class MsgReader:
+    """Lazy reader for the top-level property streams of a .msg file"""
+
+    def __init__(self, source: Union[str, os.PathLike, BinaryIO]):
+        if isinstance(source, (str, os.PathLike)):
+            self._fp = open(source, 'rb')
+            self._owns_file = True
+        else:
+            self._fp = source
+            self._owns_file = False
+        try:
+            self._read_header()
+        except Exception:
+            self.close()
+            raise
+        self._fat_sectors: Dict[int, bytes] = {}
+        self._mini_fat_sectors: Dict[int, bytes] = {}
+        self._entries: Dict[int, _DirectoryEntry] = {}
+        self._directory = _Chain(self._fat_entry, self._first_directory_sector, self._sector_limit)
+        self._mini_fat: Optional[_Chain] = None
+        self._mini_stream: Optional[_Chain] = None
+        self._children: Optional[Dict[str, int]] = None
+
+    def _read_header(self):
+        self._fp.seek(0, os.SEEK_END)
+        file_size = self._fp.tell()
+        self._fp.seek(0)
+        data = self._fp.read(512)
+        if len(data) < 512 or data[:8] != _SIGNATURE:
+            raise MsgFormatError("Not an Outlook MSG (OLE compound) file")
+        fields = _HEADER.unpack_from(data)
+        sector_shift, mini_shift = fields[5], fields[6]
+        if sector_shift not in (9, 12) or mini_shift != 6:
+            raise MsgFormatError("Unsupported compound file sector size")
+        self.sector_size = 1 << sector_shift
+        self.mini_sector_size = 1 << mini_shift
+        (self._first_directory_sector, _, self._mini_cutoff, self._first_mini_fat_sector, _,
+         self._first_difat_sector, self._difat_sector_count) = fields[10:17]
+        # No chain can be longer than the file has sectors
+        self._sector_limit = max(file_size // self.sector_size, 1)
+        self._difat = list(struct.unpack_from('<109I', data, 0x4C))
+        self._next_difat = self._first_difat_sector
+        self._difat_read = 0
+
+    # -- Sectors and chains -------------------------------------------------
+
+    def _read_sector(self, sector: int) -> bytes:
+        self._fp.seek((sector + 1) * self.sector_size)
+        data = self._fp.read(self.sector_size)
+        if len(data) != self.sector_size:
+            raise MsgFormatError("File is truncated")
+        return data
+
+    def _fat_sector_location(self, index: int) -> int:
+        """Sector holding FAT sector `index`, reading DIFAT sectors only as far as needed"""
+        per_sector = self.sector_size // 4 - 1
+        while index >= len(self._difat):
+            if self._next_difat > _MAX_SECTOR or self._difat_read >= self._difat_sector_count:
+                raise MsgFormatError("FAT sector out of range")
+            data = self._read_sector(self._next_difat)
+            entries = struct.unpack(f'<{per_sector + 1}I', data)
+            self._difat.extend(entries[:per_sector])
+            self._next_difat = entries[per_sector]
+            self._difat_read += 1
+        return self._difat[index]
+
+    def _fat_entry(self, sector: int) -> int:
+        per_sector = self.sector_size // 4
+        index, offset = divmod(sector, per_sector)
+        data = self._fat_sectors.get(index)
+        if data is None:
+            location = self._fat_sector_location(index)
+            if location > _MAX_SECTOR:
+                raise MsgFormatError("FAT sector out of range")
+            data = self._fat_sectors[index] = self._read_sector(location)
+        return struct.unpack_from('<I', data, offset * 4)[0]
+
+    def _mini_fat_entry(self, sector: int) -> int:
+        if self._mini_fat is None:
+            self._mini_fat = _Chain(self._fat_entry, self._first_mini_fat_sector, self._sector_limit)
+        per_sector = self.sector_size // 4
+        index, offset = divmod(sector, per_sector)
+        data = self._mini_fat_sectors.get(index)
+        if data is None:
+            data = self._mini_fat_sectors[index] = self._read_sector(self._mini_fat.sector(index))
+        return struct.unpack_from('<I', data, offset * 4)[0]
+
+    def _read_chain(self, chain: _Chain, size: int) -> bytes:
+        """The first `size` bytes of a chain, reading runs of adjacent sectors at once"""
+        parts = []
+        count = -(-size // self.sector_size)
+        index = 0
+        while index < count:
+            first = chain.sector(index)
+            run = 1
+            while index + run < count and chain.sector(index + run) == first + run:
+                run += 1
+            self._fp.seek((first + 1) * self.sector_size)
+            parts.append(self._fp.read(run * self.sector_size))
+            index += run
+        data = b''.join(parts)
+        if len(data) < size:
+            raise MsgFormatError("File is truncated")
+        return data[:size]
+
+    def _read_mini_chain(self, start: int, size: int) -> bytes:
+        if self._mini_stream is None:
+            root = self._entry(0)
+            self._mini_stream = _Chain(self._fat_entry, root.start, self._sector_limit)
+        per_sector = self.sector_size // self.mini_sector_size
+        mini_limit = self._sector_limit * per_sector
+        parts = []
+        sector = start
+        remaining = size
+        while remaining > 0:
+            if sector > _MAX_SECTOR or len(parts) >= mini_limit:
+                raise MsgFormatError("Mini stream chain ends early or loops")
+            index, offset = divmod(sector, per_sector)
+            self._fp.seek((self._mini_stream.sector(index) + 1) * self.sector_size
+                          + offset * self.mini_sector_size)
+            parts.append(self._fp.read(min(remaining, self.mini_sector_size)))
+            remaining -= self.mini_sector_size
+            sector = self._mini_fat_entry(sector)
+        return b''.join(parts)
+
+    # -- Directory ---------------------------------------------------------
+
+    def _entry(self, sid: int) -> _DirectoryEntry:
+        entry = self._entries.get(sid)
+        if entry is None:
+            per_sector = self.sector_size // _DIRECTORY_ENTRY_SIZE
+            index, offset = divmod(sid, per_sector)
+            self._fp.seek((self._directory.sector(index) + 1) * self.sector_size
+                          + offset * _DIRECTORY_ENTRY_SIZE)
+            data = self._fp.read(_DIRECTORY_ENTRY_SIZE)
+            if len(data) != _DIRECTORY_ENTRY_SIZE:
+                raise MsgFormatError("File is truncated")
+            entry = self._entries[sid] = _DirectoryEntry(data)
+        return entry
+
+    def _find(self, name: str) -> Optional[_DirectoryEntry]:
+        """Top-level entry by name, descending the root's red-black tree"""
+        key = _name_key(name)
+        sid = self._entry(0).child
+        for _ in range(self._sector_limit * (self.sector_size // _DIRECTORY_ENTRY_SIZE)):
+            if sid == _NO_STREAM:
+                break
+            entry = self._entry(sid)
+            entry_key = _name_key(entry.name)
+            if entry_key == key:
+                return entry
+            sid = entry.left if key < entry_key else entry.right
+        # Some writers do not keep the tree ordered; fall back to visiting every child
+        sid = self._top_level().get(name.upper())
+        return None if sid is None else self._entry(sid)
+
+    def _top_level(self) -> Dict[str, int]:
+        """Ids of the root's children by upper-cased name"""
+        if self._children is None:
+            children = {}
+            seen = set()
+            stack = [self._entry(0).child]
+            while stack:
+                sid = stack.pop()
+                if sid == _NO_STREAM or sid in seen:
+                    continue
+                seen.add(sid)
+                entry = self._entry(sid)
+                children[entry.name.upper()] = sid
+                stack.extend((entry.left, entry.right))
+            self._children = children
+        return self._children
+
+    # -- Streams and properties ---------------------------------------------
+
+    def stream(self, name: str) -> Optional[bytes]:
+        """Contents of a top-level stream, or None if there is none"""
+        entry = self._find(name)
+        if entry is None or entry.type != _STREAM:
+            return None
+        size = entry.size & 0xFFFFFFFF if self.sector_size == 512 else entry.size
+        if size < self._mini_cutoff:
+            return self._read_mini_chain(entry.start, size)
+        return self._read_chain(_Chain(self._fat_entry, entry.start, self._sector_limit), size)
+
+    def string_property(self, property_id: int) -> Optional[str]:
+        """A top-level string property, Unicode or ANSI"""
+        data = self.stream(f'__substg1.0_{property_id:04X}{PT_UNICODE:04X}')
+        if data is not None:
+            return data.decode('utf-16-le', 'replace').rstrip('\x00')
+        data = self.stream(f'__substg1.0_{property_id:04X}{PT_STRING8:04X}')
+        if data is not None:
+            return decode_header_block(data.rstrip(b'\x00'))
+        return None
+
+    def time_property(self, property_id: int) -> Optional[datetime.datetime]:
+        """A top-level PT_SYSTIME property, from the fixed-size property stream"""
+        data = self.stream(_PROPERTIES_STREAM)
+        if not data:
+            return None
+        wanted = (property_id << 16) | _PT_SYSTIME
+        for offset in range(_PROPERTIES_HEADER_SIZE, len(data) - 15, 16):
+            tag, _, value = struct.unpack_from('<IIQ', data, offset)
+            if tag == wanted:
+                return _FILETIME_EPOCH + datetime.timedelta(microseconds=value // 10)
+        return None
+
+    def transport_headers(self) -> Optional[str]:
+        """The Internet headers the message arrived with, if it has them"""
+        headers = self.string_property(PR_TRANSPORT_MESSAGE_HEADERS)
+        return headers if headers and headers.strip() else None
+
+    def basic_headers(self) -> str:
+        """Headers rebuilt from MAPI properties, for messages without transport headers"""
+        headers = []
+        sender = self.string_property(PR_SENDER_SMTP_ADDRESS) or self.string_property(PR_SENDER_EMAIL_ADDRESS)
+        name = self.string_property(PR_SENDER_NAME)
+        if sender:
+            headers.append(f"From: {name} <{sender}>" if name and name != sender else f"From: {sender}")
+        for label, property_id in (('To', PR_DISPLAY_TO), ('Cc', PR_DISPLAY_CC),
+                                   ('Subject', PR_SUBJECT), ('Message-ID', PR_INTERNET_MESSAGE_ID)):
+            value = self.string_property(property_id)
+            if value:
+                headers.append(f"{label}: {value}")
+        sent = self.time_property(PR_CLIENT_SUBMIT_TIME)
+        if sent is not None:
+            headers.append(f"Date: {sent.strftime('%a, %d %b %Y %H:%M:%S +0000')}")
+        return '\n'.join(headers)
+
+    def close(self):
+        if self._owns_file:
+            self._fp.close()
+
+    def __enter__(self) -> 'MsgReader':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def read_transport_headers(source: Union[str, os.PathLike, BinaryIO]) -> Optional[str]:
+    """Transport headers of a .msg file, or None when it has none"""
+    with MsgReader(source) as msg:
+        return msg.transport_headers()
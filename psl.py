@@ -0,0 +1,132 @@
+"""
+Public Suffix Module
+Organizational domain lookups (RFC 7489 section 3.2) against the Public Suffix List
+
+The bundled public_suffix_list.dat is compiled once per process into a trie
+keyed by labels from the right, so finding the organizational domain of a
+name is one dictionary step per label.
+"""
+
+import sys
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+# Bundled copy of https://publicsuffix.org/list/public_suffix_list.dat (MPL 2.0).
+# In a PyInstaller build data files are unpacked under sys._MEIPASS.
+PSL_FILE = Path(getattr(sys, '_MEIPASS', Path(__file__).parent)) / 'public_suffix_list.dat'
+
+# Trie node markers; real labels are never empty
+_RULE = ''
+_EXCEPTION = '!'
+
+def _normalize(domain: str) -> str:
+    return domain.strip().rstrip('.').lower()
+
+def _label_forms(label: str) -> Iterable[str]:
+    """A rule label as written plus its punycode form, so either spelling matches"""
+    yield label
+    try:
+        ascii_label = label.encode('idna').decode('ascii')
+    except UnicodeError:
+        return
+    if ascii_label != label:
+        yield ascii_label
+
+class PublicSuffixList:
+    """Public Suffix List compiled into a reversed-label trie"""
+
+    _default: Optional['PublicSuffixList'] = None
+    _default_lock = threading.Lock()
+
+    def __init__(self, lines: Iterable[str], include_private: bool = True):
+        self._root: Dict = {}
+        private = False
+        for line in lines:
+            line = line.strip()
+            if line.startswith('//'):
+                if '===BEGIN PRIVATE DOMAINS===' in line:
+                    private = True
+                continue
+            # Rules end at the first whitespace
+            rule = line.split()[0].lower() if line else ''
+            if not rule or (private and not include_private):
+                continue
+            self._add(rule)
+
+    def _add(self, rule: str):
+        exception = rule.startswith('!')
+        labels = rule.lstrip('!').split('.')
+        nodes = [self._root]
+        for label in reversed(labels):
+            nodes = [node.setdefault(form, {}) for node in nodes for form in _label_forms(label)]
+        for node in nodes:
+            node[_EXCEPTION if exception else _RULE] = True
+
+    @classmethod
+    def from_file(cls, path, include_private: bool = True) -> 'PublicSuffixList':
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(f, include_private)
+
+    @classmethod
+    def default(cls) -> 'PublicSuffixList':
+        """The bundled list, compiled on first use and shared by the process"""
+        with cls._default_lock:
+            if cls._default is None:
+                cls._default = cls.from_file(PSL_FILE)
+            return cls._default
+
+    def _suffix_labels(self, labels) -> int:
+        """Number of trailing labels that form the public suffix"""
+        node = self._root
+        # The implicit "*" rule makes every TLD a public suffix
+        matched = 1
+        for depth, label in enumerate(reversed(labels)):
+            child = node.get(label)
+            if child is not None and child.get(_EXCEPTION):
+                # "!rule": the suffix is the rule minus its leftmost label
+                return depth
+            wildcard = node.get('*')
+            if wildcard is not None and wildcard.get(_RULE):
+                matched = depth + 1
+            if child is None:
+                break
+            if child.get(_RULE):
+                matched = depth + 1
+            node = child
+        return matched
+
+    def public_suffix(self, domain: str) -> str:
+        """The public suffix of a domain, e.g. 'co.uk' for 'mail.example.co.uk'"""
+        labels = _normalize(domain).split('.')
+        return '.'.join(labels[-self._suffix_labels(labels):])
+
+    def organizational_domain(self, domain: str) -> str:
+        """The public suffix plus one label; a bare public suffix is returned as is"""
+        domain = _normalize(domain)
+        if not domain:
+            return ''
+        labels = domain.split('.')
+        keep = self._suffix_labels(labels) + 1
+        return '.'.join(labels[-keep:]) if keep <= len(labels) else domain
+
+    def is_public_suffix(self, domain: str) -> bool:
+        labels = _normalize(domain).split('.')
+        return self._suffix_labels(labels) >= len(labels)
+
+    def aligned(self, domain: str, other: str, strict: bool = False) -> bool:
+        """DMARC identifier alignment: equal names (strict) or equal organizational domains (relaxed)"""
+        domain, other = _normalize(domain), _normalize(other)
+        if not domain or not other:
+            return False
+        if domain == other:
+            return True
+        return not strict and self.organizational_domain(domain) == self.organizational_domain(other)
+
+def organizational_domain(domain: str) -> str:
+    """Organizational domain using the bundled list"""
+    return PublicSuffixList.default().organizational_domain(domain)
+
+def domains_aligned(domain: str, other: str, strict: bool = False) -> bool:
+    """DMARC alignment check using the bundled list"""
+    return PublicSuffixList.default().aligned(domain, other, strict)
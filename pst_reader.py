@@ -0,0 +1,399 @@
+"""
+PST Reader Module
+Streams the transport headers of the messages in an Outlook PST/OST archive
+
+A pure-Python reader for the ANSI and Unicode formats of [MS-PST]. It goes
+only as deep into the three layers of the format as headers need:
+
+- NDB: the node and block B-trees, read a page at a time through a small
+  cache, so memory stays bounded whatever the size of the archive
+- LTP: the heap-on-node and property context of each folder and message
+- Messages: PidTagTransportMessageHeaders, read from the heap, or from a
+  subnode when it is too large for the heap
+
+Messages are found by walking the node B-tree, so each is read only when
+its turn comes. Bodies, recipients and attachments are never read.
+"""
+
+import bisect
+import os
+import struct
+from functools import lru_cache
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+from email_core import decode_header_block
+from msg_reader import PR_TRANSPORT_MESSAGE_HEADERS, PT_STRING8, PT_UNICODE
+
+PST_EXTENSIONS = ('.pst', '.ost')
+
+_MAGIC = b'!BDN'
+_VERSIONS_ANSI = (14, 15)
+_VERSION_UNICODE = 23
+_VERSION_UNICODE_4K = 36
+
+_PAGE_SIZE = 512
+_PTYPE_BBT = 0x80
+_PTYPE_NBT = 0x81
+# B-tree depth allowed before a file is taken as corrupt
+_MAX_DEPTH = 16
+
+# Bit set in the id of an internal block (XBLOCK, XXBLOCK, SLBLOCK, SIBLOCK);
+# bit 0 is reserved and ignored when looking blocks up
+_BID_INTERNAL = 0x02
+_BLOCK_XBLOCK = 0x01
+_BLOCK_SUBNODE = 0x02
+
+_NID_TYPE_MASK = 0x1F
+NID_TYPE_NORMAL_FOLDER = 0x02
+NID_TYPE_NORMAL_MESSAGE = 0x04
+NID_ROOT_FOLDER = 0x122
+
+_HN_SIGNATURE = 0xEC
+_HN_CLIENT_PC = 0xBC
+_BTH_SIGNATURE = 0xB5
+
+PR_DISPLAY_NAME = 0x3001
+
+_CRYPT_NONE = 0
+_CRYPT_PERMUTE = 1
+_CRYPT_CYCLIC = 2
+
+# mpbbCrypt of [MS-PST] 5.1: R and S; I is the inverse of R
+_CRYPT_R = bytes.fromhex(
+    '41361362a8216ebbf416cc047f64e85d1ef2cb2a74c55e35d295479e962d9a88'
+    '4c7d843fdbac31b6485ff6c4d8398be7233b388ec8c1df25b120a546604e9cfb'
+    'aad35651457c550007c92b9d859b09a08fadb30f63ab894bd7a7155a716642bf'
+    '264a6b98faea7753b270052cfd593a867ece06eb827857c78d43afb41cd45bcd'
+    'e2e9274fc3087280cfb0eff5286dbe304d3492d50e3c2232e5e4f99fc2d10a81'
+    '12e1ee918376e397e6618a1779a4b7dc907a5c8c02a6ca69de501a1193b95287'
+    '58fced1d37491b6ae0293399bd6cd994f340546ff0c673b8d63e6518441fdd67'
+    '10f10c19ecae03a1147ba90bfff8a3c0a201f72ebc2468750dfeba2fb5d0da3d'
+)
+_CRYPT_S = bytes.fromhex(
+    '14530f56b3c87a9ceb65481716159f02cc547c83000d0c0ba262a876dbd9edc7'
+    'c5a4dcac8574d6d0a79bae9a967166c36399b8dd73928e847da55ed15d93b157'
+    '5150808952944f4e0a6bbc8d7f6e47464140440111cb033ff7f4e1a98f3c3af9'
+    'fbf0193082092ec99da08649ee6f4d6dc42d813425871b88aafc06a11238fd4c'
+    '4272641337246a757743ffe6b44b365ce4d8353d45b92cecb7312b290768a30e'
+    '697b189e2139be281a5b78f523ca2ab0af3efe048ce7e5983295d3f64ae8a6ea'
+    'e9f3d52f7020f21f0567ad5510cecde3273bdabad7c226d4911dd21c2233f8fa'
+    'f15aefcf90b68bb5bdc0bf08971e6ce261e0c6c159abbb58de5fdf60797eb28a'
+)
+_CRYPT_I = bytes(sorted(range(256), key=_CRYPT_R.__getitem__))
+
+class PstFormatError(ValueError):
+    """The file is not a readable PST/OST archive"""
+
+class PstMessageRef(NamedTuple):
+    """One message of a PST archive; picklable, so workers can open it themselves"""
+    path: str
+    nid: int        # node id of the message
+    folder: str     # folder path, e.g. "Inbox/Projects"
+
+    def __str__(self) -> str:
+        return f"{self.path}#{self.folder}/{self.nid:#x}"
+
+class _Node(NamedTuple):
+    nid: int
+    bid_data: int
+    bid_sub: int
+    parent: int
+
+def _decrypt_cyclic(data: bytes, key: int) -> bytes:
+    """NDB_CRYPT_CYCLIC, keyed by the low 32 bits of the block id"""
+    key &= 0xFFFFFFFF
+    w = (key ^ (key >> 16)) & 0xFFFF
+    out = bytearray(data)
+    for index, value in enumerate(out):
+        value = _CRYPT_R[(value + w) & 0xFF]
+        value = _CRYPT_S[(value + (w >> 8)) & 0xFF]
+        value = _CRYPT_I[(value - (w >> 8)) & 0xFF]
+        out[index] = (value - w) & 0xFF
+        w = (w + 1) & 0xFFFF
+    return bytes(out)
+
+class _Heap:
+    """Heap-on-node: one heap page per data block of a node"""
+
+    def __init__(self, pages: List[bytes]):
+        if not pages or len(pages[0]) < 12 or pages[0][2] != _HN_SIGNATURE:
+            raise PstFormatError("Node is not a heap")
+        self.pages = pages
+        self.client = pages[0][3]
+        self.root = struct.unpack_from('<I', pages[0], 4)[0]
+
+    def item(self, hid: int) -> bytes:
+        if not hid:
+            return b''
+        index, page_index = (hid >> 5) & 0x7FF, hid >> 16
+        if page_index >= len(self.pages):
+            raise PstFormatError(f"Heap item {hid:#x} is out of range")
+        page = self.pages[page_index]
+        page_map = struct.unpack_from('<H', page, 0)[0]
+        count = struct.unpack_from('<H', page, page_map)[0]
+        if not 1 <= index <= count:
+            raise PstFormatError(f"Heap item {hid:#x} is out of range")
+        start, end = struct.unpack_from('<HH', page, page_map + 4 + (index - 1) * 2)
+        return page[start:end]
+
+    def records(self, hid: int) -> Iterator[Tuple[bytes, bytes]]:
+        """(key, data) of every record of the B-tree-on-heap at `hid`"""
+        header = self.item(hid)
+        if len(header) < 8 or header[0] != _BTH_SIGNATURE:
+            raise PstFormatError("Heap item is not a B-tree")
+        key_size, data_size, levels = header[1], header[2], header[3]
+        yield from self._records(struct.unpack_from('<I', header, 4)[0], key_size, data_size, levels)
+
+    def _records(self, hid: int, key_size: int, data_size: int, level: int) -> Iterator[Tuple[bytes, bytes]]:
+        if not hid:
+            return
+        data = self.item(hid)
+        if level == 0:
+            size = key_size + data_size
+            for offset in range(0, len(data) - size + 1, size):
+                yield data[offset:offset + key_size], data[offset + key_size:offset + size]
+            return
+        size = key_size + 4
+        for offset in range(0, len(data) - size + 1, size):
+            child = struct.unpack_from('<I', data, offset + key_size)[0]
+            yield from self._records(child, key_size, data_size, level - 1)
+
+class PstReader:
+    """Outlook PST/OST archive, read one B-tree page or block at a time"""
+
+    def __init__(self, path: Union[str, os.PathLike], page_cache: int = 256):
+        self.path = os.fspath(path)
+        self._fp = open(self.path, 'rb')
+        try:
+            self._read_header()
+        except Exception:
+            self._fp.close()
+            raise
+        # Recently used B-tree pages; lookups revisit the upper levels constantly
+        self._page = lru_cache(maxsize=page_cache)(self._load_page)
+        self._folders: Optional[Dict[int, str]] = None
+
+    def _read_header(self):
+        data = self._fp.read(_PAGE_SIZE + 52)
+        if len(data) < _PAGE_SIZE or data[:4] != _MAGIC:
+            raise PstFormatError("Not an Outlook PST/OST file")
+        version = struct.unpack_from('<H', data, 10)[0]
+        if version == _VERSION_UNICODE_4K:
+            raise PstFormatError("OST files with 4 KB pages (Outlook 2013 and later) are not supported")
+        if version in _VERSIONS_ANSI:
+            self.unicode = False
+            self._id = 'I'
+            self._nbt_root, self._bbt_root = struct.unpack_from('<4xI4xI', data, 184)
+            self._crypt = data[461]
+        elif version == _VERSION_UNICODE:
+            self.unicode = True
+            self._id = 'Q'
+            self._nbt_root, self._bbt_root = struct.unpack_from('<8xQ8xQ', data, 216)
+            self._crypt = data[513]
+        else:
+            raise PstFormatError(f"Unknown PST version {version}")
+        if self._crypt not in (_CRYPT_NONE, _CRYPT_PERMUTE, _CRYPT_CYCLIC):
+            raise PstFormatError(f"Unknown PST encryption {self._crypt}")
+        self._id_size = struct.calcsize(self._id)
+        self._fp.seek(0, os.SEEK_END)
+        self.size = self._fp.tell()
+
+    # -- NDB: B-trees and blocks ------------------------------------------------
+
+    def _load_page(self, offset: int, page_type: int) -> Tuple[int, List[int], List[tuple]]:
+        """(level, keys, entries) of a B-tree page"""
+        self._fp.seek(offset)
+        page = self._fp.read(_PAGE_SIZE)
+        if len(page) != _PAGE_SIZE:
+            raise PstFormatError("File is truncated")
+        trailer = _PAGE_SIZE - (16 if self.unicode else 12)
+        count, _, entry_size, level = struct.unpack_from('<BBBB', page, trailer - (8 if self.unicode else 4))
+        if page[trailer] != page_type:
+            raise PstFormatError(f"Bad B-tree page at {offset:#x}")
+        if level:
+            # Key and the offset of the child page
+            layout = f'<{self._id}{self._id_size}x{self._id}'
+        elif page_type == _PTYPE_NBT:
+            # Node id, data block, subnode block, parent node
+            layout = f'<{self._id}{self._id}{self._id}I'
+        else:
+            # Block id, offset, size
+            layout = f'<{self._id}{self._id}H'
+        entry = struct.Struct(layout)
+        if entry_size < entry.size or count * entry_size > trailer:
+            raise PstFormatError(f"Bad B-tree page at {offset:#x}")
+        entries = [entry.unpack_from(page, index * entry_size) for index in range(count)]
+        if page_type == _PTYPE_NBT and not level:
+            # Node ids are 32-bit even where the field is 64
+            entries = [_Node(nid & 0xFFFFFFFF, *rest) for nid, *rest in entries]
+        return level, [entry[0] for entry in entries], entries
+
+    def _search(self, root: int, page_type: int, key: int) -> Optional[tuple]:
+        offset = root
+        for _ in range(_MAX_DEPTH):
+            level, keys, entries = self._page(offset, page_type)
+            if not level:
+                index = bisect.bisect_left(keys, key)
+                return entries[index] if index < len(keys) and keys[index] == key else None
+            # The last child whose first key is not past the one wanted
+            index = bisect.bisect_right(keys, key) - 1
+            if index < 0:
+                return None
+            offset = entries[index][1]
+        raise PstFormatError("B-tree is too deep")
+
+    def _nodes(self) -> Iterator[_Node]:
+        """Every entry of the node B-tree, in order, one page at a time"""
+        stack = [(self._nbt_root, 0)]
+        while stack:
+            offset, depth = stack.pop()
+            if depth >= _MAX_DEPTH:
+                raise PstFormatError("B-tree is too deep")
+            level, _, entries = self._page(offset, _PTYPE_NBT)
+            if level:
+                stack.extend((entry[1], depth + 1) for entry in reversed(entries))
+            else:
+                yield from entries
+
+    def _node(self, nid: int) -> _Node:
+        node = self._search(self._nbt_root, _PTYPE_NBT, nid)
+        if node is None:
+            raise PstFormatError(f"Node {nid:#x} is missing")
+        return node
+
+    def _block(self, bid: int) -> bytes:
+        entry = self._search(self._bbt_root, _PTYPE_BBT, bid & ~1)
+        if entry is None:
+            raise PstFormatError(f"Block {bid:#x} is missing")
+        _, offset, size = entry
+        self._fp.seek(offset)
+        data = self._fp.read(size)
+        if len(data) != size:
+            raise PstFormatError("File is truncated")
+        if bid & _BID_INTERNAL or self._crypt == _CRYPT_NONE:
+            return data
+        if self._crypt == _CRYPT_PERMUTE:
+            return data.translate(_CRYPT_I)
+        return _decrypt_cyclic(data, bid)
+
+    def _data_blocks(self, bid: int, depth: int = 0) -> Iterator[bytes]:
+        """Data blocks of a node, through its XBLOCK / XXBLOCK tree"""
+        data = self._block(bid)
+        if not bid & _BID_INTERNAL:
+            yield data
+            return
+        if data[0] != _BLOCK_XBLOCK or depth > 2:
+            raise PstFormatError(f"Block {bid:#x} is not a data tree")
+        count = struct.unpack_from('<H', data, 2)[0]
+        for child in struct.unpack_from(f'<{count}{self._id}', data, 8):
+            yield from self._data_blocks(child, depth + 1)
+
+    def _subnode(self, bid_sub: int, nid: int, depth: int = 0) -> Tuple[int, int]:
+        """(data block, subnode block) of a subnode of a node"""
+        data = self._block(bid_sub) if bid_sub else b''
+        if len(data) < 4 or data[0] != _BLOCK_SUBNODE or depth > _MAX_DEPTH:
+            raise PstFormatError(f"Subnode {nid:#x} is missing")
+        level, count = data[1], struct.unpack_from('<H', data, 2)[0]
+        header = 8 if self.unicode else 4
+        if not level:
+            entries = struct.iter_unpack(f'<{self._id}{self._id}{self._id}', data[header:header + count * 3 * self._id_size])
+            for entry_nid, bid_data, child_sub in entries:
+                if entry_nid & 0xFFFFFFFF == nid:
+                    return bid_data, child_sub
+            raise PstFormatError(f"Subnode {nid:#x} is missing")
+        child = None
+        for entry_nid, bid in struct.iter_unpack(f'<{self._id}{self._id}', data[header:header + count * 2 * self._id_size]):
+            if entry_nid & 0xFFFFFFFF > nid:
+                break
+            child = bid
+        if child is None:
+            raise PstFormatError(f"Subnode {nid:#x} is missing")
+        return self._subnode(child, nid, depth + 1)
+
+    # -- LTP: properties ----------------------------------------------------
+
+    def _string_property(self, node: _Node, property_id: int) -> Optional[str]:
+        """A string property from the property context of a node"""
+        heap = _Heap(list(self._data_blocks(node.bid_data)))
+        if heap.client != _HN_CLIENT_PC:
+            raise PstFormatError(f"Node {node.nid:#x} is not a property context")
+        wanted = struct.pack('<H', property_id)
+        for key, value in heap.records(heap.root):
+            if key != wanted:
+                continue
+            property_type, hnid = struct.unpack_from('<HI', value)
+            if property_type not in (PT_UNICODE, PT_STRING8):
+                return None
+            if hnid & _NID_TYPE_MASK:
+                # Too large for the heap: the value is the data of a subnode
+                bid_data, _ = self._subnode(node.bid_sub, hnid)
+                raw = b''.join(self._data_blocks(bid_data))
+            else:
+                raw = heap.item(hnid)
+            if property_type == PT_UNICODE:
+                return raw.decode('utf-16-le', 'replace').rstrip('\x00')
+            return decode_header_block(raw.rstrip(b'\x00'))
+        return None
+
+    # -- Folders and messages -------------------------------------------------
+
+    def folders(self) -> Dict[int, str]:
+        """Folder paths by node id, e.g. "Top of Personal Folders/Inbox" """
+        if self._folders is None:
+            names: Dict[int, str] = {}
+            parents: Dict[int, int] = {}
+            for node in self._nodes():
+                if node.nid & _NID_TYPE_MASK == NID_TYPE_NORMAL_FOLDER:
+                    parents[node.nid] = node.parent
+                    try:
+                        names[node.nid] = self._string_property(node, PR_DISPLAY_NAME) or ''
+                    except PstFormatError:
+                        names[node.nid] = f'{node.nid:#x}'
+            folders = {}
+            for nid in names:
+                parts = []
+                current = nid
+                # The root folder is its own parent and has no name worth showing
+                while current in names and current != NID_ROOT_FOLDER and len(parts) <= len(names):
+                    parts.append(names[current])
+                    current = parents[current]
+                folders[nid] = '/'.join(reversed(parts))
+            self._folders = folders
+        return self._folders
+
+    def __iter__(self) -> Iterator[PstMessageRef]:
+        """Every message of the archive, in node order"""
+        folders = self.folders()
+        for node in self._nodes():
+            if node.nid & _NID_TYPE_MASK == NID_TYPE_NORMAL_MESSAGE:
+                yield PstMessageRef(self.path, node.nid, folders.get(node.parent, ''))
+
+    def transport_headers(self, message: Union[PstMessageRef, int]) -> Optional[str]:
+        """The Internet headers a message arrived with, if it has them"""
+        nid = message.nid if isinstance(message, PstMessageRef) else message
+        headers = self._string_property(self._node(nid), PR_TRANSPORT_MESSAGE_HEADERS)
+        return headers if headers and headers.strip() else None
+
+    def close(self):
+        self._fp.close()
+
+    def __enter__(self) -> 'PstReader':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def is_pst(path: str) -> bool:
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(_MAGIC)) == _MAGIC
+    except OSError:
+        return False
+
+@lru_cache(maxsize=4)
+def _reader(path: str) -> PstReader:
+    return PstReader(path)
+
+def read_transport_headers(ref: PstMessageRef) -> Optional[str]:
+    """Transport headers of a referenced message; each process keeps its archives open"""
+    return _reader(ref.path).transport_headers(ref)
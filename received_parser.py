@@ -0,0 +1,156 @@
+"""
+Received Header Parser Module
+Fast tokenizer for Received headers and relay IP extraction
+"""
+
+import datetime
+import email.utils
+import ipaddress
+import re
+from functools import lru_cache
+from typing import Dict, Optional
+
+# Clause keywords of a Received header, in the order they normally appear
+RECEIVED_CLAUSES = ('from', 'by', 'via', 'with', 'id', 'for')
+# Matched against the unfolded, lowercased header so the pattern can be a
+# plain space-delimited alternation without IGNORECASE or lookarounds
+_CLAUSE_RE = re.compile(r' (from|by|via|with|id|for) ')
+
+# Common RFC 5322 date-time with a numeric zone, e.g. "Tue, 5 Mar 2024 10:00:05 -0800"
+_DATE_RE = re.compile(
+    r'(?:[A-Za-z]{3},\s*)?(\d{1,2})\s+([A-Za-z]{3})\s+(\d{2,4})\s+'
+    r'(\d{1,2}):(\d{2})(?::(\d{2}))?(?:\.\d+)?\s+([+-])(\d{2})(\d{2})'
+)
+_MONTHS = {name: index for index, name in enumerate(
+    ('jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec'), 1)}
+
+# Address literal as written by the receiving MTA, e.g. [192.0.2.1] or [IPv6:2001:db8::1]
+_BRACKET_IP_RE = re.compile(r'\[(?:IPv6:)?([0-9A-Fa-f:.]+)\]', re.IGNORECASE)
+_IPV4_RE = re.compile(
+    r'(?:(?:25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)\.){3}(?:25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)'
+)
+# IPv6 pattern (simplified, uncompressed form only)
+_IPV6_RE = re.compile(r'(?:[0-9a-fA-F]{1,4}:){7}[0-9a-fA-F]{1,4}')
+
+def _mask_comments(text: str) -> str:
+    """Blank out parenthesized comments (keeping offsets) so their contents are never tokenized"""
+    pieces = []
+    last = 0
+    pos = text.find('(')
+    while pos != -1:
+        depth = 1
+        cursor = pos + 1
+        while depth:
+            close = text.find(')', cursor)
+            if close == -1:
+                # Unterminated comment runs to the end of the header
+                cursor = len(text)
+                break
+            nested = text.find('(', cursor, close)
+            if nested != -1:
+                depth += 1
+                cursor = nested + 1
+            else:
+                depth -= 1
+                cursor = close + 1
+        pieces.append(text[last:pos])
+        pieces.append(' ' * (cursor - pos))
+        last = cursor
+        pos = text.find('(', cursor)
+    pieces.append(text[last:])
+    return ''.join(pieces)
+
+def tokenize_received(header: str) -> Dict[str, str]:
+    """Split a Received header into its from/by/via/with/id/for clauses and date
+
+    The header is unfolded and lowercased once, comments are masked, and a
+    single compiled split finds every clause keyword. The date is
+    everything after the first semicolon outside a comment.
+    """
+    tokens = dict.fromkeys(RECEIVED_CLAUSES, '')
+    tokens['date'] = ''
+
+    text = ' '.join(header.split())
+    masked = ' ' + text.lower()
+    if '(' in masked:
+        masked = _mask_comments(masked)
+
+    end = masked.find(';')
+    if end == -1:
+        end = len(masked)
+    else:
+        tokens['date'] = text[end:].strip()
+
+    # parts = [preamble, keyword, value, keyword, value, ...]; offsets in
+    # `masked` are one greater than in `text` because of the leading space
+    parts = _CLAUSE_RE.split(masked[:end])
+    offset = len(parts[0]) - 1
+    seen = set()
+    for index in range(1, len(parts), 2):
+        clause = parts[index]
+        value_start = offset + len(clause) + 2
+        offset = value_start + len(parts[index + 1])
+        if clause not in seen:
+            seen.add(clause)
+            tokens[clause] = text[value_start:offset].strip()
+
+    return tokens
+
+@lru_cache(maxsize=64)
+def _fixed_offset(sign: str, hours: str, minutes: str) -> datetime.timezone:
+    """Cached timezone for a numeric zone offset"""
+    delta = datetime.timedelta(hours=int(hours), minutes=int(minutes))
+    return datetime.timezone(-delta if sign == '-' else delta)
+
+def parse_received_date(date_str: str) -> Optional[datetime.datetime]:
+    """Parse the date portion of a Received header"""
+    if not date_str:
+        return None
+
+    match = _DATE_RE.match(date_str)
+    month = _MONTHS.get(match.group(2).lower()) if match else None
+    # "-0000" means "no zone information" and yields a naive datetime
+    if month and match.group(7, 8, 9) != ('-', '00', '00'):
+        day, _, year, hour, minute, second, sign, tz_hours, tz_minutes = match.groups()
+        year = int(year)
+        if year < 100:
+            year += 2000 if year < 50 else 1900
+        try:
+            return datetime.datetime(year, month, int(day), int(hour), int(minute),
+                                     int(second or 0),
+                                     tzinfo=_fixed_offset(sign, tz_hours, tz_minutes))
+        except ValueError:
+            pass
+
+    try:
+        return email.utils.parsedate_to_datetime(date_str)
+    except (TypeError, ValueError, IndexError):
+        return None
+
+def extract_ip(text: str) -> str:
+    """Extract the relay IP address from a Received clause"""
+    if not text:
+        return ''
+
+    # Prefer the address literal recorded by the receiving server
+    for match in _BRACKET_IP_RE.finditer(text):
+        candidate = match.group(1)
+        if ':' not in candidate:
+            if _IPV4_RE.fullmatch(candidate):
+                return candidate
+            continue
+        try:
+            ipaddress.IPv6Address(candidate)
+            return candidate
+        except ValueError:
+            continue
+
+    ipv4_match = _IPV4_RE.search(text)
+    if ipv4_match:
+        return ipv4_match.group(0)
+
+    ipv6_match = _IPV6_RE.search(text)
+    if ipv6_match:
+        return ipv6_match.group(0)
+
+    return ''
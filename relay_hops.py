@@ -0,0 +1,222 @@
+"""
+Relay Hop Module
+Compact representation of the relay chain parsed from Received headers
+
+Each hop is a RelayHop with __slots__. Its time is stored as an epoch
+timestamp plus the zone it was written in, rather than as a datetime; the
+datetime and display string are rebuilt on demand. RelayColumns packs the
+chains of many results into parallel arrays for when a large batch is kept
+in memory.
+"""
+
+import datetime
+import math
+from array import array
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Optional
+
+# How hop times are shown in the GUI and in reports
+TIME_FORMAT = '%m/%d/%Y %I:%M:%S %p'
+
+_UTC = datetime.timezone.utc
+_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=_UTC)
+
+def _to_timestamp(time_dt: datetime.datetime) -> float:
+    """Seconds since the epoch; a naive time (zone -0000) is taken as UTC"""
+    if time_dt.tzinfo is None:
+        time_dt = time_dt.replace(tzinfo=_UTC)
+    return (time_dt - _EPOCH).total_seconds()
+
+@lru_cache(maxsize=64)
+def _zone(minutes: int) -> datetime.timezone:
+    """Shared timezone for an offset in minutes"""
+    return datetime.timezone(datetime.timedelta(minutes=minutes))
+
+class RelayHop:
+    """One hop of the relay chain
+
+    The Received clauses keep their header names, with a trailing
+    underscore where the name is a Python keyword (from_, with_, for_).
+    """
+
+    __slots__ = ('hop', 'from_', 'by', 'with_', 'id', 'for_', 'ip', 'timestamp', 'tz', 'date_text',
+                 'delay', 'ip_info', 'ptr', 'blacklists', 'blacklist')
+
+    # Set by IP enrichment (enrichment.BatchEnricher.apply) rather than by parsing
+    ENRICHMENT_FIELDS = ('ip_info', 'ptr', 'blacklists', 'blacklist')
+
+    def __init__(self, hop: int, from_: str = '', by: str = '', with_: str = '', id: str = '',
+                 for_: str = '', ip: str = '', time_dt: Optional[datetime.datetime] = None,
+                 date_text: str = '', delay: float = 0):
+        self.hop = hop
+        self.from_ = from_
+        self.by = by
+        self.with_ = with_
+        self.id = id
+        self.for_ = for_
+        self.ip = ip
+        # Unparsed date text is only kept when it could not be parsed
+        self.timestamp: Optional[float] = None
+        self.tz: Optional[datetime.tzinfo] = None
+        self.date_text = ''
+        if time_dt is not None:
+            self.timestamp = _to_timestamp(time_dt)
+            self.tz = time_dt.tzinfo
+        else:
+            self.date_text = date_text
+        self.delay = delay
+        self.clear_enrichment()
+
+    @property
+    def time_dt(self) -> Optional[datetime.datetime]:
+        """The hop time in the zone it was written in (naive for -0000)"""
+        if self.timestamp is None:
+            return None
+        utc = _EPOCH + datetime.timedelta(seconds=self.timestamp)
+        return utc.replace(tzinfo=None) if self.tz is None else utc.astimezone(self.tz)
+
+    @property
+    def time(self) -> str:
+        """Display form of the hop time, or the raw date text if it did not parse"""
+        time_dt = self.time_dt
+        return time_dt.strftime(TIME_FORMAT) if time_dt is not None else self.date_text
+
+    def clear_enrichment(self):
+        self.ip_info: Optional[Dict] = None
+        self.ptr: Optional[str] = None
+        self.blacklists: Optional[Dict[str, Optional[bool]]] = None
+        # True means "clean", matching the relay table's check mark
+        self.blacklist = True
+
+    def to_dict(self) -> Dict:
+        """Convert to dictionary for JSON export"""
+        data = {
+            'hop': self.hop,
+            'from': self.from_,
+            'by': self.by,
+            'with': self.with_,
+            'id': self.id,
+            'for': self.for_,
+            'time': self.time,
+            'time_dt': self.time_dt,
+            'delay': self.delay,
+            'blacklist': self.blacklist,
+            'ip': self.ip
+        }
+        if self.ip_info is not None:
+            data['ip_info'] = self.ip_info
+            data['ptr'] = self.ptr
+            data['blacklists'] = self.blacklists
+        return data
+
+    def __repr__(self) -> str:
+        return f"RelayHop(hop={self.hop}, from_={self.from_!r}, by={self.by!r}, ip={self.ip!r})"
+
+def chain_is_reversed(relays: Iterable[RelayHop]) -> bool:
+    """True when the known hop times of a chain mostly run backwards
+
+    Every pair of consecutive known times votes, so a single skewed clock
+    cannot flip the order of an otherwise consistent chain.
+    """
+    backward = forward = 0
+    previous = None
+    for relay in relays:
+        if relay.timestamp is None:
+            continue
+        if previous is not None:
+            if relay.timestamp < previous:
+                backward += 1
+            elif relay.timestamp > previous:
+                forward += 1
+        previous = relay.timestamp
+    return backward > forward
+
+class RelayColumns:
+    """The relay chains of many results packed into parallel arrays
+
+    Numbers live in typed arrays and repeated strings (host names, protocols,
+    IPs) are stored once, so a kept batch costs a few dozen bytes per hop.
+    Enrichment is not stored: it is per IP, and the enricher keeps it once.
+    """
+
+    # Zone column value of a naive (-0000) time
+    NO_ZONE = -32768
+
+    def __init__(self):
+        # Chain i spans rows starts[i]:starts[i + 1]
+        self.starts = array('L', [0])
+        self.hop = array('H')
+        self.timestamp = array('d')   # NaN when the date did not parse
+        self.zone = array('h')        # UTC offset in minutes
+        self.delay = array('d')
+        self.from_: List[str] = []
+        self.by: List[str] = []
+        self.with_: List[str] = []
+        self.id: List[str] = []
+        self.for_: List[str] = []
+        self.ip: List[str] = []
+        self.date_text: List[str] = []
+        self._strings: Dict[str, str] = {}
+
+    @classmethod
+    def from_results(cls, results: Iterable) -> 'RelayColumns':
+        """Columns holding the relay chain of each EmailParseResult, in order"""
+        columns = cls()
+        for result in results:
+            columns.append(result.relays)
+        return columns
+
+    def _shared(self, text: str) -> str:
+        return self._strings.setdefault(text, text)
+
+    def append(self, relays: Iterable[RelayHop]) -> int:
+        """Add one result's chain and return its index"""
+        for relay in relays:
+            self.hop.append(relay.hop)
+            if relay.timestamp is None:
+                self.timestamp.append(math.nan)
+                self.zone.append(0)
+            else:
+                self.timestamp.append(relay.timestamp)
+                offset = relay.tz.utcoffset(None) if relay.tz is not None else None
+                self.zone.append(self.NO_ZONE if offset is None else int(offset.total_seconds() // 60))
+            self.delay.append(relay.delay)
+            self.from_.append(self._shared(relay.from_))
+            self.by.append(self._shared(relay.by))
+            self.with_.append(self._shared(relay.with_))
+            self.id.append(relay.id)
+            self.for_.append(self._shared(relay.for_))
+            self.ip.append(self._shared(relay.ip))
+            self.date_text.append(self._shared(relay.date_text))
+        self.starts.append(len(self.hop))
+        return len(self.starts) - 2
+
+    def chain(self, index: int) -> List[RelayHop]:
+        """Rebuild the RelayHop list of one result"""
+        if index < 0:
+            index += len(self)
+        hops = []
+        for row in range(self.starts[index], self.starts[index + 1]):
+            relay = RelayHop(self.hop[row], self.from_[row], self.by[row], self.with_[row],
+                             self.id[row], self.for_[row], self.ip[row],
+                             date_text=self.date_text[row], delay=self.delay[row])
+            timestamp = self.timestamp[row]
+            if not math.isnan(timestamp):
+                relay.timestamp = timestamp
+                zone = self.zone[row]
+                relay.tz = None if zone == self.NO_ZONE else _zone(zone)
+            hops.append(relay)
+        return hops
+
+    def __getitem__(self, index: int) -> List[RelayHop]:
+        return self.chain(index)
+
+    def __len__(self) -> int:
+        return len(self.starts) - 1
+
+    def __iter__(self) -> Iterator[List[RelayHop]]:
+        return (self.chain(index) for index in range(len(self)))
+
+    @property
+    def hop_count(self) -> int:
+        return len(self.hop)
@@ -0,0 +1,244 @@
+"""
+Result Batch Module
+Columnar containers for many analysis results, with Parquet / Arrow IPC export
+
+A ResultBatch accumulates results into typed column arrays: one row per
+message, and the relay hops flattened into a second table that carries
+the index of their message. ResultBatchWriter streams batches to disk so
+a million results become a few large sequential writes:
+
+    <directory>/messages.parquet   one row per message
+    <directory>/relays.parquet     one row per relay hop, joined on `message`
+
+pyarrow is optional and only needed to convert and write.
+"""
+
+import math
+from array import array
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.ipc
+    import pyarrow.parquet as pq
+    HAVE_PYARROW = True
+except ImportError:
+    HAVE_PYARROW = False
+
+from email_core import EmailParseResult
+from relay_hops import RelayColumns
+
+# Result values of RFC 8601 section 2.7 (plus bestguesspass from the IANA
+# registry). Statuses are stored as int8 codes into this fixed dictionary, so
+# every batch of a file shares it; anything else is recorded as 'unknown'.
+AUTH_STATUSES = ('none', 'pass', 'fail', 'softfail', 'neutral', 'temperror', 'permerror',
+                 'policy', 'bestguesspass', 'unknown')
+_STATUS_CODES = {status: code for code, status in enumerate(AUTH_STATUSES)}
+_UNKNOWN = _STATUS_CODES['unknown']
+
+FORMATS = ('parquet', 'arrow')
+_EXTENSIONS = {'parquet': '.parquet', 'arrow': '.arrow'}
+
+# Typecode of a 4-byte unsigned array, matching Arrow's uint32
+_UINT32 = 'I' if array('I').itemsize == 4 else 'L'
+
+# Rows buffered by ResultBatchWriter before a batch is written
+DEFAULT_ROWS_PER_BATCH = 65536
+
+_STATUS_FIELDS = ('dmarc_status', 'spf_status', 'dkim_status', 'arc_status')
+_FLAG_FIELDS = ('dmarc_compliant', 'spf_aligned', 'spf_authenticated', 'dkim_aligned', 'dkim_authenticated')
+_STRING_FIELDS = ('from_domain', 'return_path_domain', 'sender_ip', 'delay_source')
+
+def _require_pyarrow():
+    if not HAVE_PYARROW:
+        raise RuntimeError("Columnar export needs the 'pyarrow' package (pip install pyarrow)")
+
+class ResultBatch:
+    """Many EmailParseResults held column-wise"""
+
+    def __init__(self):
+        self.source: List[str] = []
+        self.error: List[Optional[str]] = []
+        self.strings: Dict[str, List[Optional[str]]] = {name: [] for name in _STRING_FIELDS}
+        self.statuses: Dict[str, array] = {name: array('b') for name in _STATUS_FIELDS}
+        self.flags: Dict[str, array] = {name: array('b') for name in _FLAG_FIELDS}
+        self.total_delay = array('d')
+        self.relay_count = array('H')
+        self.skewed_hops = array('H')
+        # Message index of every relay row, alongside the relay columns
+        self.relay_message = array(_UINT32)
+        self.relays = RelayColumns()
+
+    def __len__(self) -> int:
+        return len(self.source)
+
+    def add(self, result: EmailParseResult, source: str = ''):
+        """Append one result"""
+        index = len(self.source)
+        self.source.append(source)
+        self.error.append(None)
+        for name in _STRING_FIELDS:
+            self.strings[name].append(getattr(result, name) or None)
+        for name in _STATUS_FIELDS:
+            status = (getattr(result, name) or 'none').lower()
+            self.statuses[name].append(_STATUS_CODES.get(status, _UNKNOWN))
+        for name in _FLAG_FIELDS:
+            self.flags[name].append(bool(getattr(result, name)))
+        self.total_delay.append(result.total_delay)
+        self.relay_count.append(min(len(result.relays), 0xFFFF))
+        self.skewed_hops.append(min(len(result.skewed_hops), 0xFFFF))
+        self.relays.append(result.relays)
+        self.relay_message.extend(array(_UINT32, [index]) * len(result.relays))
+
+    def add_error(self, source: str, error: str):
+        """Record a message that could not be analyzed"""
+        self.source.append(source)
+        self.error.append(error)
+        for name in _STRING_FIELDS:
+            self.strings[name].append(None)
+        for name in _STATUS_FIELDS:
+            self.statuses[name].append(_STATUS_CODES['none'])
+        for name in _FLAG_FIELDS:
+            self.flags[name].append(False)
+        self.total_delay.append(math.nan)
+        self.relay_count.append(0)
+        self.skewed_hops.append(0)
+        self.relays.append(())
+
+    # -- Arrow conversion ------------------------------------------------
+
+    @staticmethod
+    def message_schema() -> 'pa.Schema':
+        _require_pyarrow()
+        status_type = pa.dictionary(pa.int8(), pa.string())
+        return pa.schema(
+            [('message', pa.uint32()), ('source', pa.string()), ('error', pa.string())]
+            + [(name, pa.string()) for name in _STRING_FIELDS]
+            + [(name, status_type) for name in _STATUS_FIELDS]
+            + [(name, pa.bool_()) for name in _FLAG_FIELDS]
+            + [('total_delay', pa.float64()), ('relay_count', pa.uint16()), ('skewed_hops', pa.uint16())]
+        )
+
+    @staticmethod
+    def relay_schema() -> 'pa.Schema':
+        _require_pyarrow()
+        return pa.schema([
+            ('message', pa.uint32()), ('hop', pa.uint16()),
+            ('from', pa.string()), ('by', pa.string()), ('with', pa.string()),
+            ('id', pa.string()), ('for', pa.string()), ('ip', pa.string()),
+            ('time', pa.timestamp('us', tz='UTC')), ('utc_offset_minutes', pa.int16()),
+            ('date_text', pa.string()), ('delay', pa.float64())
+        ])
+
+    def to_arrow(self, first_message: int = 0) -> Tuple['pa.RecordBatch', 'pa.RecordBatch']:
+        """(messages, relays) record batches; message indexes start at first_message"""
+        _require_pyarrow()
+        first = pa.scalar(first_message, pa.uint32())
+        message = pc.add(_column(array(_UINT32, range(len(self.source))), pa.uint32()), first)
+        dictionary = pa.array(AUTH_STATUSES, pa.string())
+        columns = [message, pa.array(self.source, pa.string()), pa.array(self.error, pa.string())]
+        columns += [pa.array(self.strings[name], pa.string()) for name in _STRING_FIELDS]
+        columns += [pa.DictionaryArray.from_arrays(_column(self.statuses[name], pa.int8()), dictionary)
+                    for name in _STATUS_FIELDS]
+        columns += [_column(self.flags[name], pa.int8()).cast(pa.bool_()) for name in _FLAG_FIELDS]
+        columns += [_nullable_float(self.total_delay), _column(self.relay_count, pa.uint16()),
+                    _column(self.skewed_hops, pa.uint16())]
+        messages = pa.RecordBatch.from_arrays(columns, schema=self.message_schema())
+
+        relays = self.relays
+        relay_message = pc.add(_column(self.relay_message, pa.uint32()), first)
+        timestamp = _nullable_float(relays.timestamp)
+        # Epoch seconds to microseconds; rows whose date did not parse stay null
+        micros = pc.cast(pc.round(pc.multiply(timestamp, 1e6)), pa.int64())
+        micros = micros.cast(pa.timestamp('us', tz='UTC'))
+        zone = _column(relays.zone, pa.int16())
+        zone = pc.if_else(pc.or_(pc.is_null(timestamp), pc.equal(zone, RelayColumns.NO_ZONE)),
+                          pa.scalar(None, pa.int16()), zone)
+        relay_batch = pa.RecordBatch.from_arrays([
+            relay_message, _column(relays.hop, pa.uint16()),
+            pa.array(relays.from_, pa.string()), pa.array(relays.by, pa.string()),
+            pa.array(relays.with_, pa.string()), pa.array(relays.id, pa.string()),
+            pa.array(relays.for_, pa.string()), pa.array(relays.ip, pa.string()),
+            micros, zone, pa.array(relays.date_text, pa.string()), _column(relays.delay, pa.float64())
+        ], schema=self.relay_schema())
+        return messages, relay_batch
+
+    def write(self, directory: Union[str, Path], format: str = 'parquet'):
+        """Write this batch on its own as a messages file and a relays file"""
+        with ResultBatchWriter(directory, format) as writer:
+            writer.write_batch(self)
+
+def _column(values: array, arrow_type) -> 'pa.Array':
+    """Wrap a typed array's buffer as an Arrow array without copying it"""
+    return pa.Array.from_buffers(arrow_type, len(values), [None, pa.py_buffer(values)])
+
+def _nullable_float(values: array) -> 'pa.Array':
+    """float64 column with NaN turned into null"""
+    column = _column(values, pa.float64())
+    return pc.if_else(pc.is_nan(column), pa.scalar(None, pa.float64()), column)
+
+class ResultBatchWriter:
+    """Streams results into a Parquet or Arrow IPC file pair
+
+    Results are buffered in a ResultBatch and written every
+    `rows_per_batch` messages, as one Parquet row group (or IPC record
+    batch) per table.
+    """
+
+    def __init__(self, directory: Union[str, Path], format: str = 'parquet',
+                 rows_per_batch: int = DEFAULT_ROWS_PER_BATCH):
+        _require_pyarrow()
+        if format not in FORMATS:
+            raise ValueError(f"Unknown format {format!r}; expected one of {', '.join(FORMATS)}")
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.format = format
+        self.rows_per_batch = max(1, rows_per_batch)
+        self.batch = ResultBatch()
+        self.written = 0
+        extension = _EXTENSIONS[format]
+        self.paths = (self.directory / f'messages{extension}', self.directory / f'relays{extension}')
+        schemas = (ResultBatch.message_schema(), ResultBatch.relay_schema())
+        if format == 'parquet':
+            self._writers = [pq.ParquetWriter(str(path), schema) for path, schema in zip(self.paths, schemas)]
+        else:
+            self._writers = [pa.ipc.new_file(str(path), schema) for path, schema in zip(self.paths, schemas)]
+
+    def add(self, result: EmailParseResult, source: str = ''):
+        self.batch.add(result, source)
+        if len(self.batch) >= self.rows_per_batch:
+            self.flush()
+
+    def add_error(self, source: str, error: str):
+        self.batch.add_error(source, error)
+        if len(self.batch) >= self.rows_per_batch:
+            self.flush()
+
+    def write_batch(self, batch: ResultBatch):
+        """Write a complete batch, numbering its messages after those already written"""
+        if not len(batch):
+            return
+        for writer, record_batch in zip(self._writers, batch.to_arrow(self.written)):
+            if self.format == 'parquet':
+                writer.write_batch(record_batch)
+            else:
+                writer.write(record_batch)
+        self.written += len(batch)
+
+    def flush(self):
+        """Write the buffered results"""
+        batch, self.batch = self.batch, ResultBatch()
+        self.write_batch(batch)
+
+    def close(self):
+        self.flush()
+        for writer in self._writers:
+            writer.close()
+
+    def __enter__(self) -> 'ResultBatchWriter':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
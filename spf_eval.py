@@ -0,0 +1,708 @@
+"""
+SPF Evaluation Module
+RFC 7208 check_host() with include/a/mx/redirect support
+
+A domain's policy is resolved once: the include/redirect tree is fetched
+level by level with the a/mx lookups of each level running concurrently.
+The tree is then walked in evaluation order. This applies the 10-lookup and
+2-void-lookup limits and compiles the policy into a sorted table of disjoint
+address ranges, so checking an IP is a bisect. Terms that depend on the
+sender (macros, ptr, exists) stay as dynamic steps between the tables.
+Compiled policies are memoized per domain.
+"""
+
+import bisect
+import heapq
+import ipaddress
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from types import SimpleNamespace
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import dns.exception
+import dns.resolver
+import dns.reversename
+
+# check_host() results (RFC 7208 section 2.6)
+PASS = 'pass'
+FAIL = 'fail'
+SOFTFAIL = 'softfail'
+NEUTRAL = 'neutral'
+NONE = 'none'
+PERMERROR = 'permerror'
+TEMPERROR = 'temperror'
+
+QUALIFIERS = {'+': PASS, '-': FAIL, '~': SOFTFAIL, '?': NEUTRAL}
+MECHANISMS = ('all', 'include', 'a', 'mx', 'ptr', 'ip4', 'ip6', 'exists')
+
+# Processing limits (RFC 7208 section 4.6.4)
+MAX_DNS_LOOKUPS = 10
+MAX_VOID_LOOKUPS = 2
+MAX_MX_NAMES = 10
+MAX_PTR_NAMES = 10
+
+# Seconds a transient DNS failure is remembered before it is looked up again
+TEMPERROR_TTL = 5.0
+
+# Addresses are mapped into one integer space: IPv6 as-is and IPv4 inside
+# ::ffff:0:0/96, so a single table covers both families
+_IPV4_BASE = 0xFFFF00000000
+_FULL_RANGE = (0, (1 << 128) - 1)
+
+# Lookup states
+_OK = 'ok'
+_VOID = 'void'
+
+_TERM_RE = re.compile(r'([+\-~?]?)([A-Za-z][A-Za-z0-9]*)(.*)$')
+_MODIFIER_RE = re.compile(r'([A-Za-z][A-Za-z0-9_.\-]*)=(.*)$')
+_MACRO_RE = re.compile(r'%\{([slodipvhcrt])(\d*)(r?)([.\-+,/_=]*)\}|%%|%_|%-', re.IGNORECASE)
+
+class SPFPermError(Exception):
+    """Syntax error in an SPF record"""
+
+@dataclass
+class SPFTerm:
+    """One directive of an SPF record"""
+    qualifier: str          # result when the mechanism matches
+    mechanism: str
+    domain_spec: str = ''
+    cidr4: int = 32
+    cidr6: int = 128
+    network: Optional[Tuple[int, int]] = None  # ip4/ip6 range
+
+    @property
+    def has_macro(self) -> bool:
+        return '%' in self.domain_spec
+
+@dataclass
+class SPFRecord:
+    """A parsed SPF record"""
+    terms: List[SPFTerm]
+    redirect: Optional[str] = None
+
+    @property
+    def has_all(self) -> bool:
+        return any(term.mechanism == 'all' for term in self.terms)
+
+def ip_to_int(ip: str) -> int:
+    """Map an address into the shared IPv4/IPv6 integer space"""
+    address = ipaddress.ip_address(ip)
+    if address.version == 6 and address.ipv4_mapped:
+        address = address.ipv4_mapped
+    return int(address) + _IPV4_BASE if address.version == 4 else int(address)
+
+def _address_range(value: int, prefix: int, is_ipv4: bool) -> Tuple[int, int]:
+    """Range covered by value/prefix in the shared integer space"""
+    bits = 32 if is_ipv4 else 128
+    host_bits = bits - prefix
+    if is_ipv4:
+        value -= _IPV4_BASE
+    start = (value >> host_bits) << host_bits
+    end = start | ((1 << host_bits) - 1)
+    return (start + _IPV4_BASE, end + _IPV4_BASE) if is_ipv4 else (start, end)
+
+def _is_ipv4_int(value: int) -> bool:
+    return _IPV4_BASE <= value <= _IPV4_BASE + 0xFFFFFFFF
+
+def _parse_prefix(text: str, maximum: int) -> int:
+    if not text.isdigit() or int(text) > maximum or (len(text) > 1 and text[0] == '0'):
+        raise SPFPermError(f"invalid CIDR length '{text}'")
+    return int(text)
+
+def _parse_term(text: str) -> SPFTerm:
+    match = _TERM_RE.match(text)
+    if not match:
+        raise SPFPermError(f"invalid term '{text}'")
+    qualifier, mechanism, rest = match.groups()
+    mechanism = mechanism.lower()
+    if mechanism not in MECHANISMS:
+        raise SPFPermError(f"unknown mechanism '{mechanism}'")
+    term = SPFTerm(QUALIFIERS[qualifier or '+'], mechanism)
+
+    # Split "[:value][/cidr]"; the value itself never contains '/'
+    value, cidr = '', rest
+    if rest.startswith(':'):
+        slash = rest.find('/')
+        value, cidr = (rest[1:], '') if slash == -1 else (rest[1:slash], rest[slash:])
+    if cidr and not cidr.startswith('/'):
+        raise SPFPermError(f"invalid term '{text}'")
+
+    if mechanism == 'all':
+        if value or cidr:
+            raise SPFPermError(f"invalid term '{text}'")
+    elif mechanism in ('ip4', 'ip6'):
+        version = 4 if mechanism == 'ip4' else 6
+        try:
+            address = ipaddress.ip_address(value)
+        except ValueError:
+            raise SPFPermError(f"invalid address in '{text}'")
+        if address.version != version:
+            raise SPFPermError(f"invalid address in '{text}'")
+        prefix = _parse_prefix(cidr[1:], 32 if version == 4 else 128) if cidr else (32 if version == 4 else 128)
+        term.network = _address_range(ip_to_int(value), prefix, version == 4)
+    else:
+        if mechanism in ('include', 'exists') and not value:
+            raise SPFPermError(f"'{mechanism}' requires a domain")
+        term.domain_spec = value.rstrip('.')
+        if cidr:
+            if mechanism not in ('a', 'mx'):
+                raise SPFPermError(f"invalid term '{text}'")
+            # "/24", "//64" or "/24//64"
+            cidr4, _, cidr6 = cidr[1:].partition('//')
+            if cidr.startswith('//'):
+                cidr4, cidr6 = '', cidr[2:]
+            if cidr4:
+                term.cidr4 = _parse_prefix(cidr4, 32)
+            if cidr6:
+                term.cidr6 = _parse_prefix(cidr6, 128)
+    return term
+
+def parse_spf_record(text: str) -> SPFRecord:
+    """Parse an SPF record into its terms and redirect modifier"""
+    parts = text.split()
+    if not parts or parts[0].lower() != 'v=spf1':
+        raise SPFPermError('not an SPF record')
+
+    record = SPFRecord(terms=[])
+    seen_modifiers = set()
+    for part in parts[1:]:
+        modifier = _MODIFIER_RE.match(part)
+        if modifier and modifier.group(1).lower() not in MECHANISMS:
+            name = modifier.group(1).lower()
+            if name in seen_modifiers and name in ('redirect', 'exp'):
+                raise SPFPermError(f"duplicate '{name}' modifier")
+            seen_modifiers.add(name)
+            if name == 'redirect':
+                if not modifier.group(2):
+                    raise SPFPermError("'redirect' requires a domain")
+                record.redirect = modifier.group(2).rstrip('.')
+            # exp= and unknown modifiers do not affect the result
+            continue
+        record.terms.append(_parse_term(part))
+    return record
+
+def expand_macros(spec: str, ip: str, sender: str, domain: str) -> str:
+    """Expand SPF macros (RFC 7208 section 7) in a domain-spec"""
+    local, at, sender_domain = sender.rpartition('@')
+    if not at:
+        local, sender_domain = 'postmaster', sender or domain
+    address = ipaddress.ip_address(ip)
+    if address.version == 4:
+        dotted = str(address)
+    else:
+        dotted = '.'.join(address.exploded.replace(':', ''))
+    values = {
+        's': f"{local or 'postmaster'}@{sender_domain}",
+        'l': local or 'postmaster',
+        'o': sender_domain,
+        'd': domain,
+        'i': dotted,
+        'p': 'unknown',
+        'v': 'in-addr' if address.version == 4 else 'ip6',
+        'h': domain,
+    }
+
+    def replace(match):
+        token = match.group(0)
+        if token == '%%':
+            return '%'
+        if token == '%_':
+            return ' '
+        if token == '%-':
+            return '%20'
+        letter, digits, reverse, delimiters = match.groups()
+        parts = re.split('[' + re.escape(delimiters or '.') + ']', values.get(letter.lower(), ''))
+        if reverse:
+            parts.reverse()
+        if digits and int(digits) > 0:
+            parts = parts[-int(digits):]
+        return '.'.join(parts)
+
+    expanded = _MACRO_RE.sub(replace, spec).rstrip('.')
+    # Keep the name within DNS limits by dropping leftmost labels
+    while len(expanded) > 253 and '.' in expanded:
+        expanded = expanded.split('.', 1)[1]
+    return expanded
+
+class _MatchTable:
+    """Disjoint sorted ranges mapped to results, searched with bisect"""
+
+    __slots__ = ('starts', 'ends', 'results')
+
+    def __init__(self, ranges: List[Tuple[int, int, str]]):
+        """Build from (start, end, result) ranges where earlier entries take precedence"""
+        self.starts: List[int] = []
+        self.ends: List[int] = []
+        self.results: List[str] = []
+        if not ranges:
+            return
+
+        ordered = sorted(((start, end, priority, result)
+                          for priority, (start, end, result) in enumerate(ranges)),
+                         key=lambda r: r[0])
+        active: List[Tuple[int, int, str]] = []  # heap of (priority, end, result)
+        index = 0
+        position = ordered[0][0]
+        while index < len(ordered) or active:
+            if not active:
+                position = max(position, ordered[index][0])
+            while index < len(ordered) and ordered[index][0] <= position:
+                start, end, priority, result = ordered[index]
+                heapq.heappush(active, (priority, end, result))
+                index += 1
+            while active and active[0][1] < position:
+                heapq.heappop(active)
+            if not active:
+                continue
+            _, end, result = active[0]
+            next_start = ordered[index][0] if index < len(ordered) else None
+            segment_end = end if next_start is None else min(end, next_start - 1)
+            self._append(position, segment_end, result)
+            position = segment_end + 1
+
+    def _append(self, start: int, end: int, result: str):
+        if self.results and self.results[-1] == result and self.ends[-1] + 1 == start:
+            self.ends[-1] = end
+        else:
+            self.starts.append(start)
+            self.ends.append(end)
+            self.results.append(result)
+
+    def lookup(self, value: int) -> Optional[str]:
+        position = bisect.bisect_right(self.starts, value) - 1
+        if position >= 0 and value <= self.ends[position]:
+            return self.results[position]
+        return None
+
+    def entries(self) -> Iterable[Tuple[int, int, str]]:
+        return zip(self.starts, self.ends, self.results)
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+# A dynamic step: (ip as int, evaluation environment) -> result or None for no match
+DynamicStep = Callable[[int, SimpleNamespace], Optional[str]]
+
+class CompiledPolicy:
+    """An SPF policy as an ordered list of range tables and dynamic steps"""
+
+    def __init__(self, segments: List):
+        self.segments = segments
+
+    @property
+    def is_static(self) -> bool:
+        """True if no step depends on the sender or needs per-IP DNS lookups"""
+        return all(isinstance(segment, _MatchTable) for segment in self.segments)
+
+    def produces(self, result: str) -> bool:
+        """True if some static range evaluates to a result"""
+        return any(result in segment.results for segment in self.segments
+                   if isinstance(segment, _MatchTable))
+
+    def ranges_for(self, result: str) -> List[Tuple[int, int]]:
+        """Ranges of a static policy that evaluate to a result"""
+        return [(start, end) for segment in self.segments
+                for start, end, value in segment.entries() if value == result]
+
+    def evaluate(self, ip_int: int, env: SimpleNamespace) -> str:
+        for segment in self.segments:
+            if isinstance(segment, _MatchTable):
+                result = segment.lookup(ip_int)
+            else:
+                result = segment(ip_int, env)
+            if result is not None:
+                return result
+        return NEUTRAL
+
+class _PolicyBuilder:
+    """Accumulates segments in evaluation order, merging consecutive static ranges"""
+
+    def __init__(self):
+        self.segments = []
+        self.pending: List[Tuple[int, int, str]] = []
+
+    def add_ranges(self, result: str, ranges: Iterable[Tuple[int, int]]):
+        self.pending.extend((start, end, result) for start, end in ranges)
+
+    def add_dynamic(self, step: DynamicStep):
+        self._flush()
+        self.segments.append(step)
+
+    def extend(self, policy: CompiledPolicy):
+        for segment in policy.segments:
+            if isinstance(segment, _MatchTable):
+                self.pending.extend(segment.entries())
+            else:
+                self.add_dynamic(segment)
+
+    def _flush(self):
+        if self.pending:
+            self.segments.append(_MatchTable(self.pending))
+            self.pending = []
+
+    def build(self) -> CompiledPolicy:
+        self._flush()
+        return CompiledPolicy(self.segments)
+
+class _Budget:
+    """Lookup counters for one check_host() evaluation"""
+
+    def __init__(self):
+        self.lookups = 0
+        self.voids = 0
+        self.stack: List[str] = []
+
+    def lookup(self) -> bool:
+        self.lookups += 1
+        return self.lookups <= MAX_DNS_LOOKUPS
+
+    def void(self) -> bool:
+        self.voids += 1
+        return self.voids <= MAX_VOID_LOOKUPS
+
+class SPFEvaluator:
+    """RFC 7208 SPF evaluator with memoized, compiled per-domain policies"""
+
+    def __init__(self, dns_service=None, max_workers: int = 8, ttl: float = 3600.0,
+                 temperror_ttl: float = TEMPERROR_TTL):
+        if dns_service is None:
+            from dns_lookup import DNSLookupService
+            dns_service = DNSLookupService()
+        self.dns_service = dns_service
+        self.ttl = ttl
+        self.temperror_ttl = temperror_ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='spf')
+        self._lock = threading.Lock()
+        self._records: Dict[str, Tuple[float, Tuple]] = {}
+        self._addresses: Dict[Tuple[str, str], Tuple[float, Tuple]] = {}
+        self._policies: Dict[str, Tuple[float, Tuple[str, Optional[CompiledPolicy]]]] = {}
+
+    # -- memoized DNS ----------------------------------------------------
+
+    def _memo(self, table: Dict, key, fetch):
+        now = time.monotonic()
+        with self._lock:
+            entry = table.get(key)
+        if entry and entry[0] > now:
+            return entry[1]
+        value = fetch()
+        with self._lock:
+            table[key] = (now + self._lifetime(value), value)
+        return value
+
+    def _lifetime(self, value: Tuple) -> float:
+        """Seconds to keep a (state, data) entry; transient failures are soon retried"""
+        state, data = value
+        if state == TEMPERROR or (isinstance(data, CompiledPolicy) and data.produces(TEMPERROR)):
+            return self.temperror_ttl
+        return self.ttl
+
+    def _record(self, domain: str) -> Tuple[str, Optional[SPFRecord]]:
+        """Fetch and parse a domain's SPF record: (state, record)"""
+        return self._memo(self._records, domain.lower(), lambda: self._fetch_record(domain))
+
+    def _fetch_record(self, domain: str) -> Tuple[str, Optional[SPFRecord]]:
+        try:
+            answers = self.dns_service._resolve(domain, 'TXT')
+        except (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer):
+            return NONE, None
+        except dns.exception.DNSException:
+            return TEMPERROR, None
+
+        records = []
+        for rdata in answers:
+            text = self.dns_service._extract_txt_string(rdata)
+            if text.lower() == 'v=spf1' or text.lower().startswith('v=spf1 '):
+                records.append(text)
+        if not records:
+            return NONE, None
+        if len(records) > 1:
+            return PERMERROR, None
+        try:
+            return _OK, parse_spf_record(records[0])
+        except SPFPermError:
+            return PERMERROR, None
+
+    def _host_addresses(self, kind: str, target: str) -> Tuple[str, List[int]]:
+        """Addresses for an a or mx mechanism: (state, addresses as ints)"""
+        return self._memo(self._addresses, (kind, target.lower()),
+                          lambda: self._fetch_addresses(kind, target))
+
+    def _resolve_ints(self, name: str) -> Tuple[str, List[int]]:
+        addresses = []
+        voids = 0
+        for rdtype in ('A', 'AAAA'):
+            try:
+                addresses.extend(ip_to_int(str(rdata)) for rdata in self.dns_service._resolve(name, rdtype))
+            except (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer):
+                voids += 1
+            except dns.exception.DNSException:
+                return TEMPERROR, []
+        return (_VOID if voids == 2 else _OK), addresses
+
+    def _fetch_addresses(self, kind: str, target: str) -> Tuple[str, List[int]]:
+        if kind == 'a':
+            return self._resolve_ints(target)
+        try:
+            exchanges = [str(rdata.exchange).rstrip('.') for rdata in self.dns_service._resolve(target, 'MX')]
+        except (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer):
+            return _VOID, []
+        except dns.exception.DNSException:
+            return TEMPERROR, []
+        if len(exchanges) > MAX_MX_NAMES:
+            return PERMERROR, []
+        addresses = []
+        for exchange in exchanges:
+            state, found = self._resolve_ints(exchange)
+            if state == TEMPERROR:
+                return TEMPERROR, []
+            addresses.extend(found)
+        return _OK, addresses
+
+    def _prefetch(self, domain: str):
+        """Fetch the include/redirect tree level by level, each level concurrently"""
+        frontier = [domain]
+        seen = set()
+        for _ in range(MAX_DNS_LOOKUPS + 1):
+            frontier = [d for d in dict.fromkeys(frontier) if d.lower() not in seen]
+            if not frontier:
+                break
+            seen.update(d.lower() for d in frontier)
+            records = list(zip(frontier, self._executor.map(self._record, frontier)))
+
+            jobs = set()
+            next_frontier = []
+            for name, (state, record) in records:
+                if state != _OK:
+                    continue
+                for term in record.terms:
+                    if term.has_macro:
+                        continue
+                    if term.mechanism in ('a', 'mx'):
+                        jobs.add((term.mechanism, term.domain_spec or name))
+                    elif term.mechanism == 'include':
+                        next_frontier.append(term.domain_spec)
+                if record.redirect and '%' not in record.redirect and not record.has_all:
+                    next_frontier.append(record.redirect)
+            list(self._executor.map(lambda job: self._host_addresses(*job), jobs))
+            frontier = next_frontier
+
+    # -- compilation -----------------------------------------------------
+
+    def compile(self, domain: str) -> Tuple[str, Optional[CompiledPolicy]]:
+        """Compiled policy for a domain: (state, policy), state 'ok', 'none' or an error"""
+        domain = domain.lower().rstrip('.')
+
+        def build():
+            self._prefetch(domain)
+            return self._compile_domain(domain, _Budget())
+
+        return self._memo(self._policies, domain, build)
+
+    def compile_record(self, record_text: str, domain: str = '') -> CompiledPolicy:
+        """Compile a record given as text (its includes are still resolved)"""
+        try:
+            record = parse_spf_record(record_text)
+        except SPFPermError:
+            return CompiledPolicy([_MatchTable([(*_FULL_RANGE, PERMERROR)])])
+        return self._compile_record(record, domain, _Budget())
+
+    def _compile_domain(self, domain: str, budget: _Budget) -> Tuple[str, Optional[CompiledPolicy]]:
+        state, record = self._record(domain)
+        if state != _OK:
+            return state, None
+        budget.stack.append(domain.lower())
+        try:
+            return _OK, self._compile_record(record, domain, budget)
+        finally:
+            budget.stack.pop()
+
+    def _compile_record(self, record: SPFRecord, domain: str, budget: _Budget) -> CompiledPolicy:
+        builder = _PolicyBuilder()
+        for term in record.terms:
+            if not self._compile_term(term, domain, budget, builder):
+                return builder.build()
+
+        if record.redirect and not record.has_all:
+            self._compile_redirect(record.redirect, domain, budget, builder)
+        else:
+            builder.add_ranges(NEUTRAL, [_FULL_RANGE])
+        return builder.build()
+
+    @staticmethod
+    def _stop(builder: _PolicyBuilder, result: str) -> bool:
+        """Every IP still unmatched at this point gets `result`"""
+        builder.add_ranges(result, [_FULL_RANGE])
+        return False
+
+    def _compile_term(self, term: SPFTerm, domain: str, budget: _Budget, builder: _PolicyBuilder) -> bool:
+        """Add one term; returns False when evaluation cannot continue past it"""
+        mechanism = term.mechanism
+        if mechanism == 'all':
+            return self._stop(builder, term.qualifier)
+        if mechanism in ('ip4', 'ip6'):
+            builder.add_ranges(term.qualifier, [term.network])
+            return True
+
+        # Every other mechanism costs a DNS lookup
+        if not budget.lookup():
+            return self._stop(builder, PERMERROR)
+
+        if mechanism in ('ptr', 'exists') or term.has_macro:
+            builder.add_dynamic(self._dynamic_step(term, domain))
+            return True
+
+        if mechanism == 'include':
+            target = term.domain_spec.lower()
+            if target in budget.stack:
+                return self._stop(builder, PERMERROR)
+            state, child = self._compile_domain(target, budget)
+            if state == TEMPERROR:
+                return self._stop(builder, TEMPERROR)
+            if state != _OK:
+                return self._stop(builder, PERMERROR)
+            if child.is_static:
+                builder.add_ranges(term.qualifier, child.ranges_for(PASS))
+                builder.add_ranges(PERMERROR, child.ranges_for(PERMERROR))
+                builder.add_ranges(TEMPERROR, child.ranges_for(TEMPERROR))
+            else:
+                builder.add_dynamic(lambda ip_int, env: self._include_result(
+                    term.qualifier, child.evaluate(ip_int, env)))
+            return True
+
+        # a / mx
+        target = term.domain_spec or domain
+        if not target:
+            return True
+        state, addresses = self._host_addresses(mechanism, target)
+        if state in (TEMPERROR, PERMERROR):
+            return self._stop(builder, state)
+        if state == _VOID and not budget.void():
+            return self._stop(builder, PERMERROR)
+        builder.add_ranges(term.qualifier, (
+            _address_range(value, term.cidr4 if _is_ipv4_int(value) else term.cidr6, _is_ipv4_int(value))
+            for value in addresses))
+        return True
+
+    def _compile_redirect(self, target: str, domain: str, budget: _Budget, builder: _PolicyBuilder):
+        if not budget.lookup():
+            self._stop(builder, PERMERROR)
+            return
+        if '%' in target:
+            def step(ip_int, env):
+                result = self.check_host(env.ip, expand_macros(target, env.ip, env.sender, domain), env.sender)
+                return PERMERROR if result == NONE else result
+            builder.add_dynamic(step)
+            return
+        if target.lower() in budget.stack:
+            self._stop(builder, PERMERROR)
+            return
+        state, child = self._compile_domain(target, budget)
+        if state == TEMPERROR:
+            self._stop(builder, TEMPERROR)
+        elif state != _OK:
+            self._stop(builder, PERMERROR)
+        else:
+            builder.extend(child)
+
+    @staticmethod
+    def _include_result(qualifier: str, result: str) -> Optional[str]:
+        if result == PASS:
+            return qualifier
+        if result in (PERMERROR, TEMPERROR):
+            return result
+        if result == NONE:
+            return PERMERROR
+        return None
+
+    # -- dynamic terms ---------------------------------------------------
+
+    def _dynamic_step(self, term: SPFTerm, domain: str) -> DynamicStep:
+        """Step for a term that must be evaluated per IP / sender"""
+        def target(env) -> str:
+            spec = term.domain_spec or domain
+            return expand_macros(spec, env.ip, env.sender, domain) if '%' in spec else spec
+
+        if term.mechanism == 'exists':
+            def step(ip_int, env):
+                try:
+                    return term.qualifier if self.dns_service._resolve(target(env), 'A') else None
+                except (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer):
+                    return None
+                except dns.exception.DNSException:
+                    return TEMPERROR
+        elif term.mechanism == 'ptr':
+            def step(ip_int, env):
+                return term.qualifier if self._ptr_matches(env.ip, ip_int, target(env)) else None
+        elif term.mechanism == 'include':
+            def step(ip_int, env):
+                return self._include_result(term.qualifier, self.check_host(env.ip, target(env), env.sender))
+        else:
+            def step(ip_int, env):
+                state, addresses = self._host_addresses(term.mechanism, target(env))
+                if state in (TEMPERROR, PERMERROR):
+                    return state
+                for value in addresses:
+                    is_ipv4 = _is_ipv4_int(value)
+                    start, end = _address_range(value, term.cidr4 if is_ipv4 else term.cidr6, is_ipv4)
+                    if start <= ip_int <= end:
+                        return term.qualifier
+                return None
+        return step
+
+    def _ptr_matches(self, ip: str, ip_int: int, target: str) -> bool:
+        """Validated reverse names of ip include target or a subdomain of it"""
+        target = target.lower()
+        try:
+            names = self.dns_service._resolve(dns.reversename.from_address(ip).to_text(), 'PTR')
+        except (dns.exception.DNSException, ValueError):
+            return False
+        for rdata in list(names)[:MAX_PTR_NAMES]:
+            name = str(rdata.target).rstrip('.').lower()
+            if name != target and not name.endswith('.' + target):
+                continue
+            state, addresses = self._resolve_ints(name)
+            if state == _OK and ip_int in addresses:
+                return True
+        return False
+
+    # -- public API ------------------------------------------------------
+
+    def check_host(self, ip: str, domain: str, sender: str = '') -> str:
+        """Evaluate the SPF policy of `domain` for a connecting IP"""
+        if not domain:
+            return NONE
+        try:
+            ip_int = ip_to_int(ip)
+        except ValueError:
+            return PERMERROR
+        state, policy = self.compile(domain)
+        if state != _OK:
+            return state
+        return policy.evaluate(ip_int, SimpleNamespace(ip=ip, sender=sender))
+
+    def check_record(self, record_text: str, ip: str, domain: str = '', sender: str = '') -> str:
+        """Evaluate an SPF record given as text for a connecting IP"""
+        try:
+            ip_int = ip_to_int(ip)
+        except ValueError:
+            return PERMERROR
+        policy = self.compile_record(record_text, domain)
+        return policy.evaluate(ip_int, SimpleNamespace(ip=ip, sender=sender))
+
+    def check_many(self, ips: Iterable[str], domain: str, sender: str = '') -> Dict[str, str]:
+        """Evaluate many IPs against one domain's policy (compiled once)"""
+        return {ip: self.check_host(ip, domain, sender) for ip in ips}
+
+    def clear(self):
+        """Forget memoized records and policies"""
+        with self._lock:
+            self._records.clear()
+            self._addresses.clear()
+            self._policies.clear()
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)